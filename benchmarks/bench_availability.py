@@ -0,0 +1,87 @@
+# benchmarks/bench_availability.py
+# Compara el motor de disponibilidad por barrido con el algoritmo anterior
+# (cada espacio contra cada ocupado, parseando las fechas en cada comparación).
+#
+# Uso: python -m benchmarks.bench_availability [--days 31] [--events 500]
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules.availability import find_available_slots, parse_busy_intervals
+
+UTC = datetime.timezone.utc
+
+
+def legacy_available_slots(start_time, end_time, busy_slots, duration_minutes):
+    """El algoritmo original de calendar.get_available_slots."""
+    potential_slots = []
+    current_time = start_time
+    while current_time + datetime.timedelta(minutes=duration_minutes) <= end_time:
+        potential_slots.append((current_time, current_time + datetime.timedelta(minutes=duration_minutes)))
+        current_time += datetime.timedelta(minutes=duration_minutes)
+
+    available_slots = []
+    for slot_start, slot_end in potential_slots:
+        is_busy = False
+        for busy in busy_slots:
+            busy_start = datetime.datetime.fromisoformat(busy["start"])
+            busy_end = datetime.datetime.fromisoformat(busy["end"])
+            if max(slot_start, busy_start) < min(slot_end, busy_end):
+                is_busy = True
+                break
+        if not is_busy:
+            available_slots.append((slot_start, slot_end))
+    return available_slots
+
+
+def synthetic_busy(start_time, days, events, seed=42):
+    rng = random.Random(seed)
+    busy = []
+    for _ in range(events):
+        busy_start = start_time + datetime.timedelta(minutes=rng.randrange(0, days * 24 * 60, 15))
+        busy_end = busy_start + datetime.timedelta(minutes=rng.choice([15, 30, 60, 90, 120]))
+        busy.append({"start": busy_start.isoformat(), "end": busy_end.isoformat()})
+    return busy
+
+
+def best_of(repeat, fn):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=int, default=31)
+    parser.add_argument("--events", type=int, default=500)
+    parser.add_argument("--duration", type=int, default=30)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    start_time = datetime.datetime(2024, 3, 1, tzinfo=UTC)
+    end_time = start_time + datetime.timedelta(days=args.days)
+    busy = synthetic_busy(start_time, args.days, args.events)
+
+    sweep_time, sweep_slots = best_of(args.repeat, lambda: find_available_slots(
+        start_time, end_time, parse_busy_intervals(busy), duration_minutes=args.duration))
+    legacy_time, legacy_slots = best_of(max(1, args.repeat // 5), lambda: legacy_available_slots(
+        start_time, end_time, busy, args.duration))
+
+    assert sweep_slots == legacy_slots, "Los dos algoritmos no devuelven los mismos espacios"
+    print(f"{args.days} días, {args.events} eventos, espacios de {args.duration} min -> {len(sweep_slots)} libres")
+    print(f"  barrido:  {sweep_time * 1000:8.2f} ms")
+    print(f"  anterior: {legacy_time * 1000:8.2f} ms  ({legacy_time / sweep_time:.0f}x más lento)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# benchmarks/bench_service_search.py
+# Mide la búsqueda de servicios sobre un catálogo sintético grande:
+# construcción de los índices, BM25 vectorizado, palabras clave con
+# Aho–Corasick y el bucle de subcadenas original como referencia.
+#
+# Uso: python -m benchmarks.bench_service_search [--services 10000] [--queries 200]
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules.service_catalog import KeywordMatcher
+from bot.modules.service_search import BM25Index
+
+WORDS = (
+    "diseño web tienda marca logotipo video fotografía campaña redes sociales anuncios bot agenda "
+    "ventas automatización procesos inteligencia artificial contenido estrategia posicionamiento "
+    "correo catálogo empaque evento podcast animación ilustración aplicación móvil reservas pagos "
+    "inventario facturación crm analítica datos tablero consultoría capacitación manual impresión"
+).split()
+
+
+def synthetic_catalogue(size, rng):
+    services = []
+    for number in range(size):
+        services.append({
+            "service_name": f"Servicio {number} " + " ".join(rng.sample(WORDS, 2)),
+            "description": " ".join(rng.choices(WORDS, k=20)),
+            "keywords": [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(4)],
+            "work_examples": [" ".join(rng.choices(WORDS, k=8)) for _ in range(3)],
+        })
+    return services
+
+
+def legacy_find(query, services):
+    """El bucle original de sales_rag.find_relevant_services."""
+    query = query.lower()
+    relevant = []
+    for service in services:
+        for keyword in service.get("keywords", []):
+            if keyword in query:
+                relevant.append(service)
+                break
+    return relevant
+
+
+def timed(fn):
+    started = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - started, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de búsqueda de servicios")
+    parser.add_argument("--services", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    services = synthetic_catalogue(args.services, rng)
+    queries = [" ".join(rng.choices(WORDS, k=25)) for _ in range(args.queries)]
+
+    build_bm25, index = timed(lambda: BM25Index(services))
+    keywords = [keyword for service in services for keyword in service["keywords"]]
+    build_matcher, matcher = timed(lambda: KeywordMatcher(keywords))
+
+    bm25_time, _ = timed(lambda: [index.top_k(query, k=5) for query in queries])
+    matcher_time, _ = timed(lambda: [matcher.search(query) for query in queries])
+    legacy_time, _ = timed(lambda: [legacy_find(query, services) for query in queries])
+
+    per_query = lambda total: total / len(queries) * 1000
+    print(f"{args.services} servicios, {len(keywords)} palabras clave, {len(index.vocabulary)} términos")
+    print(f"  construir BM25:          {build_bm25 * 1000:8.1f} ms")
+    print(f"  construir Aho–Corasick:  {build_matcher * 1000:8.1f} ms")
+    print(f"  consulta BM25 (top 5):   {per_query(bm25_time):8.3f} ms")
+    print(f"  consulta Aho–Corasick:   {per_query(matcher_time):8.3f} ms")
+    print(f"  consulta bucle original: {per_query(legacy_time):8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -13,6 +13,30 @@ load_dotenv(dotenv_path=env_path)
 # --- Telegram Configuration ---
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
 ADMIN_ID = os.getenv("TELEGRAM_OWNER_CHAT_ID")  # Renamed for consistency in the code
+# Seconds a resolved user role is cached (add_user invalidates it immediately)
+ROLE_CACHE_TTL = float(os.getenv("ROLE_CACHE_TTL", "300"))
+
+# --- Database ---
+# Read-only connections in the async data-access pool and seconds a
+# connection waits on a locked database before failing.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+DB_BUSY_TIMEOUT = float(os.getenv("DB_BUSY_TIMEOUT", "5"))
+# Group commit: small writes are committed together every DB_BATCH_INTERVAL_MS
+# milliseconds, or as soon as DB_BATCH_MAX_ROWS of them are pending.
+DB_BATCH_MAX_ROWS = int(os.getenv("DB_BATCH_MAX_ROWS", "500"))
+DB_BATCH_INTERVAL_MS = float(os.getenv("DB_BATCH_INTERVAL_MS", "5"))
+
+# --- Conversation State ---
+# Number of conversations kept in memory, how often (seconds) pending changes
+# are written to SQLite and whether writes are batched ("write_behind") or
+# persisted immediately ("write_through").
+CONVERSATION_CACHE_SIZE = int(os.getenv("CONVERSATION_CACHE_SIZE", "1000"))
+CONVERSATION_FLUSH_INTERVAL = float(os.getenv("CONVERSATION_FLUSH_INTERVAL", "2"))
+CONVERSATION_DURABILITY = os.getenv("CONVERSATION_DURABILITY", "write_behind")
+
+# --- Flows ---
+# Seconds between checks of bot/data/flows for edited files (0 disables hot reload)
+FLOW_RELOAD_INTERVAL = float(os.getenv("FLOW_RELOAD_INTERVAL", "5"))
 
 # --- Google Services ---
 GOOGLE_SERVICE_ACCOUNT_FILE = os.getenv("GOOGLE_SERVICE_ACCOUNT_FILE")
@@ -20,16 +44,53 @@ if GOOGLE_SERVICE_ACCOUNT_FILE and not os.path.isabs(GOOGLE_SERVICE_ACCOUNT_FILE
     GOOGLE_SERVICE_ACCOUNT_FILE = str(Path(__file__).parent.parent / GOOGLE_SERVICE_ACCOUNT_FILE)
 WORK_GOOGLE_CALENDAR_ID = os.getenv("WORK_GOOGLE_CALENDAR_ID")
 PERSONAL_GOOGLE_CALENDAR_ID = os.getenv("PERSONAL_GOOGLE_CALENDAR_ID")
+# Seconds during which repeated agenda views reuse the last incremental calendar sync
+CALENDAR_SYNC_MIN_INTERVAL = float(os.getenv("CALENDAR_SYNC_MIN_INTERVAL", "30"))
 
 # --- Webhooks (n8n) ---
 N8N_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_URL")
 N8N_TEST_WEBHOOK_URL = os.getenv("N8N_WEBHOOK_TEST_URL")
+# Events sent per request and parallel requests. The default of 1 sends each event on its own;
+# larger batches arrive in n8n as a single item whose body is an array, so the workflow must split it
+WEBHOOK_BATCH_SIZE = int(os.getenv("WEBHOOK_BATCH_SIZE", "1"))
+WEBHOOK_MAX_CONCURRENCY = int(os.getenv("WEBHOOK_MAX_CONCURRENCY", "4"))
+WEBHOOK_TIMEOUT = float(os.getenv("WEBHOOK_TIMEOUT", "10"))
+# Failed deliveries are retried with exponential backoff (seconds) and jitter
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "10"))
+WEBHOOK_RETRY_BASE_DELAY = float(os.getenv("WEBHOOK_RETRY_BASE_DELAY", "2"))
+WEBHOOK_RETRY_MAX_DELAY = float(os.getenv("WEBHOOK_RETRY_MAX_DELAY", "600"))
 
 # --- AI Core ---
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Timeout in seconds for each OpenAI request
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Retries for connection errors, 429 and 5xx (the SDK waits what Retry-After says)
+OPENAI_MAX_RETRIES = int(os.getenv("OPENAI_MAX_RETRIES", "3"))
+# Keep-alive connections shared by all OpenAI requests
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+# Cached LLM responses kept in memory (LRU); the rest stay in SQLite
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "256"))
+# Seconds a cached LLM response is reused (0 disables the cache)
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "604800"))
+# Voice notes transcribed at the same time (the rest wait their turn)
+TRANSCRIPTION_MAX_CONCURRENCY = int(os.getenv("TRANSCRIPTION_MAX_CONCURRENCY", "3"))
+# ffmpeg executable used to shrink and split voice notes (skipped if not installed)
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+# ffmpeg processes running at once across all voice notes (default: one per CPU)
+AUDIO_MAX_PROCESSES = int(os.getenv("AUDIO_MAX_PROCESSES", "0")) or os.cpu_count() or 1
+# Longest chunk, in seconds, sent to Whisper; longer notes are split on pauses
+AUDIO_CHUNK_SECONDS = float(os.getenv("AUDIO_CHUNK_SECONDS", "45"))
+# Level below which audio counts as silence, and the shortest pause to split on
+AUDIO_SILENCE_THRESHOLD = os.getenv("AUDIO_SILENCE_THRESHOLD", "-35dB")
+AUDIO_MIN_SILENCE = float(os.getenv("AUDIO_MIN_SILENCE", "0.4"))
 DAILY_SUMMARY_TIME = os.getenv("AI_DAILY_SUMMARY_TIME", "08:00")
 TIMEZONE = os.getenv("TIMEZONE", "America/Monterrey")
+# Telegram limits for fanned-out messages: messages per second overall, and seconds
+# between messages to the same private chat or group
+BROADCAST_GLOBAL_RATE = float(os.getenv("BROADCAST_GLOBAL_RATE", "25"))
+BROADCAST_PER_CHAT_INTERVAL = float(os.getenv("BROADCAST_PER_CHAT_INTERVAL", "1"))
+BROADCAST_GROUP_INTERVAL = float(os.getenv("BROADCAST_GROUP_INTERVAL", "3"))
 
 # --- Scheduling ---
 CALENDLY_LINK = os.getenv("CALENDLY_LINK")
@@ -37,16 +98,44 @@ CALENDLY_LINK = os.getenv("CALENDLY_LINK")
 # --- Vikunja (Task Management) ---
 VIKUNJA_API_URL = os.getenv("VIKUNJA_BASE_URL")
 VIKUNJA_API_TOKEN = os.getenv("VIKUNJA_TOKEN")
+# Seconds per request, pooled keep-alive connections, simultaneous requests
+# and page size used when listing projects/tasks
+VIKUNJA_TIMEOUT = float(os.getenv("VIKUNJA_TIMEOUT", "10"))
+VIKUNJA_MAX_CONNECTIONS = int(os.getenv("VIKUNJA_MAX_CONNECTIONS", "10"))
+VIKUNJA_MAX_CONCURRENCY = int(os.getenv("VIKUNJA_MAX_CONCURRENCY", "5"))
+VIKUNJA_PAGE_SIZE = int(os.getenv("VIKUNJA_PAGE_SIZE", "50"))
+# Project/task lists are served from memory for VIKUNJA_CACHE_TTL seconds and
+# then, up to VIKUNJA_CACHE_MAX_STALE seconds, served stale while refreshed
+VIKUNJA_CACHE_TTL = float(os.getenv("VIKUNJA_CACHE_TTL", "60"))
+VIKUNJA_CACHE_MAX_STALE = float(os.getenv("VIKUNJA_CACHE_MAX_STALE", "3600"))
 
 # --- Email Configuration (SMTP / IMAP) ---
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = os.getenv("SMTP_PORT")
 SMTP_USER = os.getenv("SMTP_USER")
 SMTP_PASS = os.getenv("SMTP_PASSWORD")
+# Seconds to wait on the SMTP server, and to keep an idle session open for the next print job
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "30"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "120"))
 
 IMAP_SERVER = os.getenv("IMAP_SERVER")
 IMAP_USER = os.getenv("IMAP_USER")
 IMAP_PASS = os.getenv("IMAP_PASSWORD")
+IMAP_MAILBOX = os.getenv("IMAP_MAILBOX", "INBOX")
+IMAP_TIMEOUT = float(os.getenv("IMAP_TIMEOUT", "30"))
+# Keep a connection in IMAP IDLE so printer replies are handled as soon as they arrive
+IMAP_IDLE = os.getenv("IMAP_IDLE", "false").lower() in ("1", "true", "yes")
+# Seconds before an IDLE command is renewed (servers may drop it after 30 minutes)
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", "1500"))
+# Seconds between checks of the printer mailbox for job status replies (0 disables)
+PRINT_STATUS_POLL_INTERVAL = int(os.getenv("PRINT_STATUS_POLL_INTERVAL", "120"))
 
 # --- Printer (Epson Connect) ---
 PRINTER_EMAIL = os.getenv("PRINTER_EMAIL")
+# Queued print jobs sent over one SMTP connection in a single round
+PRINT_BATCH_SIZE = int(os.getenv("PRINT_BATCH_SIZE", "10"))
+# Documents to print are buffered in memory up to this many bytes, then in an anonymous temp file
+PRINT_SPOOL_MAX_MEMORY = int(os.getenv("PRINT_SPOOL_MAX_MEMORY", str(2 * 1024 * 1024)))
+# Seconds to wait on the Telegram file API, and how many documents are downloaded at once
+DOCUMENT_DOWNLOAD_TIMEOUT = float(os.getenv("DOCUMENT_DOWNLOAD_TIMEOUT", "60"))
+DOCUMENT_MAX_CONCURRENT_DOWNLOADS = int(os.getenv("DOCUMENT_MAX_CONCURRENT_DOWNLOADS", "3"))
@@ -1,18 +1,42 @@
 # bot/db.py
 # This module will handle the database connection and operations.
 
+import asyncio
+import itertools
 import sqlite3
 import logging
 import os
 import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from bot.config import DB_POOL_SIZE, DB_BUSY_TIMEOUT, DB_BATCH_MAX_ROWS, DB_BATCH_INTERVAL_MS
 
 DATABASE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "users.db")
 
+# Size of sqlite3's per-connection prepared statement cache. The DAL only uses
+# constant SQL strings, so every statement is compiled once per connection.
+STATEMENT_CACHE_SIZE = 256
+
 logger = logging.getLogger(__name__)
 
 # Use a thread-local object to manage the database connection
 local = threading.local()
 
+
+def connect(read_only=False):
+    """Opens a new SQLite connection configured for concurrent WAL access."""
+    conn = sqlite3.connect(
+        DATABASE_FILE,
+        timeout=DB_BUSY_TIMEOUT,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA synchronous=NORMAL")
+    if read_only:
+        conn.execute("PRAGMA query_only=ON")
+    return conn
+
 def get_db_connection():
     """Creates a connection to the SQLite database."""
     if hasattr(local, "conn"):
@@ -26,8 +50,7 @@ def get_db_connection():
             del local.conn
     
     logger.debug("Creating new database connection")
-    local.conn = sqlite3.connect(DATABASE_FILE, check_same_thread=False)
-    local.conn.row_factory = sqlite3.Row
+    local.conn = connect()
     return local.conn
 
 def close_db_connection():
@@ -49,6 +72,10 @@ def setup_database():
         conn = get_db_connection()
         cursor = conn.cursor()
 
+        # WAL lets the reader pool query while the writer commits. The mode is
+        # persistent, so setting it once here covers every later connection.
+        cursor.execute("PRAGMA journal_mode=WAL")
+
         # Create the users table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
@@ -71,6 +98,85 @@ def setup_database():
             )
         """)
 
+        # Create the LLM response cache (see bot/modules/llm_cache.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                cache_key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                prompt_tokens INTEGER NOT NULL DEFAULT 0,
+                completion_tokens INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_created_at ON llm_cache (created_at)")
+
+        # Create the print jobs table (see bot/modules/print_queue.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS print_jobs (
+                job_id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                chat_id INTEGER NOT NULL,
+                file_name TEXT NOT NULL,
+                status TEXT NOT NULL CHECK(status IN ('queued', 'sent', 'received', 'completed', 'failed')),
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        """)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_print_jobs_user ON print_jobs (user_id, created_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_print_jobs_status ON print_jobs (status)")
+
+        # Outgoing webhook events waiting for delivery (see bot/webhook_client.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS webhook_outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                endpoint TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL CHECK(status IN ('pending', 'dead')),
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_webhook_outbox_due ON webhook_outbox (status, next_attempt_at)"
+        )
+
+        # Daily summary recipients: one chat or every user with a role (see bot/scheduler.py).
+        # `source` is 'config' for the owner's row that follows DAILY_SUMMARY_TIME and
+        # 'manual' for rows added with /subscriptions.
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS summary_subscriptions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id INTEGER,
+                role TEXT CHECK(role IN ('admin', 'crew')),
+                send_time TEXT NOT NULL,
+                last_sent_on TEXT,
+                source TEXT NOT NULL DEFAULT 'manual' CHECK(source IN ('manual', 'config')),
+                created_at REAL NOT NULL,
+                CHECK((chat_id IS NULL) != (role IS NULL))
+            )
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_summary_subscriptions_chat
+            ON summary_subscriptions (chat_id, send_time) WHERE chat_id IS NOT NULL
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_summary_subscriptions_role
+            ON summary_subscriptions (role, send_time) WHERE role IS NOT NULL
+        """)
+
+        # Last processed UID of each monitored mailbox (see bot/modules/print_monitor.py)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS imap_state (
+                mailbox TEXT PRIMARY KEY,
+                uid_validity INTEGER NOT NULL,
+                last_uid INTEGER NOT NULL
+            )
+        """)
+
         conn.commit()
         logger.info("Database setup complete. 'users' table is ready.")
     except sqlite3.Error as e:
@@ -79,6 +185,259 @@ def setup_database():
         if conn:
             close_db_connection()
 
+
+# --- Async data-access layer ---
+# Handlers must never run blocking sqlite3 calls on the event loop. All DB work
+# goes through these coroutines, which run it on dedicated executors: a pool of
+# read-only WAL readers and a single writer thread (SQLite allows one writer at
+# a time, so serialising writes here avoids "database is locked" retries).
+# Each executor thread keeps its own connection for its lifetime.
+
+_pool_local = threading.local()
+_pool_connections = []
+_pool_lock = threading.Lock()
+_reader_executor = None
+_writer_executor = None
+
+
+def _pool_connection(read_only):
+    """Returns the calling executor thread's own connection, opening it on first use."""
+    conn = getattr(_pool_local, "conn", None)
+    if conn is None:
+        conn = connect(read_only=read_only)
+        _pool_local.conn = conn
+        with _pool_lock:
+            _pool_connections.append(conn)
+    return conn
+
+
+def _get_executors():
+    global _reader_executor, _writer_executor
+    with _pool_lock:
+        if _reader_executor is None:
+            _reader_executor = ThreadPoolExecutor(max_workers=DB_POOL_SIZE, thread_name_prefix="db-reader")
+            _writer_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        return _reader_executor, _writer_executor
+
+
+def _read(fn, args):
+    return fn(_pool_connection(read_only=True), *args)
+
+
+def _write(fn, args):
+    conn = _pool_connection(read_only=False)
+    try:
+        result = fn(conn, *args)
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+async def run_read(fn, *args):
+    """Runs `fn(conn, *args)` on the reader pool and returns its result."""
+    reader, _ = _get_executors()
+    return await asyncio.get_running_loop().run_in_executor(reader, _read, fn, args)
+
+
+async def run_write(fn, *args):
+    """
+    Runs `fn(conn, *args)` on the writer thread inside a transaction.
+    The transaction is committed if `fn` returns and rolled back if it raises.
+    """
+    _, writer = _get_executors()
+    return await asyncio.get_running_loop().run_in_executor(writer, _write, fn, args)
+
+
+async def fetch_one(sql, params=()):
+    """Executes a query on the reader pool and returns the first row or None."""
+    return await run_read(lambda conn: conn.execute(sql, params).fetchone())
+
+
+async def fetch_all(sql, params=()):
+    """Executes a query on the reader pool and returns all rows."""
+    return await run_read(lambda conn: conn.execute(sql, params).fetchall())
+
+
+async def execute(sql, params=()):
+    """Executes a single write statement and commits it. Returns the row count."""
+    return await run_write(lambda conn: conn.execute(sql, params).rowcount)
+
+
+async def execute_many(sql, seq_of_params):
+    """Executes a write statement for every parameter tuple in one transaction."""
+    return await run_write(lambda conn: conn.executemany(sql, seq_of_params).rowcount)
+
+
+# --- Group commit ---
+# Small writes from many concurrent updates (conversation state, user upserts)
+# are collected for a few milliseconds and committed together, so a burst of
+# users costs one transaction instead of one fsync per row.
+
+def _apply_mutations(conn, mutations):
+    """Applies (sql, params) mutations in order, batching runs of the same SQL."""
+    for sql, group in itertools.groupby(mutations, key=lambda mutation: mutation[0]):
+        rows = [params for _, params in group]
+        if len(rows) == 1:
+            conn.execute(sql, rows[0])
+        else:
+            conn.executemany(sql, rows)
+
+
+class BatchWriter:
+    """
+    Collects write statements and commits them in a single transaction every
+    `interval` seconds or as soon as `max_rows` statements are pending.
+
+    `submit()` returns a future that resolves once the statement is durable,
+    so callers choose between fire-and-forget and awaiting the commit.
+    """
+
+    def __init__(self, max_rows=DB_BATCH_MAX_ROWS, interval=DB_BATCH_INTERVAL_MS / 1000):
+        self.max_rows = max(1, int(max_rows))
+        self.interval = max(0.0, interval)
+        self.loop = None
+        self.commits = 0
+        self.rows = 0
+        self._pending = []
+        self._inflight = []
+        self._wakeup = asyncio.Event()
+        self._full = asyncio.Event()
+        self._task = None
+
+    def submit(self, sql, params=()):
+        """Queues a write statement and returns a future resolved on commit."""
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done():
+            self.loop = loop
+            self._task = loop.create_task(self._run())
+        future = loop.create_future()
+        self._pending.append((sql, params, future))
+        self._wakeup.set()
+        if len(self._pending) >= self.max_rows:
+            self._full.set()
+        return future
+
+    async def flush(self):
+        """Commits everything queued so far and waits for it."""
+        futures = [future for _, _, future in self._pending] + self._inflight
+        if not futures:
+            return
+        self._full.set()
+        await asyncio.gather(*futures, return_exceptions=True)
+
+    async def close(self):
+        """Flushes pending writes and stops the background task."""
+        await self.flush()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            # Group-commit window: let concurrent updates join this batch
+            if len(self._pending) < self.max_rows:
+                try:
+                    await asyncio.wait_for(self._full.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self._pending = self._pending[:self.max_rows], self._pending[self.max_rows:]
+            self._full.clear()
+            if not self._pending:
+                self._wakeup.clear()
+            if batch:
+                await self._commit(batch)
+
+    async def _commit(self, batch):
+        self._inflight = [future for _, _, future in batch]
+        try:
+            try:
+                await run_write(_apply_mutations, [(sql, params) for sql, params, _ in batch])
+                self.commits += 1
+                self.rows += len(batch)
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_result(None)
+            except Exception as e:
+                # Isolate the failing statement so the rest of the batch still lands
+                logger.error(f"Group commit of {len(batch)} statements failed ({e}). Retrying individually.")
+                for sql, params, future in batch:
+                    try:
+                        await run_write(_apply_mutations, [(sql, params)])
+                        self.commits += 1
+                        self.rows += 1
+                        if not future.done():
+                            future.set_result(None)
+                    except Exception as row_error:
+                        if not future.done():
+                            future.set_exception(row_error)
+        finally:
+            self._inflight = []
+
+
+_batch_writer = None
+
+
+def get_batch_writer():
+    """Returns the group-commit writer bound to the running event loop."""
+    global _batch_writer
+    loop = asyncio.get_running_loop()
+    if _batch_writer is None or (_batch_writer.loop is not None and _batch_writer.loop is not loop):
+        _batch_writer = BatchWriter()
+    return _batch_writer
+
+
+def submit_write(sql, params=()):
+    """Queues a write for the next group commit without waiting for it."""
+    return get_batch_writer().submit(sql, params)
+
+
+async def write(sql, params=()):
+    """Queues a write for the next group commit and waits until it is durable."""
+    await submit_write(sql, params)
+
+
+async def write_many(sql, seq_of_params):
+    """Queues one write per parameter tuple and waits until all are durable."""
+    writer = get_batch_writer()
+    futures = [writer.submit(sql, params) for params in seq_of_params]
+    if futures:
+        await asyncio.gather(*futures)
+
+
+async def close_batch_writer():
+    """Commits pending group writes and stops the writer task."""
+    global _batch_writer
+    if _batch_writer is not None:
+        await _batch_writer.close()
+        _batch_writer = None
+
+
+def shutdown_pool():
+    """Stops the DAL executors and closes their connections."""
+    global _reader_executor, _writer_executor
+    with _pool_lock:
+        executors = [e for e in (_reader_executor, _writer_executor) if e is not None]
+        _reader_executor = _writer_executor = None
+    for executor in executors:
+        executor.shutdown(wait=True)
+    with _pool_lock:
+        connections = list(_pool_connections)
+        _pool_connections.clear()
+    for conn in connections:
+        try:
+            conn.close()
+        except Exception as e:
+            logger.error(f"Error closing pooled database connection: {e}")
+    logger.debug(f"Closed {len(connections)} pooled database connections.")
+
+
 if __name__ == '__main__':
     # This allows us to run the script directly to initialize the database
     logging.basicConfig(level=logging.INFO)
@@ -1,6 +1,7 @@
 # bot/main.py
 # Este es el archivo principal del bot. Aquí se inicia todo y se configuran los comandos.
 
+import asyncio
 import logging
 import sys
 from pathlib import Path
@@ -22,15 +23,41 @@ if __package__ is None:
         sys.path.insert(0, str(project_root))
 
 # Importamos las configuraciones y herramientas que creamos en otros archivos
-from bot.config import TELEGRAM_BOT_TOKEN
-from bot.modules.identity import get_user_role
+from bot.config import (
+    TELEGRAM_BOT_TOKEN,
+    CONVERSATION_FLUSH_INTERVAL,
+    FLOW_RELOAD_INTERVAL,
+    PRINT_STATUS_POLL_INTERVAL,
+    IMAP_SERVER,
+    IMAP_IDLE,
+)
+from bot.modules.identity import get_user_role, is_admin
 from bot.modules.onboarding import handle_start as onboarding_handle_start
-from bot.modules.printer import handle_document, check_print_status
-from bot.db import setup_database, close_db_connection
+from bot.modules.printer import (
+    handle_document,
+    check_print_status,
+    notify_print_job,
+    poll_print_status,
+    apply_status_replies,
+)
+from bot.modules.print_queue import print_queue, fail_interrupted_jobs
+from bot.modules.print_monitor import status_monitor
+from bot.db import setup_database, close_db_connection, close_batch_writer, shutdown_pool
 from bot.modules.flow_engine import FlowEngine
 from bot.modules.dispatcher import button_dispatcher
 from bot.modules.message_handler import text_and_voice_handler
-from bot.scheduler import schedule_daily_summary
+from bot.modules.vikunja import close_client as close_vikunja_client
+from bot.modules.document_download import close_client as close_download_client
+from bot.webhook_client import dispatcher as webhook_dispatcher
+from bot.modules.calendar import warm_up as warm_up_calendar
+from bot.modules.audio_processing import check_ffmpeg
+from bot.modules.service_catalog import warm_up as warm_up_services
+from bot.modules.llm_engine import (
+    close_client as close_llm_client,
+    get_cache_stats as get_llm_cache_stats,
+    response_cache as llm_response_cache,
+)
+from bot.scheduler import schedule_daily_summary, ensure_owner_subscription, manage_subscriptions
 
 # Configuramos el sistema de logs para ver mensajes de estado en la consola
 logging.basicConfig(
@@ -48,10 +75,10 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Reset any existing conversation flow
     flow_engine = context.bot_data.get("flow_engine")
     if flow_engine:
-        flow_engine.end_flow(chat_id)
+        await flow_engine.end_flow(chat_id)
         logger.info(f"User {chat_id} started a new conversation, clearing any previous state.")
 
-    user_role = get_user_role(chat_id)
+    user_role = await get_user_role(chat_id)
     logger.info(f"Usuario {chat_id} inició conversación con el rol: {user_role}")
 
     # Obtenemos el texto y los botones de bienvenida desde el módulo de onboarding
@@ -68,15 +95,71 @@ async def check_print_status_command(update: Update, context: ContextTypes.DEFAU
     await update.message.reply_text(response)
 
 
+async def subscriptions_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Admin command to list, add and remove daily summary subscriptions."""
+    if not await is_admin(update.effective_user.id):
+        await update.message.reply_text("Este comando es solo para administradores.")
+        return
+    response = await manage_subscriptions(context.args or [])
+    await update.message.reply_text(response)
+
+
 async def reset_conversation(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Resets the conversation state for the user."""
     user_id = update.effective_user.id
     flow_engine = context.bot_data["flow_engine"]
-    flow_engine.end_flow(user_id)
+    await flow_engine.end_flow(user_id)
     await update.message.reply_text("🔄 Conversación reiniciada. Puedes empezar de nuevo.")
     logger.info(f"User {user_id} reset their conversation.")
 
 
+async def flush_conversation_state(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Periodically writes pending conversation changes to the database."""
+    await context.bot_data["flow_engine"].flush()
+
+
+async def reload_flows(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Picks up edited flow files without restarting the bot."""
+    await asyncio.to_thread(context.bot_data["flow_engine"].reload_flows)
+
+
+async def prune_llm_cache(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Drops expired LLM responses and logs how much the cache is saving."""
+    await llm_response_cache.prune()
+    stats = get_llm_cache_stats()
+    logger.info(
+        f"Caché LLM: {stats['hit_ratio']:.0%} de aciertos, "
+        f"{stats['saved_prompt_tokens'] + stats['saved_completion_tokens']} tokens ahorrados."
+    )
+
+
+async def on_startup(application: Application) -> None:
+    """Runs before polling starts."""
+    # Print jobs that were still queued when the bot stopped lost their files
+    await fail_interrupted_jobs()
+    await ensure_owner_subscription()
+    check_ffmpeg()
+    if IMAP_IDLE and IMAP_SERVER:
+        status_monitor.start_idle(asyncio.get_running_loop())
+    # Delivers webhook events queued before the restart and any new ones
+    webhook_dispatcher.start()
+
+
+async def on_shutdown(application: Application) -> None:
+    """Persists pending state and releases database resources on shutdown."""
+    flow_engine = application.bot_data.get("flow_engine")
+    if flow_engine:
+        await flow_engine.flush()
+    await print_queue.close()
+    await asyncio.to_thread(status_monitor.close)
+    await webhook_dispatcher.close()
+    await close_batch_writer()
+    await close_vikunja_client()
+    await close_download_client()
+    await close_llm_client()
+    shutdown_pool()
+
+
 def main() -> None:
     """Función principal que arranca el bot."""
     if not TELEGRAM_BOT_TOKEN:
@@ -85,16 +168,43 @@ def main() -> None:
 
     setup_database()
 
-    application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(TELEGRAM_BOT_TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     flow_engine = FlowEngine()
     application.bot_data["flow_engine"] = flow_engine
 
+    # The print queue reports each finished job back to the user's chat
+    print_queue.notify = lambda job: notify_print_job(application.bot, job)
+    status_monitor.on_replies = lambda subjects: apply_status_replies(subjects, application.bot)
+
     schedule_daily_summary(application)
+    application.job_queue.run_repeating(
+        flush_conversation_state,
+        interval=CONVERSATION_FLUSH_INTERVAL,
+        name="flush_conversation_state",
+    )
+    if FLOW_RELOAD_INTERVAL > 0:
+        application.job_queue.run_repeating(reload_flows, interval=FLOW_RELOAD_INTERVAL, name="reload_flows")
+    if llm_response_cache.ttl > 0:
+        application.job_queue.run_repeating(prune_llm_cache, interval=24 * 60 * 60, first=60, name="prune_llm_cache")
+    if PRINT_STATUS_POLL_INTERVAL > 0:
+        application.job_queue.run_repeating(
+            poll_print_status, interval=PRINT_STATUS_POLL_INTERVAL, first=30, name="poll_print_status"
+        )
+    # El cliente de Google Calendar y el catálogo de servicios se preparan en segundo plano tras arrancar
+    application.job_queue.run_once(warm_up_calendar, when=0, name="warm_up_calendar")
+    application.job_queue.run_once(warm_up_services, when=0, name="warm_up_services")
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("reset", reset_conversation))
     application.add_handler(CommandHandler("check_print_status", check_print_status_command))
+    application.add_handler(CommandHandler("subscriptions", subscriptions_command))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_document))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND | filters.VOICE, text_and_voice_handler))
     application.add_handler(CallbackQueryHandler(button_dispatcher))
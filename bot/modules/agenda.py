@@ -4,7 +4,7 @@
 
 import datetime
 import logging
-from bot.modules.calendar import get_events
+from bot.modules.calendar import get_events_for_calendars
 from bot.config import WORK_GOOGLE_CALENDAR_ID, PERSONAL_GOOGLE_CALENDAR_ID
 
 logger = logging.getLogger(__name__)
@@ -22,11 +22,16 @@ async def get_agenda():
 
         logger.info(f"Buscando eventos de trabajo en {WORK_GOOGLE_CALENDAR_ID} y personales en {PERSONAL_GOOGLE_CALENDAR_ID}")
 
-        # Obtener eventos de trabajo (para mostrar)
-        work_events = get_events(start_of_day, end_of_day, calendar_id=WORK_GOOGLE_CALENDAR_ID)
+        # Ambos calendarios se consultan a la vez, fuera del event loop
+        events = await get_events_for_calendars(
+            start_of_day, end_of_day, [WORK_GOOGLE_CALENDAR_ID, PERSONAL_GOOGLE_CALENDAR_ID]
+        )
 
-        # Obtener eventos personales (para comprobar bloqueos, no se muestran)
-        personal_events = get_events(start_of_day, end_of_day, calendar_id=PERSONAL_GOOGLE_CALENDAR_ID)
+        # Eventos de trabajo (para mostrar)
+        work_events = events.get(WORK_GOOGLE_CALENDAR_ID, [])
+
+        # Eventos personales (para comprobar bloqueos, no se muestran)
+        personal_events = events.get(PERSONAL_GOOGLE_CALENDAR_ID, [])
 
         if not work_events and not personal_events:
             logger.info("No se encontraron eventos de ningún tipo.")
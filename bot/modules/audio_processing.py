@@ -0,0 +1,181 @@
+# bot/modules/audio_processing.py
+# Audio preprocessing with ffmpeg before sending voice notes to Whisper:
+# downmix to mono, resample to 16 kHz, encode as low-bitrate Opus, trim
+# leading/trailing silence and split long notes on pauses.
+#
+# ffmpeg-python only builds the command lines; the processes run with
+# asyncio subprocesses and exchange audio over stdin/stdout, so nothing is
+# written to disk and the event loop is never blocked.
+
+import asyncio
+import logging
+import re
+import shutil
+
+from bot.config import (
+    FFMPEG_BINARY,
+    AUDIO_MAX_PROCESSES,
+    AUDIO_CHUNK_SECONDS,
+    AUDIO_SILENCE_THRESHOLD,
+    AUDIO_MIN_SILENCE,
+)
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+OPUS_BITRATE = "24k"
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*(-?[\d.]+)")
+_PROGRESS_TIME = re.compile(r"time=(\d+):(\d+):([\d.]+)")
+
+# Every ffmpeg process (normalise, detect and each chunk's encode) takes a slot,
+# so long notes and concurrent voice messages cannot spawn encoders without bound
+_process_slots = asyncio.Semaphore(AUDIO_MAX_PROCESSES)
+
+
+class AudioProcessingError(Exception):
+    """Raised when ffmpeg fails to process an audio file."""
+
+
+def ffmpeg_available():
+    """Whether the ffmpeg binary can be found."""
+    return shutil.which(FFMPEG_BINARY) is not None
+
+
+def check_ffmpeg():
+    """
+    Called once at startup: warns if ffmpeg is missing, since voice notes are
+    then sent to Whisper without preprocessing. Returns whether it was found.
+    """
+    available = ffmpeg_available()
+    if not available:
+        logger.warning(
+            f"ffmpeg ('{FFMPEG_BINARY}') not found: voice notes will be transcribed without "
+            "normalisation or splitting. Install ffmpeg or set FFMPEG_BINARY."
+        )
+    return available
+
+
+async def _run(stream, audio):
+    """Runs a compiled ffmpeg-python stream feeding `audio` on stdin. Returns (stdout, stderr)."""
+    args = stream.global_args("-hide_banner", "-loglevel", "info").compile(cmd=FFMPEG_BINARY)
+    async with _process_slots:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate(audio)
+    stderr = stderr.decode("utf-8", errors="replace")
+    if process.returncode != 0:
+        raise AudioProcessingError(f"ffmpeg exited with {process.returncode}: {stderr[-500:]}")
+    return stdout, stderr
+
+
+def _opus_output(stream, **options):
+    return stream.output(
+        "pipe:1", f="ogg", acodec="libopus", audio_bitrate=OPUS_BITRATE,
+        ac=1, ar=SAMPLE_RATE, **options,
+    )
+
+
+async def normalize(audio):
+    """
+    Returns the audio as 16 kHz mono Opus with leading and trailing silence removed.
+    Trailing silence is trimmed by reversing the signal, trimming its start and
+    reversing it back.
+    """
+    import ffmpeg
+
+    trim = f"silenceremove=start_periods=1:start_threshold={AUDIO_SILENCE_THRESHOLD}:start_silence=0.1"
+    stream = _opus_output(ffmpeg.input("pipe:0"), af=f"{trim},areverse,{trim},areverse")
+    processed, _ = await _run(stream, audio)
+    return processed
+
+
+def parse_silences(stderr):
+    """
+    Extracts the silences reported by ffmpeg's silencedetect filter and the
+    total duration (from the last progress line). Returns (silences, duration)
+    where silences is a list of (start, end) in seconds.
+    """
+    starts = [float(value) for value in _SILENCE_START.findall(stderr)]
+    ends = [float(value) for value in _SILENCE_END.findall(stderr)]
+    times = _PROGRESS_TIME.findall(stderr)
+    duration = None
+    if times:
+        hours, minutes, seconds = times[-1]
+        duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    # A silence that lasts until the end has a start but no end
+    if duration is not None and len(ends) < len(starts):
+        ends.append(duration)
+    return [(max(0.0, start), end) for start, end in zip(starts, ends)], duration
+
+
+def plan_chunks(silences, duration, max_chunk=AUDIO_CHUNK_SECONDS):
+    """
+    Chooses where to cut a recording of `duration` seconds so that no chunk
+    is longer than `max_chunk`. Each cut lands in the middle of the last
+    silence before the limit; if there is none, the chunk is cut at the limit.
+    Returns a list of (start, end) in seconds.
+    """
+    if duration is None or duration <= max_chunk:
+        return [(0.0, duration)]
+    cut_points = [(start + end) / 2 for start, end in silences]
+    chunks = []
+    start = 0.0
+    while duration - start > max_chunk:
+        limit = start + max_chunk
+        candidates = [point for point in cut_points if start < point <= limit]
+        end = candidates[-1] if candidates else limit
+        chunks.append((start, end))
+        start = end
+    chunks.append((start, duration))
+    return chunks
+
+
+async def split_on_silence(audio):
+    """
+    Splits an (already normalised) recording into chunks of at most
+    AUDIO_CHUNK_SECONDS, cutting on pauses. The chunks are encoded in parallel,
+    at most AUDIO_MAX_PROCESSES ffmpeg processes at a time across the bot.
+    Returns a list of audio byte strings in playback order.
+    """
+    import ffmpeg
+
+    detect = ffmpeg.input("pipe:0").output(
+        "-", f="null", af=f"silencedetect=noise={AUDIO_SILENCE_THRESHOLD}:d={AUDIO_MIN_SILENCE}"
+    )
+    _, stderr = await _run(detect, audio)
+    silences, duration = parse_silences(stderr)
+    chunks = plan_chunks(silences, duration)
+    if len(chunks) == 1:
+        return [audio]
+
+    logger.info(f"Splitting {duration:.1f}s of audio into {len(chunks)} chunks.")
+    outputs = await asyncio.gather(*[
+        _run(_opus_output(ffmpeg.input("pipe:0"), ss=f"{start:.3f}", to=f"{end:.3f}"), audio)
+        for start, end in chunks
+    ])
+    return [stdout for stdout, _ in outputs if stdout]
+
+
+async def prepare_for_transcription(audio):
+    """
+    Normalises and splits a voice note. If ffmpeg is not installed or fails,
+    the original audio is returned unchanged as a single chunk (a missing
+    ffmpeg is reported once at startup by `check_ffmpeg`).
+    """
+    if not ffmpeg_available():
+        return [audio]
+    try:
+        processed = await normalize(audio)
+        if not processed:
+            return [audio]
+        logger.info(f"Audio preprocessed: {len(audio)} -> {len(processed)} bytes.")
+        return await split_on_silence(processed)
+    except (AudioProcessingError, OSError) as e:
+        logger.error(f"Error preprocessing audio, sending it unchanged: {e}")
+        return [audio]
@@ -0,0 +1,134 @@
+# bot/modules/availability.py
+# Motor de disponibilidad: calcula espacios libres a partir de intervalos ocupados.
+# No depende de Google; `calendar.get_available_slots` le pasa los datos de freebusy.
+
+import datetime
+
+
+def parse_busy_intervals(busy_slots):
+    """
+    Convierte la lista `busy` de freebusy ([{"start": iso, "end": iso}, ...])
+    en tuplas (inicio, fin). Cada fecha se parsea una sola vez.
+    """
+    intervals = []
+    for busy in busy_slots:
+        start = datetime.datetime.fromisoformat(busy["start"].replace("Z", "+00:00"))
+        end = datetime.datetime.fromisoformat(busy["end"].replace("Z", "+00:00"))
+        if start < end:
+            intervals.append((start, end))
+    return intervals
+
+
+def merge_intervals(intervals):
+    """Ordena y fusiona intervalos que se solapan o se tocan."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def working_hours_windows(start_time, end_time, working_hours, tz=None):
+    """
+    Devuelve las ventanas de horario laboral dentro de [start_time, end_time).
+
+    `working_hours` puede ser:
+    - una lista de tuplas (hora_inicio, hora_fin) aplicada a todos los días, o
+    - un diccionario {día_de_la_semana: [(hora_inicio, hora_fin), ...]} donde
+      0 es lunes; los días que no aparecen no tienen horario.
+
+    Las horas son `datetime.time` interpretadas en la zona `tz` (por defecto la
+    de `start_time`).
+    """
+    tz = tz or start_time.tzinfo
+    local_start = start_time.astimezone(tz) if tz else start_time
+    local_end = end_time.astimezone(tz) if tz else end_time
+
+    windows = []
+    day = local_start.date()
+    while day <= local_end.date():
+        if isinstance(working_hours, dict):
+            ranges = working_hours.get(day.weekday(), [])
+        else:
+            ranges = working_hours
+        for opens, closes in ranges:
+            window_start = _localize(datetime.datetime.combine(day, opens), tz)
+            window_end = _localize(datetime.datetime.combine(day, closes), tz)
+            window_start = max(window_start, start_time)
+            window_end = min(window_end, end_time)
+            if window_start < window_end:
+                windows.append((window_start, window_end))
+        day += datetime.timedelta(days=1)
+    return merge_intervals(windows)
+
+
+def _localize(naive, tz):
+    if tz is None:
+        return naive
+    if hasattr(tz, "localize"):  # zonas de pytz
+        return tz.localize(naive)
+    return naive.replace(tzinfo=tz)
+
+
+def free_windows(start_time, end_time, busy_intervals, allowed_windows=None):
+    """
+    Resta los intervalos ocupados (ya fusionados y ordenados) de las ventanas
+    permitidas con un único barrido sobre ambas listas.
+    """
+    allowed = allowed_windows if allowed_windows is not None else [(start_time, end_time)]
+    free = []
+    index = 0
+    for window_start, window_end in allowed:
+        # Saltamos los ocupados que terminan antes de esta ventana
+        while index < len(busy_intervals) and busy_intervals[index][1] <= window_start:
+            index += 1
+        cursor = window_start
+        position = index
+        while position < len(busy_intervals) and busy_intervals[position][0] < window_end:
+            busy_start, busy_end = busy_intervals[position]
+            if busy_start > cursor:
+                free.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+            position += 1
+        if cursor < window_end:
+            free.append((cursor, window_end))
+    return free
+
+
+def find_available_slots(start_time, end_time, busy_intervals, duration_minutes=30,
+                         step_minutes=None, working_hours=None, tz=None):
+    """
+    Calcula los espacios de `duration_minutes` libres entre start_time y end_time.
+
+    Parámetros:
+    - busy_intervals: tuplas (inicio, fin) de uno o varios calendarios, en
+      cualquier orden y con solapes.
+    - step_minutes: separación entre inicios de espacios (por defecto igual a
+      la duración). Los inicios quedan alineados a start_time + k * step.
+    - working_hours / tz: restringen los espacios al horario laboral
+      (ver `working_hours_windows`).
+
+    Coste O(B log B + S): se ordenan los B ocupados una vez y se recorren las
+    ventanas libres generando directamente los S espacios válidos.
+    """
+    duration = datetime.timedelta(minutes=duration_minutes)
+    step = datetime.timedelta(minutes=step_minutes or duration_minutes)
+    if duration <= datetime.timedelta(0) or step <= datetime.timedelta(0):
+        raise ValueError("duration_minutes y step_minutes deben ser positivos.")
+
+    allowed = None
+    if working_hours is not None:
+        allowed = working_hours_windows(start_time, end_time, working_hours, tz)
+
+    slots = []
+    for window_start, window_end in free_windows(start_time, end_time, merge_intervals(busy_intervals), allowed):
+        # Primer punto de la rejilla que cae dentro de la ventana
+        steps_to_window = max(0, -((start_time - window_start) // step))
+        slot_start = start_time + steps_to_window * step
+        while slot_start + duration <= window_end:
+            slots.append((slot_start, slot_start + duration))
+            slot_start += step
+    return slots
@@ -0,0 +1,90 @@
+# bot/modules/broadcast.py
+# Envío de un mensaje a muchos chats respetando los límites de Telegram:
+# unos 30 mensajes por segundo en total, uno por segundo en un mismo chat
+# privado y unos 20 por minuto en un grupo.
+#
+# Cada envío reserva su turno en el limitador y espera fuera del candado, así
+# que los mensajes salen en paralelo tan rápido como permiten los límites, sin
+# provocar respuestas 429 (RetryAfter).
+
+import asyncio
+import logging
+
+from telegram.error import Forbidden, RetryAfter
+
+from bot.config import BROADCAST_GLOBAL_RATE, BROADCAST_PER_CHAT_INTERVAL, BROADCAST_GROUP_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+class RateLimiter:
+    """
+    Reparte turnos de envío: como mucho `rate` mensajes por segundo en total y
+    un mensaje cada `per_chat_interval` segundos por chat (`group_interval`
+    para grupos, que en Telegram tienen id negativo).
+    """
+
+    def __init__(self, rate=BROADCAST_GLOBAL_RATE, per_chat_interval=BROADCAST_PER_CHAT_INTERVAL,
+                 group_interval=BROADCAST_GROUP_INTERVAL):
+        self.interval = 1.0 / max(rate, 0.001)
+        self.per_chat_interval = per_chat_interval
+        self.group_interval = group_interval
+        self._next = 0.0
+        self._paused_until = 0.0
+        self._chat_next = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, chat_id):
+        """Espera hasta el turno de un mensaje para `chat_id`."""
+        loop = asyncio.get_running_loop()
+        while True:
+            async with self._lock:
+                now = loop.time()
+                start = max(now, self._next, self._paused_until, self._chat_next.get(chat_id, 0.0))
+                self._next = start + self.interval
+                self._chat_next[chat_id] = start + (self.group_interval if chat_id < 0 else self.per_chat_interval)
+            if start > now:
+                await asyncio.sleep(start - now)
+            # Si llegó un 429 mientras se esperaba, el turno reservado ya no vale
+            if self._paused_until <= start:
+                return
+
+    def pause(self, seconds):
+        """
+        Retrasa todos los turnos pendientes (tras un 429 de Telegram), también
+        los ya reservados: al despertar, vuelven a pedir turno tras la pausa.
+        """
+        until = asyncio.get_running_loop().time() + seconds
+        self._paused_until = max(self._paused_until, until)
+        self._next = max(self._next, until)
+
+
+async def _send(bot, limiter, chat_id, text, kwargs):
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        await limiter.wait(chat_id)
+        try:
+            await bot.send_message(chat_id=chat_id, text=text, **kwargs)
+            return True
+        except RetryAfter as e:
+            logger.warning(f"Telegram pidió esperar {e.retry_after}s antes de escribir a {chat_id}.")
+            limiter.pause(float(e.retry_after))
+        except Forbidden as e:
+            # El usuario bloqueó al bot o el bot ya no está en el grupo: no tiene sentido reintentar
+            logger.warning(f"No se puede escribir a {chat_id}: {e}")
+            return False
+        except Exception as e:
+            logger.error(f"Error al enviar mensaje a {chat_id} (intento {attempt}): {e}")
+    return False
+
+
+async def send_many(bot, messages, limiter=None, **kwargs):
+    """
+    Envía `messages`, una lista de (chat_id, texto), en paralelo y con límite
+    de ritmo. Los argumentos extra (p. ej. parse_mode) se pasan a cada
+    `send_message`. Devuelve cuántos mensajes se entregaron.
+    """
+    limiter = limiter or RateLimiter()
+    results = await asyncio.gather(*[_send(bot, limiter, chat_id, text, kwargs) for chat_id, text in messages])
+    return sum(results)
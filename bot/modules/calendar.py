@@ -2,83 +2,109 @@
 # Este script maneja la integración con Google Calendar (Calendario de Google).
 # Permite buscar espacios libres y crear eventos.
 
+import asyncio
 import datetime
 import logging
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import threading
+import time
 from googleapiclient.errors import HttpError
-from bot.config import GOOGLE_SERVICE_ACCOUNT_FILE, WORK_GOOGLE_CALENDAR_ID
+from bot.modules.availability import find_available_slots, parse_busy_intervals
+from bot.config import GOOGLE_SERVICE_ACCOUNT_FILE, WORK_GOOGLE_CALENDAR_ID, CALENDAR_SYNC_MIN_INTERVAL
 
 logger = logging.getLogger(__name__)
 
 # Configuración de los permisos (SCOPES) para acceder al calendario
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
-# Autenticación usando el archivo de cuenta de servicio (Service Account)
-creds = service_account.Credentials.from_service_account_file(
-    GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES
-)
+# El objeto 'service' se construye la primera vez que se necesita (ver get_service),
+# así importar este módulo no lee las credenciales ni carga el documento de discovery.
+_service = None
+_service_init_lock = threading.Lock()
 
-# Construcción del objeto 'service' que nos permite interactuar con la API de Google Calendar
-service = build("calendar", "v3", credentials=creds)
+# httplib2 (used por googleapiclient) no es thread-safe: todas las llamadas
+# que se hagan desde hilos de trabajo pasan por este lock.
+_service_lock = threading.Lock()
+
+
+def get_service():
+    """
+    Devuelve el cliente de Google Calendar, creándolo una sola vez.
+
+    El documento de discovery se lee de la copia que trae la librería
+    (static_discovery) en lugar de descargarlo, y no se usa la caché de
+    discovery en disco, que solo sirve para documentos descargados.
+    """
+    global _service
+    if _service is None:
+        with _service_init_lock:
+            if _service is None:
+                from google.oauth2 import service_account
+                from googleapiclient.discovery import build
+
+                # Autenticación usando el archivo de cuenta de servicio (Service Account)
+                creds = service_account.Credentials.from_service_account_file(
+                    GOOGLE_SERVICE_ACCOUNT_FILE, scopes=SCOPES
+                )
+                _service = build(
+                    "calendar", "v3", credentials=creds,
+                    static_discovery=True, cache_discovery=False,
+                )
+                logger.info("Cliente de Google Calendar inicializado.")
+    return _service
+
+
+async def warm_up(context=None):
+    """
+    Tarea para la job queue: crea el cliente en un hilo de trabajo al arrancar,
+    para que la primera consulta de un usuario no pague ese coste.
+    """
+    try:
+        await asyncio.to_thread(get_service)
+    except Exception as e:
+        logger.error(f"No se pudo inicializar el cliente de Google Calendar: {e}")
 
 
 def get_available_slots(
-    start_time, end_time, duration_minutes=30, calendar_id=WORK_GOOGLE_CALENDAR_ID
+    start_time, end_time, duration_minutes=30, calendar_id=WORK_GOOGLE_CALENDAR_ID,
+    calendar_ids=None, step_minutes=None, working_hours=None, tz=None,
 ):
     """
-    Busca espacios disponibles en el calendario dentro de un rango de tiempo.
+    Busca espacios disponibles en uno o varios calendarios dentro de un rango de tiempo.
     
     Parámetros:
     - start_time: Hora de inicio de la búsqueda.
     - end_time: Hora de fin de la búsqueda.
     - duration_minutes: Cuánto dura cada cita (por defecto 30 min).
     - calendar_id: El ID del calendario donde buscar.
+    - calendar_ids: Lista de calendarios; un espacio solo está libre si lo está en todos.
+    - step_minutes: Separación entre inicios de espacios (por defecto, la duración).
+    - working_hours / tz: Horario laboral al que se limitan los espacios
+      (ver `availability.working_hours_windows`).
     """
+    calendar_ids = calendar_ids or [calendar_id]
     try:
-        # Convertimos las fechas a formato ISO (el que entiende Google)
-        time_min = start_time.isoformat()
-        time_max = end_time.isoformat()
-
-        # Consultamos a Google qué horas están ocupadas (freebusy)
+        # Consultamos a Google qué horas están ocupadas (freebusy), todos los calendarios a la vez
         freebusy_query = {
-            "timeMin": time_min,
-            "timeMax": time_max,
+            "timeMin": start_time.isoformat(),
+            "timeMax": end_time.isoformat(),
             "timeZone": "UTC",
-            "items": [{"id": calendar_id}],
+            "items": [{"id": cid} for cid in calendar_ids],
         }
 
-        freebusy_result = service.freebusy().query(body=freebusy_query).execute()
-        busy_slots = freebusy_result["calendars"][calendar_id]["busy"]
-
-        # Creamos una lista de todos los posibles espacios (slots)
-        potential_slots = []
-        current_time = start_time
-        while current_time + datetime.timedelta(minutes=duration_minutes) <= end_time:
-            potential_slots.append(
-                (
-                    current_time,
-                    current_time + datetime.timedelta(minutes=duration_minutes),
-                )
-            )
-            # Avanzamos el tiempo para el siguiente espacio
-            current_time += datetime.timedelta(minutes=duration_minutes)
-
-        # Filtramos los espacios que chocan con horas ocupadas
-        available_slots = []
-        for slot_start, slot_end in potential_slots:
-            is_busy = False
-            for busy in busy_slots:
-                busy_start = datetime.datetime.fromisoformat(busy["start"])
-                busy_end = datetime.datetime.fromisoformat(busy["end"])
-                # Si el espacio propuesto se cruza con uno ocupado, lo marcamos como ocupado
-                if max(slot_start, busy_start) < min(slot_end, busy_end):
-                    is_busy = True
-                    break
-            if not is_busy:
-                available_slots.append((slot_start, slot_end))
-
-        return available_slots
+        freebusy_result = get_service().freebusy().query(body=freebusy_query).execute()
+
+        # Cada intervalo ocupado se parsea una sola vez
+        busy_intervals = []
+        for cid in calendar_ids:
+            busy_intervals.extend(parse_busy_intervals(freebusy_result["calendars"][cid].get("busy", [])))
+
+        return find_available_slots(
+            start_time, end_time, busy_intervals,
+            duration_minutes=duration_minutes,
+            step_minutes=step_minutes,
+            working_hours=working_hours,
+            tz=tz,
+        )
     except HttpError as error:
         print(f"Ocurrió un error con la API de Google: {error}")
         return []
@@ -110,7 +136,7 @@ def create_event(summary, start_time, end_time, attendees, calendar_id=WORK_GOOG
     try:
         # Insertamos el evento en el calendario
         created_event = (
-            service.events().insert(calendarId=calendar_id, body=event).execute()
+            get_service().events().insert(calendarId=calendar_id, body=event).execute()
         )
         return created_event
     except HttpError as error:
@@ -125,7 +151,7 @@ def get_events(start_time, end_time, calendar_id=WORK_GOOGLE_CALENDAR_ID):
     try:
         logger.info(f"Llamando a la API de Google Calendar para {calendar_id}")
         events_result = (
-            service.events()
+            get_service().events()
             .list(
                 calendarId=calendar_id,
                 timeMin=start_time.isoformat(),
@@ -144,3 +170,217 @@ def get_events(start_time, end_time, calendar_id=WORK_GOOGLE_CALENDAR_ID):
     except Exception as e:
         logger.error(f"Error inesperado al obtener eventos: {e}")
         return []
+
+
+# --- Almacén local de eventos con sincronización incremental ---
+# Cada calendario se descarga una sola vez dentro de una ventana acotada (desde
+# SYNC_LOOKBACK antes de hoy hasta SYNC_LOOKAHEAD después) y luego solo se piden
+# los cambios usando el `syncToken` que devuelve Google. Los eventos que ya
+# terminaron o que caen fuera de la ventana se descartan, y cuando la ventana
+# se ha quedado corta se vuelve a descargar completa.
+# Las consultas de la agenda se resuelven filtrando el almacén en memoria.
+
+SYNC_LOOKBACK = datetime.timedelta(days=1)
+SYNC_LOOKAHEAD = datetime.timedelta(days=90)
+SYNC_PAGE_SIZE = 2500
+
+
+def _event_bound(value):
+    """Convierte el start/end de un evento (dateTime o date) en un datetime con zona."""
+    if "dateTime" in value:
+        return datetime.datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00"))
+    day = datetime.date.fromisoformat(value["date"])
+    return datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc)
+
+
+class CalendarEventStore:
+    """Copia local de los eventos de varios calendarios, al día mediante syncToken."""
+
+    def __init__(self):
+        # calendar_id -> {"events": {id: (start, end, event)}, "sync_token",
+        #                 "window_start", "window_end", "synced_at"}
+        self.calendars = {}
+        self._lock = threading.Lock()
+
+    def covers(self, calendar_id, start_time, end_time):
+        """Indica si el almacén tiene el calendario sincronizado en [start_time, end_time)."""
+        state = self.calendars.get(calendar_id)
+        return bool(
+            state and state["sync_token"]
+            and state["window_start"] <= start_time and end_time <= state["window_end"]
+        )
+
+    def events_between(self, calendar_id, start_time, end_time):
+        """Eventos del calendario que se cruzan con [start_time, end_time), ordenados por inicio."""
+        state = self.calendars.get(calendar_id)
+        if not state:
+            return []
+        matching = [
+            (start, event)
+            for start, end, event in state["events"].values()
+            if start < end_time and end > start_time
+        ]
+        matching.sort(key=lambda item: item[0])
+        return [event for _, event in matching]
+
+    def sync(self, calendar_ids, min_interval=0):
+        """
+        Sincroniza los calendarios indicados con una sola petición batch por
+        página. Los que ya tienen syncToken solo descargan los cambios; si Google
+        responde 410 (token caducado) se hace de nuevo una sincronización completa.
+        Devuelve el conjunto de calendarios que no se pudieron sincronizar.
+        """
+        with self._lock:
+            now = time.monotonic()
+            _, window_end = self._window()
+            pending = {}
+            for calendar_id in dict.fromkeys(calendar_ids):
+                state = self.calendars.get(calendar_id)
+                if state and state["window_end"] < window_end - SYNC_LOOKAHEAD / 2:
+                    # La ventana ya no cubre lo bastante hacia adelante: descarga completa
+                    logger.info(f"Ventana de {calendar_id} agotada. Resincronizando desde cero.")
+                    self.calendars.pop(calendar_id, None)
+                    state = None
+                if state and state["sync_token"] and now - state["synced_at"] < min_interval:
+                    continue
+                pending[calendar_id] = {"page_token": None, "changes": [], "state": state}
+
+            failed = set()
+            while pending:
+                results = self._execute_batch(pending)
+                next_pending = {}
+                for calendar_id, (response, error) in results.items():
+                    job = pending[calendar_id]
+                    if error is not None:
+                        if isinstance(error, HttpError) and error.resp.status == 410 and job["state"]:
+                            logger.info(f"syncToken caducado para {calendar_id}. Resincronizando desde cero.")
+                            self.calendars.pop(calendar_id, None)
+                            next_pending[calendar_id] = {"page_token": None, "changes": [], "state": None}
+                        else:
+                            logger.error(f"Error al sincronizar el calendario {calendar_id}: {error}")
+                            failed.add(calendar_id)
+                        continue
+
+                    job["changes"].extend(response.get("items", []))
+                    if response.get("nextPageToken"):
+                        job["page_token"] = response["nextPageToken"]
+                        next_pending[calendar_id] = job
+                    else:
+                        self._apply(calendar_id, job, response.get("nextSyncToken"))
+                pending = next_pending
+            return failed
+
+    def _execute_batch(self, pending):
+        results = {}
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        window = self._window()
+        service = get_service()
+        with _service_lock:
+            batch = service.new_batch_http_request(callback=callback)
+            for calendar_id, job in pending.items():
+                params = {"calendarId": calendar_id, "singleEvents": True, "maxResults": SYNC_PAGE_SIZE}
+                if job["state"]:
+                    params["syncToken"] = job["state"]["sync_token"]
+                else:
+                    job.setdefault("window", window)
+                    params["timeMin"] = job["window"][0].isoformat()
+                    params["timeMax"] = job["window"][1].isoformat()
+                if job["page_token"]:
+                    params["pageToken"] = job["page_token"]
+                batch.add(service.events().list(**params), request_id=calendar_id)
+            batch.execute()
+        return results
+
+    def _apply(self, calendar_id, job, sync_token):
+        # Se construye un estado nuevo y se publica de una vez, para que las
+        # consultas desde el event loop nunca vean un diccionario a medio cambiar
+        previous = job["state"]
+        events = dict(previous["events"]) if previous else {}
+        # El inicio de la ventana avanza con los días; el final se mantiene
+        # hasta la siguiente descarga completa (los cambios incrementales
+        # pueden traer eventos de cualquier fecha)
+        window_start = self._window()[0]
+        window_end = previous["window_end"] if previous else job["window"][1]
+        added = removed = 0
+        for event in job["changes"]:
+            if event.get("status") == "cancelled":
+                removed += events.pop(event["id"], None) is not None
+                continue
+            try:
+                start, end = _event_bound(event["start"]), _event_bound(event["end"])
+            except (KeyError, ValueError) as e:
+                logger.warning(f"Evento {event.get('id')} de {calendar_id} ignorado: {e}")
+                continue
+            if start < window_end and end > window_start:
+                events[event["id"]] = (start, end, event)
+                added += 1
+            else:
+                # Movido fuera de la ventana
+                removed += events.pop(event["id"], None) is not None
+
+        expired = [event_id for event_id, (_, end, _) in events.items() if end <= window_start]
+        for event_id in expired:
+            del events[event_id]
+        self.calendars[calendar_id] = {
+            "events": events,
+            "sync_token": sync_token,
+            "window_start": window_start,
+            "window_end": window_end,
+            "synced_at": time.monotonic(),
+        }
+        logger.info(
+            f"Calendario {calendar_id} sincronizado: {added} eventos nuevos/cambiados, {removed} eliminados, "
+            f"{len(expired)} ya pasados."
+        )
+
+    @staticmethod
+    def _window():
+        """Ventana de sincronización: desde el día anterior a hoy (UTC) hasta SYNC_LOOKAHEAD después."""
+        today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        return today - SYNC_LOOKBACK, today + SYNC_LOOKAHEAD
+
+
+event_store = CalendarEventStore()
+
+
+async def get_events_for_calendars(start_time, end_time, calendar_ids):
+    """
+    Obtiene los eventos de varios calendarios sin bloquear el event loop.
+
+    Los calendarios se sincronizan juntos (una petición batch) en un hilo de
+    trabajo y las consultas se responden desde el almacén local. Si un rango
+    queda fuera de la ventana sincronizada, o la sincronización falla, se
+    consulta ese calendario directamente.
+
+    Devuelve un diccionario `{calendar_id: [eventos]}`.
+    """
+    calendar_ids = [calendar_id for calendar_id in dict.fromkeys(calendar_ids) if calendar_id]
+    try:
+        failed = await asyncio.to_thread(event_store.sync, calendar_ids, CALENDAR_SYNC_MIN_INTERVAL)
+    except Exception as e:
+        logger.error(f"Error al sincronizar los calendarios: {e}")
+        failed = set(calendar_ids)
+
+    results = {}
+    fallback = []
+    for calendar_id in calendar_ids:
+        if calendar_id in failed or not event_store.covers(calendar_id, start_time, end_time):
+            fallback.append(calendar_id)
+        else:
+            results[calendar_id] = event_store.events_between(calendar_id, start_time, end_time)
+
+    if fallback:
+        fetched = await asyncio.gather(*[
+            asyncio.to_thread(_get_events_locked, start_time, end_time, calendar_id)
+            for calendar_id in fallback
+        ])
+        results.update(zip(fallback, fetched))
+    return results
+
+
+def _get_events_locked(start_time, end_time, calendar_id):
+    with _service_lock:
+        return get_events(start_time, end_time, calendar_id=calendar_id)
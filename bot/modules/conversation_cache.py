@@ -0,0 +1,142 @@
+# bot/modules/conversation_cache.py
+# In-process, write-behind cache for conversation states.
+
+import asyncio
+import logging
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = "write_behind"
+WRITE_THROUGH = "write_through"
+DURABILITY_MODES = (WRITE_BEHIND, WRITE_THROUGH)
+
+# Marker for "this user has no conversation", so repeated lookups for users
+# outside a flow do not hit the database either.
+_ABSENT = object()
+
+
+def _copy_state(state):
+    """Returns a copy of a state so callers can mutate it without touching the cache."""
+    return {
+        "flow_id": state["flow_id"],
+        "current_step_id": state["current_step_id"],
+        "collected_data": dict(state["collected_data"]),
+    }
+
+
+class ConversationStateCache:
+    """
+    Bounded LRU cache in front of the `conversations` table.
+
+    Reads are served from memory after the first load. Writes and deletes are
+    recorded as pending mutations and persisted in a single transaction by
+    `flush()`. In `write_through` mode every mutation is flushed immediately.
+    The cache is meant to be used from the event loop thread only.
+
+    Args:
+        loader: Coroutine function `loader(user_id)` returning the stored state
+            or None. Errors are logged and not cached.
+        writer: Coroutine function `writer(upserts, deletes)` persisting pending
+            changes, where `upserts` is a list of `(user_id, state)` and
+            `deletes` a list of user ids. It must raise on failure.
+        max_size: Maximum number of users kept in memory.
+        durability: `write_behind` (default) or `write_through`.
+    """
+
+    def __init__(self, loader, writer, max_size=1000, durability=WRITE_BEHIND):
+        if durability not in DURABILITY_MODES:
+            logger.warning(f"Unknown durability mode '{durability}'. Using '{WRITE_BEHIND}'.")
+            durability = WRITE_BEHIND
+        self._loader = loader
+        self._writer = writer
+        self.max_size = max(1, int(max_size))
+        self.durability = durability
+        self._entries = OrderedDict()
+        # Pending mutations: user_id -> state (upsert) or None (delete).
+        # Kept apart from the LRU so evicting an entry never drops a write.
+        self._dirty = {}
+        # Mutations currently being written by flush()
+        self._inflight = {}
+        self._flush_lock = asyncio.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, user_id):
+        """Returns a copy of the user's state, loading it on a cache miss."""
+        for pending in (self._dirty, self._inflight):
+            if user_id in pending:
+                self.hits += 1
+                state = pending[user_id]
+                return _copy_state(state) if state is not None else None
+        if user_id in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            state = self._entries[user_id]
+            return _copy_state(state) if state is not _ABSENT else None
+
+        self.misses += 1
+        try:
+            state = await self._loader(user_id)
+        except Exception as e:
+            logger.error(f"Error loading conversation state for {user_id}: {e}")
+            return None
+
+        # A write made while we were loading wins over what we just read
+        if user_id not in self._dirty and user_id not in self._inflight and user_id not in self._entries:
+            self._store(user_id, state if state is not None else _ABSENT)
+        return _copy_state(state) if state is not None else None
+
+    async def put(self, user_id, state):
+        """Records a new state for the user."""
+        state = _copy_state(state)
+        self._store(user_id, state)
+        self._dirty[user_id] = state
+        if self.durability == WRITE_THROUGH:
+            await self.flush()
+
+    async def delete(self, user_id):
+        """Records that the user no longer has a conversation."""
+        self._store(user_id, _ABSENT)
+        self._dirty[user_id] = None
+        if self.durability == WRITE_THROUGH:
+            await self.flush()
+
+    async def flush(self):
+        """
+        Persists all pending mutations in one batch.
+
+        Returns the number of mutations written. On failure the mutations are
+        kept (unless superseded meanwhile) and retried on the next flush.
+        """
+        async with self._flush_lock:
+            if not self._dirty:
+                return 0
+            pending, self._dirty = self._dirty, {}
+            self._inflight = pending
+
+            upserts = [(user_id, state) for user_id, state in pending.items() if state is not None]
+            deletes = [user_id for user_id, state in pending.items() if state is None]
+            try:
+                await self._writer(upserts, deletes)
+            except Exception as e:
+                logger.error(f"Error flushing {len(pending)} conversation states: {e}")
+                for user_id, state in pending.items():
+                    self._dirty.setdefault(user_id, state)
+                return 0
+            finally:
+                self._inflight = {}
+
+        logger.debug(f"Flushed {len(upserts)} conversation updates and {len(deletes)} deletions.")
+        return len(pending)
+
+    @property
+    def pending(self):
+        """Number of mutations waiting to be flushed."""
+        return len(self._dirty)
+
+    def _store(self, user_id, value):
+        self._entries[user_id] = value
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
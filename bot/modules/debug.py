@@ -5,6 +5,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes
 from bot.modules.identity import is_admin
+from bot.modules.llm_engine import get_cache_stats
 from bot.config import (
     TIMEZONE,
     WORK_GOOGLE_CALENDAR_ID,
@@ -22,13 +23,16 @@ async def print_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> N
     chat_id = update.effective_chat.id
     
     # Solo permitimos esto a los administradores
-    if is_admin(chat_id):
+    if await is_admin(chat_id):
+        llm_cache = get_cache_stats()
         config_details = (
             f"**Detalles de Configuración**\n"
             f"Zona Horaria: `{TIMEZONE}`\n"
             f"Calendario Trabajo: `{WORK_GOOGLE_CALENDAR_ID or 'No definido'}`\n"
             f"Calendario Personal: `{PERSONAL_GOOGLE_CALENDAR_ID or 'No definido'}`\n"
             f"URL Webhook n8n: `{N8N_WEBHOOK_URL or 'No definido'}`\n"
+            f"Caché LLM: `{llm_cache['hits']}/{llm_cache['hits'] + llm_cache['misses']} aciertos, "
+            f"{llm_cache['saved_prompt_tokens'] + llm_cache['saved_completion_tokens']} tokens ahorrados`\n"
         )
         await update.message.reply_text(config_details, parse_mode='Markdown')
     else:
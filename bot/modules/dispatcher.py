@@ -26,10 +26,10 @@ async def send_step_message(update: Update, step: dict):
         options = step["options"]
     elif "input_type" in step:
         if step["input_type"] == "dynamic_keyboard_vikunja_projects":
-            projects = get_projects_list()
+            projects = await get_projects_list()
             options = [p.get('title', 'Unknown') for p in projects]
         elif step["input_type"] == "dynamic_keyboard_vikunja_tasks":
-            tasks = get_tasks_list(1)
+            tasks = await get_tasks_list(1)
             options = [t.get('title', 'Unknown') for t in tasks]
 
     if options:
@@ -94,21 +94,21 @@ async def button_dispatcher(update: Update, context: ContextTypes.DEFAULT_TYPE)
             response_text = handle_approval_action(query.data)
         else:
             flow_engine = context.bot_data["flow_engine"]
-            flow_to_start = next((flow for flow in flow_engine.flows if flow.get("trigger_button") == query.data), None)
+            flow_to_start = flow_engine.get_flow_by_trigger(query.data)
 
             if flow_to_start:
                 logger.info(f"Iniciando flujo: {flow_to_start['id']}")
-                initial_step = flow_engine.start_flow(update.effective_user.id, flow_to_start["id"])
+                initial_step = await flow_engine.start_flow(update.effective_user.id, flow_to_start["id"])
                 if initial_step:
                     await send_step_message(update, initial_step)
                 else:
                     logger.error("No se pudo iniciar el flujo (paso inicial vacío).")
                 return
 
-            state = flow_engine.get_conversation_state(update.effective_user.id)
+            state = await flow_engine.get_conversation_state(update.effective_user.id)
             if state:
                 logger.info(f"Procesando paso de flujo para usuario {update.effective_user.id}. Data: {query.data}")
-                result = flow_engine.handle_response(update.effective_user.id, query.data)
+                result = await flow_engine.handle_response(update.effective_user.id, query.data)
 
                 if result["status"] == "in_progress":
                     logger.info("Flujo en progreso, enviando siguiente paso.")
@@ -0,0 +1,104 @@
+# bot/modules/document_download.py
+# Descarga de documentos de Telegram en un búfer propio de cada trabajo.
+#
+# El archivo llega por partes desde la API de archivos de Telegram y se escribe
+# en un SpooledTemporaryFile: en memoria mientras es pequeño y en un archivo
+# temporal anónimo (sin nombre en el disco, solo accesible para este proceso)
+# a partir de PRINT_SPOOL_MAX_MEMORY bytes. Ese mismo búfer es el que lee el
+# codificador MIME de la cola de impresión.
+
+import asyncio
+import logging
+import os
+import tempfile
+
+import httpx
+
+from bot.config import (
+    PRINT_SPOOL_MAX_MEMORY,
+    DOCUMENT_DOWNLOAD_TIMEOUT,
+    DOCUMENT_MAX_CONCURRENT_DOWNLOADS,
+)
+
+logger = logging.getLogger(__name__)
+
+_CHUNK_SIZE = 64 * 1024
+
+# Descargas simultáneas; las demás esperan aquí sin bloquear el bucle de eventos
+_semaphore = asyncio.Semaphore(DOCUMENT_MAX_CONCURRENT_DOWNLOADS)
+_client = None
+
+
+def _get_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(DOCUMENT_DOWNLOAD_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=DOCUMENT_MAX_CONCURRENT_DOWNLOADS,
+                max_keepalive_connections=DOCUMENT_MAX_CONCURRENT_DOWNLOADS,
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Cierra el cliente HTTP de descargas (al apagar el bot)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def new_spool():
+    """Búfer de un trabajo: en memoria hasta PRINT_SPOOL_MAX_MEMORY bytes, luego en un archivo temporal."""
+    return tempfile.SpooledTemporaryFile(max_size=PRINT_SPOOL_MAX_MEMORY, prefix="print-")
+
+
+async def _stream_remote(url, spool, validator):
+    # Si el validador rechaza un bloque, salir del `async with` corta la conexión
+    # sin leer el resto de la respuesta
+    async with _get_client().stream("GET", url) as response:
+        response.raise_for_status()
+        async for chunk in response.aiter_bytes(_CHUNK_SIZE):
+            if validator is not None:
+                validator.feed(chunk)
+            spool.write(chunk)
+
+
+def _copy_local(path, spool, validator):
+    # Con un servidor local de la Bot API, file_path es una ruta del disco
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(_CHUNK_SIZE)
+            if not chunk:
+                break
+            if validator is not None:
+                validator.feed(chunk)
+            spool.write(chunk)
+
+
+async def download_document(file, validator=None):
+    """
+    Descarga un `telegram.File` a un búfer nuevo y lo devuelve posicionado al
+    inicio. Quien lo recibe es responsable de cerrarlo. Si la descarga falla,
+    el búfer se cierra y la excepción se propaga.
+
+    Cada bloque pasa antes por `validator.feed()` (ver
+    file_validation.ContentValidator), que puede cortar la descarga en cuanto
+    el contenido no coincide con su tipo o supera el tamaño máximo.
+    """
+    spool = new_spool()
+    try:
+        async with _semaphore:
+            if os.path.isfile(file.file_path):
+                await asyncio.to_thread(_copy_local, file.file_path, spool, validator)
+            else:
+                await _stream_remote(file.file_path, spool, validator)
+        if validator is not None:
+            validator.finish()
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
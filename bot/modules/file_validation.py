@@ -1,6 +1,7 @@
 # bot/modules/file_validation.py
 # This module provides functions for validating files before processing.
 
+import codecs
 import logging
 from telegram import Document
 
@@ -23,6 +24,30 @@ ALLOWED_MIME_TYPES = {
 # Maximum file size in bytes (e.g., 10 * 1024 * 1024 for 10 MB)
 MAX_FILE_SIZE_BYTES = 10 * 1024 * 1024  # 10 MB
 
+# Bytes read from the start of a download to identify its real content type
+SNIFF_BYTES = 4096
+
+# Leading bytes ("magic numbers") of each allowed binary type. text/plain has
+# no signature and is recognised by its content instead (see looks_like_text).
+MAGIC_SIGNATURES = {
+    'application/pdf': (b'%PDF-',),
+    # Word 97-2003 documents are OLE2 compound files
+    'application/msword': (b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1',),
+    # .docx files are ZIP archives
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document': (b'PK\x03\x04',),
+    'image/jpeg': (b'\xff\xd8\xff',),
+    'image/png': (b'\x89PNG\r\n\x1a\n',),
+}
+
+# Control characters that may appear in plain text
+_TEXT_CONTROL_CHARACTERS = {'\t', '\n', '\r', '\f'}
+# Bytes below 0x20 that never appear in single-byte or UTF-8 text
+_BINARY_CONTROL_BYTES = bytes(byte for byte in range(0x20) if chr(byte) not in _TEXT_CONTROL_CHARACTERS)
+
+
+class FileValidationError(Exception):
+    """Raised while a file is being downloaded if its content is rejected."""
+
 # --- Validation Functions ---
 
 def is_file_type_allowed(document: Document) -> bool:
@@ -89,3 +114,105 @@ def validate_document(document: Document) -> (bool, str):
         return False, f"File is too large. The maximum allowed size is {MAX_FILE_SIZE_BYTES // 1024 // 1024} MB."
 
     return True, "File is valid and can be processed."
+
+def looks_like_text(header: bytes) -> bool:
+    """
+    Checks whether the first bytes of a file look like plain text.
+
+    Files starting with a UTF-16 byte order mark are decoded as UTF-16. Any
+    other encoding (UTF-8, Windows-1252, Latin-1...) is accepted as long as
+    the bytes contain no binary control characters.
+
+    Args:
+        header: The first bytes of the file.
+
+    Returns:
+        True if the bytes look like text without binary control characters.
+    """
+    if not header.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return len(header.translate(None, _BINARY_CONTROL_BYTES)) == len(header)
+
+    # The sample may end in the middle of a code unit or a surrogate pair
+    header = header[:len(header) - len(header) % 2]
+    try:
+        text = header.decode('utf-16')
+    except UnicodeDecodeError as e:
+        if e.reason != 'unexpected end of data':
+            return False
+        text = header[:e.start].decode('utf-16')
+    return not any(char < ' ' and char not in _TEXT_CONTROL_CHARACTERS for char in text)
+
+def content_matches_mime_type(header: bytes, mime_type: str) -> bool:
+    """
+    Checks the magic bytes at the start of a file against its declared MIME type.
+
+    Args:
+        header: The first bytes of the file (up to SNIFF_BYTES).
+        mime_type: The MIME type reported by Telegram.
+
+    Returns:
+        True if the content is consistent with an allowed MIME type, False otherwise.
+    """
+    if mime_type not in ALLOWED_MIME_TYPES:
+        return False
+    if mime_type == 'text/plain':
+        return looks_like_text(header)
+    return header.startswith(MAGIC_SIGNATURES[mime_type])
+
+
+class ContentValidator:
+    """
+    Validates a file while it is downloaded, chunk by chunk.
+
+    `feed()` must be called with every chunk before it is stored. As soon as
+    SNIFF_BYTES have arrived their magic bytes are checked, and the running
+    byte count is compared with the size limit on every chunk, so a rejected
+    file is abandoned after the first few KB instead of after a full download.
+
+    Args:
+        mime_type: The MIME type reported by Telegram.
+        max_size: The maximum number of bytes accepted.
+    """
+
+    def __init__(self, mime_type: str, max_size: int = MAX_FILE_SIZE_BYTES):
+        self.mime_type = mime_type
+        self.max_size = max_size
+        self.size = 0
+        self._header = b''
+        self._sniffed = False
+
+    def feed(self, chunk: bytes) -> None:
+        """
+        Accounts for the next chunk of the download.
+
+        Raises:
+            FileValidationError: If the file is too large or its content does not match its type.
+        """
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            logger.warning(f"Download exceeded the limit of {self.max_size} bytes; aborting.")
+            raise FileValidationError(
+                f"File is too large. The maximum allowed size is {self.max_size // 1024 // 1024} MB."
+            )
+        if not self._sniffed:
+            self._header += chunk[:SNIFF_BYTES - len(self._header)]
+            if len(self._header) >= SNIFF_BYTES:
+                self._sniff()
+
+    def finish(self) -> None:
+        """
+        Validates a file shorter than SNIFF_BYTES once the download is complete.
+
+        Raises:
+            FileValidationError: If its content does not match its type.
+        """
+        if not self._sniffed:
+            self._sniff()
+
+    def _sniff(self) -> None:
+        self._sniffed = True
+        if not content_matches_mime_type(self._header, self.mime_type):
+            logger.warning(f"File content does not match its declared type '{self.mime_type}'; aborting.")
+            raise FileValidationError(
+                f"The file content does not match its type ({self.mime_type}). Please upload a supported document."
+            )
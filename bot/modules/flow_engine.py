@@ -1,75 +1,284 @@
 # bot/modules/flow_engine.py
+import asyncio
 import json
 import logging
 import os
-import sqlite3
-from bot.db import get_db_connection
+import pickle
+import threading
+from bot import db
+from bot.config import CONVERSATION_CACHE_SIZE, CONVERSATION_DURABILITY
+from bot.modules.conversation_cache import ConversationStateCache
 from bot.modules.sales_rag import generate_sales_pitch
 from bot.modules.nfc_tag import generate_nfc_tag
 
 logger = logging.getLogger(__name__)
 
+_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+FLOWS_DIR = os.path.join(_DATA_DIR, 'flows')
+# Parsed flow definitions keyed by file (mtime, size), reused on cold starts
+FLOW_CACHE_FILE = os.path.join(_DATA_DIR, '.flows_cache.pickle')
+FLOW_CACHE_VERSION = 1
+
+
+def _flow_roles(flow):
+    """Returns the roles a flow is available to ('role' or the 'user_roles' list)."""
+    if 'role' in flow:
+        return [flow['role']]
+    return list(flow.get('user_roles') or [])
+
+
+UPSERT_CONVERSATION_SQL = """
+    INSERT OR REPLACE INTO conversations (user_id, flow_id, current_step_id, collected_data)
+    VALUES (?, ?, ?, ?)
+"""
+DELETE_CONVERSATION_SQL = "DELETE FROM conversations WHERE user_id = ?"
+
+
+class FlowRegistry:
+    """
+    Read-only index over the loaded flows, compiled once at load time.
+
+    Lookups by flow id, trigger button, role and step id are dictionary reads,
+    and every step carries its precomputed successor so routing a reply never
+    scans the step list.
+    """
+
+    def __init__(self, flows):
+        self.flows = list(flows)
+        self.by_id = {}
+        self.by_trigger = {}
+        self.by_role = {}
+        self.steps = {}
+        self.successors = {}
+
+        for flow in self.flows:
+            flow_id = flow.get('id')
+            if flow_id is None:
+                logger.warning("Flow without an 'id' key found. Skipping.")
+                continue
+            if flow_id in self.by_id:
+                logger.warning(f"Duplicate flow id '{flow_id}'. Keeping the first definition.")
+                continue
+            self.by_id[flow_id] = flow
+
+            trigger = flow.get('trigger_button')
+            if trigger:
+                self.by_trigger.setdefault(trigger, flow)
+
+            for role in _flow_roles(flow):
+                self.by_role.setdefault(role, []).append(flow)
+
+            self.steps[flow_id], self.successors[flow_id] = self._compile_steps(flow)
+
+    @staticmethod
+    def _compile_steps(flow):
+        """Builds the step_id -> step map and the step_id -> next step map of a flow."""
+        steps = flow.get('steps')
+        if not isinstance(steps, list):
+            return {}, {}
+
+        step_map = {step['step_id']: step for step in steps if 'step_id' in step}
+        successors = {}
+        for index, step in enumerate(steps):
+            if 'step_id' not in step:
+                continue
+            next_step = None
+            if 'next_step' in step:
+                next_step = step_map.get(step['next_step'])
+                if next_step is None:
+                    logger.warning(
+                        f"Step {step['step_id']} in flow {flow['id']} points to unknown "
+                        f"next_step '{step['next_step']}'. Falling back to the following step."
+                    )
+            if next_step is None and index + 1 < len(steps):
+                next_step = steps[index + 1]
+            successors[step['step_id']] = next_step
+        return step_map, successors
+
+
 class FlowEngine:
-    def __init__(self):
-        self.flows = self._load_flows()
+    def __init__(self, cache_size=CONVERSATION_CACHE_SIZE, durability=CONVERSATION_DURABILITY,
+                 flows_dir=FLOWS_DIR, flow_cache_file=FLOW_CACHE_FILE):
+        self.flows_dir = flows_dir
+        self.flow_cache_file = flow_cache_file
+        # filename -> {"signature": (mtime_ns, size), "flow": parsed flow or None}
+        self._flow_files = {}
+        self._reload_lock = threading.Lock()
+        self.registry = FlowRegistry(self._load_flows())
+        self.state_cache = ConversationStateCache(
+            loader=self._load_conversation_state,
+            writer=self._write_conversation_states,
+            max_size=cache_size,
+            durability=durability,
+        )
+
+    @property
+    def flows(self):
+        """All loaded flow definitions, in load order."""
+        return self.registry.flows
 
     def _load_flows(self):
-        """Loads all individual flow JSON files from the flows directory."""
-        # flows_dir = 'bot/data/flows' # OLD
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        flows_dir = os.path.join(base_dir, '..', 'data', 'flows')
-        
-        loaded_flows = []
+        """
+        Loads all individual flow JSON files from the flows directory.
+        Files unchanged since the last run are taken from the precompiled cache.
+        """
         try:
-            if not os.path.exists(flows_dir):
-                logger.error(f"Flows directory not found at '{flows_dir}'")
+            if not os.path.exists(self.flows_dir):
+                logger.error(f"Flows directory not found at '{self.flows_dir}'")
                 return []
 
-            for filename in os.listdir(flows_dir):
-                if filename.endswith('.json'):
-                    file_path = os.path.join(flows_dir, filename)
-                    try:
-                        with open(file_path, 'r', encoding='utf-8') as f:
-                            flow_data = json.load(f)
-                            if 'role' not in flow_data:
-                                logger.warning(f"Flow {filename} is missing a 'role' key. Skipping.")
-                                continue
-                            loaded_flows.append(flow_data)
-                    except json.JSONDecodeError:
-                        logger.error(f"Error decoding JSON from {filename}.")
-                    except Exception as e:
-                        logger.error(f"Error loading flow from {filename}: {e}")
-
-            logger.info(f"Successfully loaded {len(loaded_flows)} flows.")
+            cached_files = self._read_flow_cache()
+            self._flow_files, parsed = self._scan_flow_files(cached_files)
+            if parsed or set(cached_files) != set(self._flow_files):
+                self._write_flow_cache()
+
+            loaded_flows = self._collect_flows()
+            logger.info(f"Successfully loaded {len(loaded_flows)} flows ({parsed} parsed, "
+                        f"{len(self._flow_files) - parsed} from cache).")
             return loaded_flows
 
         except Exception as e:
-            logger.error(f"Failed to load flows from directory {flows_dir}: {e}")
+            logger.error(f"Failed to load flows from directory {self.flows_dir}: {e}")
             return []
 
+    def reload_flows(self):
+        """
+        Re-parses only the flow files that were added, changed or removed since
+        the last scan and swaps the new registry in with a single assignment,
+        so concurrent handlers see either the old or the new set of flows.
+
+        Returns True if anything changed.
+        """
+        with self._reload_lock:
+            if not os.path.exists(self.flows_dir):
+                return False
+            flow_files, parsed = self._scan_flow_files(self._flow_files)
+            removed = set(self._flow_files) - set(flow_files)
+            if not parsed and not removed:
+                return False
+
+            self._flow_files = flow_files
+            self.registry = FlowRegistry(self._collect_flows())
+            self._write_flow_cache()
+            logger.info(f"Reloaded flows: {parsed} file(s) recompiled, {len(removed)} removed. "
+                        f"{len(self.registry.flows)} flows active.")
+            return True
+
+    def _scan_flow_files(self, previous):
+        """
+        Stats every flow file and parses those whose (mtime, size) differ from
+        `previous`. Returns the new file table and the number of files parsed.
+        """
+        flow_files = {}
+        parsed = 0
+        for filename in sorted(os.listdir(self.flows_dir)):
+            if not filename.endswith('.json'):
+                continue
+            file_path = os.path.join(self.flows_dir, filename)
+            stat = os.stat(file_path)
+            signature = (stat.st_mtime_ns, stat.st_size)
+
+            known = previous.get(filename)
+            if known and known['signature'] == signature:
+                flow_files[filename] = known
+                continue
+
+            parsed += 1
+            flow = self._parse_flow_file(file_path, filename)
+            if flow is None and known:
+                # Keep serving the last good definition (e.g. a half-written file)
+                flow = known['flow']
+            flow_files[filename] = {"signature": signature, "flow": flow}
+        return flow_files, parsed
+
+    @staticmethod
+    def _parse_flow_file(file_path, filename):
+        """Parses and validates one flow file. Returns None if it is unusable."""
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                flow_data = json.load(f)
+            if not _flow_roles(flow_data):
+                logger.warning(f"Flow {filename} is missing a 'role' or 'user_roles' key. Skipping.")
+                return None
+            return flow_data
+        except json.JSONDecodeError:
+            logger.error(f"Error decoding JSON from {filename}.")
+        except Exception as e:
+            logger.error(f"Error loading flow from {filename}: {e}")
+        return None
+
+    def _collect_flows(self):
+        return [entry['flow'] for _, entry in sorted(self._flow_files.items()) if entry['flow'] is not None]
+
+    def _read_flow_cache(self):
+        """Returns the file table stored by a previous run, or {} if unusable."""
+        if not self.flow_cache_file or not os.path.exists(self.flow_cache_file):
+            return {}
+        try:
+            with open(self.flow_cache_file, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('version') != FLOW_CACHE_VERSION or cache.get('flows_dir') != os.path.abspath(self.flows_dir):
+                return {}
+            return cache['files']
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable flow cache {self.flow_cache_file}: {e}")
+            return {}
+
+    def _write_flow_cache(self):
+        """Atomically stores the parsed flow table for the next cold start."""
+        if not self.flow_cache_file:
+            return
+        cache = {
+            "version": FLOW_CACHE_VERSION,
+            "flows_dir": os.path.abspath(self.flows_dir),
+            "files": self._flow_files,
+        }
+        tmp_path = f"{self.flow_cache_file}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                pickle.dump(cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self.flow_cache_file)
+        except Exception as e:
+            logger.warning(f"Could not write flow cache {self.flow_cache_file}: {e}")
+
     def get_flow(self, flow_id):
         """Retrieves a specific flow by its ID."""
-        return next((flow for flow in self.flows if flow.get('id') == flow_id), None)
+        return self.registry.by_id.get(flow_id)
 
-    def get_conversation_state(self, user_id):
-        """Gets the current conversation state for a user from the database."""
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT flow_id, current_step_id, collected_data FROM conversations WHERE user_id = ?", (user_id,))
-            state = cursor.fetchone()
-            if state:
-                return {
-                    "flow_id": state['flow_id'],
-                    "current_step_id": state['current_step_id'],
-                    "collected_data": json.loads(state['collected_data']) if state['collected_data'] else {}
-                }
-            return None
-        except sqlite3.Error as e:
-            logger.error(f"Database error in get_conversation_state: {e}")
-            return None
+    def get_flow_by_trigger(self, trigger_button):
+        """Retrieves the flow started by the given trigger button, if any."""
+        return self.registry.by_trigger.get(trigger_button)
+
+    def get_flows_for_role(self, role):
+        """Returns the flows available to a role, in load order."""
+        return self.registry.by_role.get(role, [])
+
+    def get_step(self, flow_id, step_id):
+        """Retrieves a step of a flow by its step_id."""
+        return self.registry.steps.get(flow_id, {}).get(step_id)
+
+    def get_next_step(self, flow_id, step_id):
+        """Returns the step that follows step_id in a flow, or None if it is the last one."""
+        return self.registry.successors.get(flow_id, {}).get(step_id)
+
+    async def get_conversation_state(self, user_id):
+        """Gets the current conversation state for a user (cached in memory)."""
+        return await self.state_cache.get(user_id)
+
+    async def _load_conversation_state(self, user_id):
+        """Reads a user's conversation state from the database."""
+        state = await db.fetch_one(
+            "SELECT flow_id, current_step_id, collected_data FROM conversations WHERE user_id = ?", (user_id,)
+        )
+        if state:
+            return {
+                "flow_id": state['flow_id'],
+                "current_step_id": state['current_step_id'],
+                "collected_data": json.loads(state['collected_data']) if state['collected_data'] else {}
+            }
+        return None
 
-    def start_flow(self, user_id, flow_id):
+    async def start_flow(self, user_id, flow_id):
         """Starts a new flow for a user."""
         flow = self.get_flow(flow_id)
         if not flow or 'steps' not in flow or not isinstance(flow['steps'], list) or not flow['steps']:
@@ -77,27 +286,38 @@ class FlowEngine:
             return None
 
         initial_step = flow['steps'][0]
-        self.update_conversation_state(user_id, flow_id, initial_step['step_id'], {})
+        await self.update_conversation_state(user_id, flow_id, initial_step['step_id'], {})
         return initial_step
 
-    def update_conversation_state(self, user_id, flow_id, step_id, collected_data):
-        """Creates or updates the conversation state in the database."""
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("""
-                INSERT OR REPLACE INTO conversations (user_id, flow_id, current_step_id, collected_data)
-                VALUES (?, ?, ?, ?)
-            """, (user_id, flow_id, step_id, json.dumps(collected_data)))
-            conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"Database error in update_conversation_state: {e}")
-
-    def handle_response(self, user_id, response_data):
+    async def update_conversation_state(self, user_id, flow_id, step_id, collected_data):
+        """Records the conversation state; it is persisted on the next flush."""
+        await self.state_cache.put(user_id, {
+            "flow_id": flow_id,
+            "current_step_id": step_id,
+            "collected_data": collected_data,
+        })
+
+    async def flush(self):
+        """Writes all pending conversation changes to the database in one transaction."""
+        return await self.state_cache.flush()
+
+    async def _write_conversation_states(self, upserts, deletes):
+        """Persists a batch of conversation changes through the group-commit writer."""
+        rows = [
+            (user_id, state['flow_id'], state['current_step_id'], json.dumps(state['collected_data']))
+            for user_id, state in upserts
+        ]
+        # Both sets are queued before awaiting, so they share one transaction
+        await asyncio.gather(
+            db.write_many(UPSERT_CONVERSATION_SQL, rows),
+            db.write_many(DELETE_CONVERSATION_SQL, [(user_id,) for user_id in deletes]),
+        )
+
+    async def handle_response(self, user_id, response_data):
         """
         Handles a user's response, saves the data, and returns the next action.
         """
-        state = self.get_conversation_state(user_id)
+        state = await self.get_conversation_state(user_id)
         if not state:
             return {"status": "error", "message": "No conversation state found."}
 
@@ -105,9 +325,9 @@ class FlowEngine:
         if not flow:
             return {"status": "error", "message": f"Flow '{state['flow_id']}' not found."}
 
-        current_step = next((step for step in flow['steps'] if step['step_id'] == state['current_step_id']), None)
+        current_step = self.get_step(flow['id'], state['current_step_id'])
         if not current_step:
-            self.end_flow(user_id)
+            await self.end_flow(user_id)
             return {"status": "error", "message": "Current step not found in flow."}
 
         # Save the user's response using the 'variable' key from the step definition
@@ -121,29 +341,21 @@ class FlowEngine:
             state['collected_data'][f"step_{current_step['step_id']}_response"] = response_data
 
 
-        # Find the index of the current step to determine the next one robustly
-        steps = flow['steps']
-        current_step_index = -1
-        for i, step in enumerate(steps):
-            if step['step_id'] == state['current_step_id']:
-                current_step_index = i
-                break
-
-        # Check if there is a next step in the list
-        if current_step_index != -1 and current_step_index + 1 < len(steps):
-            next_step = steps[current_step_index + 1]
-            self.update_conversation_state(user_id, state['flow_id'], next_step['step_id'], state['collected_data'])
+        # The successor is precomputed at load time (honouring 'next_step' keys)
+        next_step = self.get_next_step(flow['id'], current_step['step_id'])
+        if next_step:
+            await self.update_conversation_state(user_id, state['flow_id'], next_step['step_id'], state['collected_data'])
             return {"status": "in_progress", "step": next_step}
         else:
             # This is the last step, so the flow is complete
             final_data = state['collected_data']
-            self.end_flow(user_id)
+            await self.end_flow(user_id)
 
             response = {"status": "complete", "flow_id": flow['id'], "data": final_data}
 
             if flow['id'] == 'client_sales_funnel':
                 user_query = final_data.get('IDEA_PITCH', '')
-                sales_pitch = generate_sales_pitch(user_query, final_data)
+                sales_pitch = await generate_sales_pitch(user_query, final_data)
                 response['sales_pitch'] = sales_pitch
             elif flow['id'] == 'admin_create_nfc_tag':
                 nfc_tag = generate_nfc_tag(final_data)
@@ -151,12 +363,6 @@ class FlowEngine:
 
             return response
 
-    def end_flow(self, user_id):
-        """Ends a flow for a user by deleting their conversation state."""
-        try:
-            conn = get_db_connection()
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM conversations WHERE user_id = ?", (user_id,))
-            conn.commit()
-        except sqlite3.Error as e:
-            logger.error(f"Database error in end_flow: {e}")
+    async def end_flow(self, user_id):
+        """Ends a flow for a user by discarding their conversation state."""
+        await self.state_cache.delete(user_id)
@@ -2,19 +2,49 @@
 # Este script maneja los roles y permisos de los usuarios.
 
 import logging
-from bot.db import get_db_connection
-from bot.config import ADMIN_ID
+import time
+from bot import db
+from bot.config import ADMIN_ID, ROLE_CACHE_TTL
 
 logger = logging.getLogger(__name__)
 
-def add_user(telegram_id, role, name=None, employee_id=None, branch=None):
+# Caché de roles: telegram_id -> (rol, momento de expiración).
+# Se invalida en cada add_user, así que el TTL solo acota cambios hechos
+# directamente en la base de datos.
+_role_cache = {}
+_role_cache_stats = {"hits": 0, "misses": 0}
+# Se incrementa en cada invalidación; una lectura que empezó antes de una
+# invalidación no guarda su resultado (evita reinsertar un rol obsoleto).
+_role_cache_version = 0
+
+
+def _cache_key(telegram_id):
+    try:
+        return int(telegram_id)
+    except (ValueError, TypeError):
+        return telegram_id
+
+
+def invalidate_role_cache(telegram_id=None):
+    """Elimina el rol cacheado de un usuario, o de todos si no se indica ninguno."""
+    global _role_cache_version
+    _role_cache_version += 1
+    if telegram_id is None:
+        _role_cache.clear()
+    else:
+        _role_cache.pop(_cache_key(telegram_id), None)
+
+
+def get_role_cache_stats():
+    """Devuelve los aciertos, fallos y entradas actuales de la caché de roles."""
+    return {**_role_cache_stats, "size": len(_role_cache)}
+
+async def add_user(telegram_id, role, name=None, employee_id=None, branch=None):
     """
     Añade un nuevo usuario o actualiza el rol de uno existente.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
+        await db.write("""
             INSERT INTO users (telegram_id, role, name, employee_id, branch)
             VALUES (?, ?, ?, ?, ?)
             ON CONFLICT(telegram_id) DO UPDATE SET
@@ -23,17 +53,14 @@ def add_user(telegram_id, role, name=None, employee_id=None, branch=None):
             employee_id = excluded.employee_id,
             branch = excluded.branch
         """, (telegram_id, role, name, employee_id, branch))
-        conn.commit()
+        invalidate_role_cache(telegram_id)
         logger.info(f"Usuario {telegram_id} añadido/actualizado con el rol {role}.")
         return True
     except Exception as e:
         logger.error(f"Error al añadir/actualizar usuario {telegram_id}: {e}")
         return False
-    finally:
-        if conn:
-            conn.close()
 
-def get_user_role(telegram_id):
+async def get_user_role(telegram_id):
     """
     Determina el rol de un usuario.
     Roles: 'admin', 'crew', 'client'.
@@ -47,30 +74,35 @@ def get_user_role(telegram_id):
         logger.warning("ADMIN_ID no es un número válido. Ignorando la comparación.")
         pass
 
+    key = _cache_key(telegram_id)
+    cached = _role_cache.get(key)
+    if cached and cached[1] > time.monotonic():
+        _role_cache_stats["hits"] += 1
+        return cached[0]
+    _role_cache_stats["misses"] += 1
+
+    version = _role_cache_version
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT role FROM users WHERE telegram_id = ?", (telegram_id,))
-        user = cursor.fetchone()
+        user = await db.fetch_one("SELECT role FROM users WHERE telegram_id = ?", (telegram_id,))
 
         if user:
             logger.debug(f"Rol encontrado para {telegram_id}: {user['role']}")
-            return user['role']
+            role = user['role']
         else:
             # Si no está en la DB, es un cliente nuevo
             logger.debug(f"No se encontró rol para {telegram_id}, asignando 'client'.")
-            return 'client'
+            role = 'client'
+        if version == _role_cache_version:
+            _role_cache[key] = (role, time.monotonic() + ROLE_CACHE_TTL)
+        return role
     except Exception as e:
         logger.error(f"Error al obtener el rol para {telegram_id}: {e}")
         return 'client' # Fallback seguro
-    finally:
-        if conn:
-            conn.close()
 
-def is_admin(telegram_id):
+async def is_admin(telegram_id):
     """Verifica si un usuario es administrador."""
-    return get_user_role(telegram_id) == 'admin'
+    return await get_user_role(telegram_id) == 'admin'
 
-def is_crew(telegram_id):
+async def is_crew(telegram_id):
     """Verifica si un usuario es del equipo (crew) o administrador."""
-    return get_user_role(telegram_id) in ['admin', 'crew']
+    return await get_user_role(telegram_id) in ['admin', 'crew']
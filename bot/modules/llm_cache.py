@@ -0,0 +1,179 @@
+# bot/modules/llm_cache.py
+# Two-level cache for LLM responses: an in-process LRU backed by SQLite.
+
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import unicodedata
+from collections import OrderedDict
+
+from bot import db
+
+logger = logging.getLogger(__name__)
+
+SELECT_CACHE_SQL = """
+    SELECT response, prompt_tokens, completion_tokens, created_at
+    FROM llm_cache WHERE cache_key = ?
+"""
+UPSERT_CACHE_SQL = """
+    INSERT OR REPLACE INTO llm_cache
+        (cache_key, model, response, prompt_tokens, completion_tokens, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+DELETE_CACHE_SQL = "DELETE FROM llm_cache WHERE cache_key = ?"
+PRUNE_CACHE_SQL = "DELETE FROM llm_cache WHERE created_at < ?"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_prompt(text):
+    """
+    Normalises a prompt so near-identical ones share a cache entry: Unicode
+    compatibility forms are unified, case is folded and runs of whitespace
+    collapse to one space.
+    """
+    text = unicodedata.normalize("NFKC", text).casefold()
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def cache_key(model, *parts):
+    """Builds the cache key from the model name and the normalised prompt parts."""
+    digest = hashlib.sha256(model.encode("utf-8"))
+    for part in parts:
+        digest.update(b"\x00")
+        digest.update(normalize_prompt(part or "").encode("utf-8"))
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Caches LLM responses by key, in memory (LRU) and in the `llm_cache` table.
+
+    Entries older than `ttl` seconds are ignored and deleted. Concurrent
+    requests for the same key share one call to the producer. Only successful
+    responses are stored: if the producer raises, nothing is cached.
+
+    Args:
+        max_size: Maximum number of entries kept in memory.
+        ttl: Seconds an entry is reused. 0 disables the cache entirely.
+    """
+
+    def __init__(self, max_size=256, ttl=604800):
+        self.max_size = max(1, int(max_size))
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.saved_prompt_tokens = 0
+        self.saved_completion_tokens = 0
+
+    async def get_or_create(self, key, model, producer):
+        """
+        Returns the cached response for `key`, or awaits `producer()` and caches
+        its result. `producer` must return `(text, prompt_tokens, completion_tokens)`.
+        """
+        if self.ttl <= 0:
+            return (await producer())[0]
+
+        entry = self._entries.get(key)
+        if entry is not None and not self._expired(entry):
+            self._entries.move_to_end(key)
+            return self._hit(entry)
+
+        while key in self._inflight:
+            pending = self._inflight[key]
+            try:
+                entry = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # Only the first caller was cancelled: try again, loading or
+                # producing the response ourselves if nobody else has started
+                if asyncio.current_task().cancelling() or not pending.cancelled():
+                    raise
+                continue
+            return self._hit(entry)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            entry = await self._load(key)
+            if entry is not None:
+                future.set_result(entry)
+                return self._hit(entry)
+
+            self.misses += 1
+            text, prompt_tokens, completion_tokens = await producer()
+            entry = (text, prompt_tokens or 0, completion_tokens or 0, time.time())
+            self._store(key, entry)
+            future.set_result(entry)
+            try:
+                await db.write(UPSERT_CACHE_SQL, (key, model, *entry))
+            except Exception as e:
+                logger.error(f"Error persisting LLM cache entry: {e}")
+            return text
+        except asyncio.CancelledError:
+            # Waiters are not cancelled with us; they see a cancelled future and retry
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+                # Nobody else may be waiting; avoid "exception was never retrieved"
+                future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+    async def prune(self):
+        """Deletes expired entries from memory and from the database."""
+        cutoff = time.time() - self.ttl
+        for key in [key for key, entry in self._entries.items() if entry[3] < cutoff]:
+            del self._entries[key]
+        await db.write(PRUNE_CACHE_SQL, (cutoff,))
+
+    def stats(self):
+        """Hit ratio and the tokens the cache has saved since startup."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_prompt_tokens": self.saved_prompt_tokens,
+            "saved_completion_tokens": self.saved_completion_tokens,
+            "size": len(self._entries),
+        }
+
+    async def _load(self, key):
+        try:
+            row = await db.fetch_one(SELECT_CACHE_SQL, (key,))
+        except Exception as e:
+            logger.error(f"Error reading LLM cache: {e}")
+            return None
+        if row is None:
+            return None
+        entry = (row["response"], row["prompt_tokens"], row["completion_tokens"], row["created_at"])
+        if self._expired(entry):
+            try:
+                await db.write(DELETE_CACHE_SQL, (key,))
+            except Exception as e:
+                logger.error(f"Error deleting expired LLM cache entry: {e}")
+            return None
+        self._store(key, entry)
+        return entry
+
+    def _hit(self, entry):
+        self.hits += 1
+        self.saved_prompt_tokens += entry[1]
+        self.saved_completion_tokens += entry[2]
+        return entry[0]
+
+    def _expired(self, entry):
+        return time.time() - entry[3] > self.ttl
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -1,35 +1,116 @@
 # bot/modules/llm_engine.py
 # Este script se encarga de la comunicación con la inteligencia artificial de OpenAI.
 
-import openai
-from bot.config import OPENAI_API_KEY, OPENAI_MODEL
+import logging
+from bot.config import (
+    OPENAI_API_KEY,
+    OPENAI_MODEL,
+    OPENAI_TIMEOUT,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MAX_CONNECTIONS,
+    LLM_CACHE_SIZE,
+    LLM_CACHE_TTL,
+)
+from bot.modules.llm_cache import LLMResponseCache, cache_key
 
-def get_smart_response(prompt):
+logger = logging.getLogger(__name__)
+
+# Cliente asíncrono compartido por todo el proceso (ver get_client)
+_client = None
+
+# Respuestas ya generadas, en memoria y en la tabla llm_cache
+response_cache = LLMResponseCache(max_size=LLM_CACHE_SIZE, ttl=LLM_CACHE_TTL)
+
+
+def get_client():
+    """
+    Devuelve el cliente asíncrono de OpenAI, creándolo la primera vez.
+
+    Todas las peticiones comparten el mismo pool de conexiones keep-alive.
+    El SDK reintenta por su cuenta los errores de conexión, los 429 y los 5xx
+    (hasta OPENAI_MAX_RETRIES veces), esperando lo que indique `Retry-After`.
+    Devuelve None si no hay llave de API configurada.
+    """
+    global _client
+    if not OPENAI_API_KEY:
+        return None
+    if _client is None or _client.is_closed():
+        # openai tarda casi un segundo en importarse: lo cargamos al primer uso
+        import httpx
+        import openai
+
+        _client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            timeout=OPENAI_TIMEOUT,
+            max_retries=OPENAI_MAX_RETRIES,
+            http_client=openai.DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                ),
+            ),
+        )
+    return _client
+
+
+async def close_client():
+    """Cierra las conexiones del cliente compartido (al apagar el bot)."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+async def _complete(client, model, system_prompt, prompt):
+    """Pide la respuesta al modelo; devuelve (texto, tokens_prompt, tokens_respuesta)."""
+    response = await client.chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ],
+    )
+    usage = response.usage
+    # Devolvemos el contenido de la respuesta limpia (sin espacios extras)
+    return (
+        response.choices[0].message.content.strip(),
+        usage.prompt_tokens if usage else 0,
+        usage.completion_tokens if usage else 0,
+    )
+
+
+async def get_smart_response(prompt, system_prompt="Eres un asistente útil.", model=None, use_cache=False):
     """
     Genera una respuesta inteligente usando la API de OpenAI.
 
     Parámetros:
     - prompt: El texto o pregunta que le enviamos a la IA.
+    - system_prompt: Instrucciones de sistema para el modelo.
+    - model: Modelo a usar (por defecto, OPENAI_MODEL).
+    - use_cache: Reutiliza la respuesta de un prompt igual (tras normalizarlo)
+      pedido antes al mismo modelo. Los errores nunca se guardan.
     """
     # Verificamos que tengamos la llave de la API configurada
-    if not OPENAI_API_KEY:
+    client = get_client()
+    if client is None:
         return "Error: La llave de la API de OpenAI no está configurada."
 
+    model = model or OPENAI_MODEL
     try:
-        # Creamos el cliente de OpenAI
-        client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        
-        # Solicitamos una respuesta al modelo configurado
-        response = client.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[
-                {"role": "system", "content": "Eres un asistente útil."},
-                {"role": "user", "content": prompt},
-            ],
+        # Solicitamos una respuesta al modelo configurado sin bloquear el event loop
+        if not use_cache:
+            return (await _complete(client, model, system_prompt, prompt))[0]
+        return await response_cache.get_or_create(
+            cache_key(model, system_prompt, prompt),
+            model,
+            lambda: _complete(client, model, system_prompt, prompt),
         )
-        # Devolvemos el contenido de la respuesta limpia (sin espacios extras)
-        return response.choices[0].message.content.strip()
     except Exception as e:
         # Si algo sale mal, devolvemos el error
+        logger.error(f"Error al comunicarse con OpenAI: {e}")
         return f"Ocurrió un error al comunicarse con OpenAI: {e}"
 
+
+def get_cache_stats():
+    """Aciertos de la caché de respuestas y tokens ahorrados."""
+    return response_cache.stats()
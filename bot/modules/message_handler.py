@@ -1,8 +1,8 @@
 # bot/modules/message_handler.py
 # This module handles the processing of text and voice messages.
 
+import io
 import logging
-import os
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -16,33 +16,28 @@ async def text_and_voice_handler(update: Update, context: ContextTypes.DEFAULT_T
     user_id = update.effective_user.id
     flow_engine = context.bot_data["flow_engine"]
 
-    state = flow_engine.get_conversation_state(user_id)
+    state = await flow_engine.get_conversation_state(user_id)
     if not state:
         return
 
     user_response = update.message.text
     if update.message.voice:
         voice = update.message.voice
-        temp_dir = 'temp_files'
-        os.makedirs(temp_dir, exist_ok=True)
-        file_path = os.path.join(temp_dir, f"{voice.file_id}.ogg")
-
         try:
+            # The voice note is streamed into memory; nothing touches the disk
             voice_file = await context.bot.get_file(voice.file_id)
-            await voice_file.download_to_drive(file_path)
-            logger.info(f"Voice message saved to {file_path}")
+            buffer = io.BytesIO()
+            await voice_file.download_to_memory(buffer)
+            logger.info(f"Voice message downloaded ({buffer.tell()} bytes).")
 
-            user_response = transcribe_audio(file_path)
+            user_response = await transcribe_audio(buffer.getvalue(), f"{voice.file_unique_id}.ogg")
             logger.info(f"Transcription result: '{user_response}'")
 
         except Exception as e:
             logger.error(f"Error during voice transcription: {e}")
             user_response = "Error al procesar el mensaje de voz."
-        finally:
-            if os.path.exists(file_path):
-                os.remove(file_path)
 
-    result = flow_engine.handle_response(user_id, user_response)
+    result = await flow_engine.handle_response(user_id, user_response)
 
     if result["status"] == "in_progress":
         await send_step_message(update, result["step"])
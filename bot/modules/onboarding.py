@@ -17,9 +17,9 @@ def get_dynamic_menu(user_role, flow_engine):
 
     # Dynamically add buttons from flows
     if flow_engine:
-        for flow in flow_engine.flows:
-            # Check if the flow is for the user's role and has a trigger button
-            if flow.get("role") == user_role and "trigger_button" in flow and "name" in flow:
+        for flow in flow_engine.get_flows_for_role(user_role):
+            # Only flows with a trigger button can be started from the menu
+            if "trigger_button" in flow and "name" in flow:
                 button = InlineKeyboardButton(flow["name"], callback_data=flow["trigger_button"])
                 keyboard.append([button])
 
@@ -0,0 +1,316 @@
+# bot/modules/print_monitor.py
+# Monitoreo incremental del buzón de la impresora por IMAP.
+#
+# Se guarda el último UID procesado (y el UIDVALIDITY del buzón) en la base de
+# datos, así que cada revisión pide solo los correos nuevos: un UID SEARCH, un
+# único UID FETCH de las cabeceras Subject de todo el rango (sin descargar
+# cuerpos ni adjuntos) y un único UID STORE para marcarlos como leídos. La
+# conexión se mantiene abierta entre revisiones.
+#
+# Opcionalmente, un hilo mantiene una segunda conexión en IDLE y lanza una
+# revisión en cuanto llega un correo, en vez de esperar al siguiente sondeo.
+
+import asyncio
+import email.header
+import email.parser
+import imaplib
+import logging
+import re
+import select
+import ssl
+import threading
+
+from bot import db
+from bot.config import (
+    IMAP_SERVER,
+    IMAP_USER,
+    IMAP_PASS,
+    IMAP_MAILBOX,
+    IMAP_TIMEOUT,
+    IMAP_IDLE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+SELECT_STATE_SQL = "SELECT uid_validity, last_uid FROM imap_state WHERE mailbox = ?"
+UPSERT_STATE_SQL = "INSERT OR REPLACE INTO imap_state (mailbox, uid_validity, last_uid) VALUES (?, ?, ?)"
+
+_FETCH_UID = re.compile(rb"\bUID (\d+)")
+_MAILBOX_CHANGED = re.compile(rb"^\* \d+ (EXISTS|RECENT)\b")
+_header_parser = email.parser.BytesHeaderParser()
+
+
+def uid_set(uids):
+    """Compacta una lista de UIDs en un conjunto IMAP: [1, 2, 3, 7] -> "1:3,7"."""
+    ranges = []
+    for uid in sorted(set(uids)):
+        if ranges and uid == ranges[-1][1] + 1:
+            ranges[-1][1] = uid
+        else:
+            ranges.append([uid, uid])
+    return ",".join(str(start) if start == end else f"{start}:{end}" for start, end in ranges)
+
+
+def parse_subjects(fetch_data):
+    """
+    Extrae (uid, asunto) de la respuesta de un UID FETCH de
+    BODY.PEEK[HEADER.FIELDS (SUBJECT)]. Los asuntos codificados (RFC 2047) se decodifican.
+    """
+    messages = []
+    for part in fetch_data:
+        if not isinstance(part, tuple):
+            continue
+        match = _FETCH_UID.search(part[0])
+        if not match:
+            continue
+        subject = _header_parser.parsebytes(part[1])["subject"] or ""
+        subject = str(email.header.make_header(email.header.decode_header(subject)))
+        messages.append((int(match.group(1)), subject))
+    return sorted(messages)
+
+
+def _connect():
+    mail = imaplib.IMAP4_SSL(IMAP_SERVER, timeout=IMAP_TIMEOUT)
+    mail.login(IMAP_USER, IMAP_PASS)
+    return mail
+
+
+class PrintStatusMonitor:
+    """
+    Lee las respuestas nuevas de la impresora y las entrega a `on_replies`.
+
+    `check()` procesa los correos con UID mayor al último guardado. La primera
+    vez (o si el servidor cambia el UIDVALIDITY del buzón) no hay UID de
+    referencia y se toman los correos no leídos. Un correo solo cuenta como
+    procesado, y se marca como leído, después de que `on_replies` termina sin error.
+
+    Args:
+        connect: Función que devuelve una conexión IMAP ya autenticada.
+        mailbox: Buzón a vigilar.
+    """
+
+    def __init__(self, connect=_connect, mailbox=IMAP_MAILBOX):
+        self._connect = connect
+        self.mailbox = mailbox
+        # Corrutina que recibe la lista de asuntos nuevos
+        self.on_replies = None
+        self.uid_validity = None
+        self.last_uid = None
+        self._state_loaded = False
+        self._mail = None
+        self._server_validity = None
+        # La conexión solo se usa desde un hilo a la vez
+        self._mail_lock = threading.Lock()
+        self._check_lock = None
+        self._idle_thread = None
+        self._stop = threading.Event()
+
+    # --- Operaciones bloqueantes (en un hilo) ---
+
+    def _open(self):
+        if self._mail is None:
+            mail = self._connect()
+            status, _ = mail.select(self.mailbox)
+            if status != "OK":
+                mail.logout()
+                raise imaplib.IMAP4.error(f"No se pudo abrir el buzón {self.mailbox}.")
+            # Si cambia, los UIDs guardados ya no identifican los mismos correos
+            _, data = mail.response("UIDVALIDITY")
+            self._server_validity = int(data[0]) if data and data[0] else 0
+            self._mail = mail
+        return self._mail
+
+    def _drop(self):
+        mail, self._mail = self._mail, None
+        if mail is not None:
+            try:
+                mail.logout()
+            except Exception:
+                pass
+
+    def _fetch_new(self, uid_validity, last_uid):
+        """Devuelve (uid_validity, [(uid, asunto), ...]) de los correos nuevos."""
+        with self._mail_lock:
+            for attempt in (1, 2):
+                try:
+                    return self._fetch_new_locked(uid_validity, last_uid)
+                except (imaplib.IMAP4.abort, OSError) as e:
+                    # La conexión guardada pudo cerrarse por inactividad: se reabre una vez
+                    self._drop()
+                    if attempt == 2:
+                        raise
+                    logger.info(f"Reconectando al servidor IMAP: {e}")
+
+    def _fetch_new_locked(self, uid_validity, last_uid):
+        mail = self._open()
+        # NOOP hace que el servidor informe de los correos llegados desde el último comando
+        mail.noop()
+        current_validity = self._server_validity
+        if current_validity != uid_validity:
+            last_uid = None
+
+        if last_uid is None:
+            status, data = mail.uid("SEARCH", "UNSEEN")
+        else:
+            status, data = mail.uid("SEARCH", f"UID {last_uid + 1}:*")
+        if status != "OK":
+            raise imaplib.IMAP4.error("No se pudieron buscar los correos.")
+        uids = [int(uid) for uid in data[0].split()]
+        # "n:*" siempre incluye el último correo del buzón aunque su UID sea menor que n
+        if last_uid is not None:
+            uids = [uid for uid in uids if uid > last_uid]
+        if not uids:
+            return current_validity, []
+
+        status, data = mail.uid("FETCH", uid_set(uids), "(BODY.PEEK[HEADER.FIELDS (SUBJECT)])")
+        if status != "OK":
+            raise imaplib.IMAP4.error("No se pudieron leer los asuntos de los correos.")
+        return current_validity, parse_subjects(data)
+
+    def _mark_seen(self, uids):
+        with self._mail_lock:
+            mail = self._open()
+            mail.uid("STORE", uid_set(uids), "+FLAGS.SILENT", "(\\Seen)")
+
+    def close(self):
+        """Detiene el hilo de IDLE y cierra la conexión."""
+        self._stop.set()
+        if self._idle_thread is not None:
+            self._idle_thread.join(timeout=5)
+            self._idle_thread = None
+        with self._mail_lock:
+            self._drop()
+
+    # --- Revisión asíncrona ---
+
+    async def _load_state(self):
+        row = await db.fetch_one(SELECT_STATE_SQL, (self.mailbox,))
+        if row is not None:
+            self.uid_validity, self.last_uid = row["uid_validity"], row["last_uid"]
+        self._state_loaded = True
+
+    async def check(self):
+        """Procesa los correos nuevos del buzón. Devuelve cuántos se leyeron."""
+        if self._check_lock is None:
+            self._check_lock = asyncio.Lock()
+        # El sondeo periódico y el aviso de IDLE pueden coincidir
+        async with self._check_lock:
+            if not self._state_loaded:
+                await self._load_state()
+            uid_validity, messages = await asyncio.to_thread(self._fetch_new, self.uid_validity, self.last_uid)
+            if uid_validity != self.uid_validity:
+                self.uid_validity, self.last_uid = uid_validity, None
+            if messages:
+                if self.on_replies is not None:
+                    await self.on_replies([subject for _, subject in messages])
+                uids = [uid for uid, _ in messages]
+                await asyncio.to_thread(self._mark_seen, uids)
+                self.last_uid = max(uids + [self.last_uid or 0])
+            if self.last_uid is not None:
+                await db.write(UPSERT_STATE_SQL, (self.mailbox, self.uid_validity, self.last_uid))
+            return len(messages)
+
+    # --- IDLE ---
+
+    def start_idle(self, loop):
+        """Arranca el hilo que espera correos nuevos con IDLE y lanza `check()` en `loop`."""
+        if self._idle_thread is not None:
+            return
+        self._stop.clear()
+        self._idle_thread = threading.Thread(target=self._idle_loop, args=(loop,), name="imap-idle", daemon=True)
+        self._idle_thread.start()
+
+    def _idle_loop(self, loop):
+        while not self._stop.is_set():
+            mail = None
+            try:
+                mail = self._connect()
+                mail.select(self.mailbox, readonly=True)
+                # IDLE espera con select(); un timeout de socket vencido dejaría
+                # inservible el archivo de lectura de imaplib
+                mail.sock.settimeout(None)
+                if "IDLE" not in mail.capabilities:
+                    logger.warning("El servidor IMAP no soporta IDLE; se usará solo el sondeo periódico.")
+                    return
+                logger.info("Esperando respuestas de la impresora con IMAP IDLE.")
+                while not self._stop.is_set():
+                    if idle(mail, IMAP_IDLE_TIMEOUT, self._stop):
+                        asyncio.run_coroutine_threadsafe(self._check_logged(), loop)
+            except Exception as e:
+                logger.error(f"Error en la conexión IMAP IDLE: {e}")
+                # Espera antes de reconectar, salvo que se esté apagando
+                self._stop.wait(30)
+            finally:
+                if mail is not None:
+                    try:
+                        mail.logout()
+                    except Exception:
+                        pass
+
+    async def _check_logged(self):
+        try:
+            await self.check()
+        except Exception as e:
+            logger.error(f"Error al revisar el estado de la impresión: {e}")
+
+
+def idle(mail, timeout, stop=None):
+    """
+    Deja la conexión en IDLE hasta que el servidor avise de un correo nuevo,
+    pasen `timeout` segundos o se active `stop`. Devuelve True si el buzón cambió.
+
+    imaplib no implementa IDLE (RFC 2177) en esta versión de Python, así que se
+    envía el comando a mano y se espera con select() sobre el socket. La
+    conexión no debe tener timeout de socket: uno vencido dejaría inservible el
+    archivo de lectura de imaplib.
+    """
+    tag = mail._new_tag()
+    mail.send(tag + b" IDLE\r\n")
+    line = mail.readline()
+    if not line.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"El servidor rechazó IDLE: {line!r}")
+
+    changed = False
+    remaining = timeout
+    while remaining > 0 and not changed and not (stop is not None and stop.is_set()):
+        wait = min(1.0, remaining)
+        if _buffered(mail) or select.select([mail.sock], [], [], wait)[0]:
+            line = mail.readline()
+            if not line:
+                raise imaplib.IMAP4.abort("El servidor cerró la conexión IDLE.")
+            changed = bool(_MAILBOX_CHANGED.match(line))
+        else:
+            remaining -= wait
+
+    mail.send(b"DONE\r\n")
+    while True:
+        line = mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("El servidor cerró la conexión IDLE.")
+        if line.startswith(tag):
+            break
+        changed = changed or bool(_MAILBOX_CHANGED.match(line))
+    return changed
+
+
+def _buffered(mail):
+    """
+    Indica si ya hay datos leídos del socket y sin consumir, que select() no ve:
+    en el búfer del archivo de imaplib (p. ej. un EXISTS llegado en el mismo
+    paquete que la respuesta "+") o descifrados por SSL.
+    """
+    if getattr(mail.sock, "pending", lambda: 0)():
+        return True
+    # peek() solo lee del socket si el búfer está vacío; sin bloqueo, esa
+    # lectura devuelve lo que haya o nada
+    timeout = mail.sock.gettimeout()
+    mail.sock.setblocking(False)
+    try:
+        return bool(mail.file.peek())
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        mail.sock.settimeout(timeout)
+
+
+status_monitor = PrintStatusMonitor()
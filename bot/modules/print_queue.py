@@ -0,0 +1,400 @@
+# bot/modules/print_queue.py
+# Cola de trabajos de impresión: los documentos se encolan al instante y un
+# worker en segundo plano los envía por correo a la impresora, reutilizando una
+# sesión SMTP autenticada para varios trabajos seguidos.
+
+import asyncio
+import base64
+import logging
+import mimetypes
+import re
+import smtplib
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from email.header import Header
+from email.utils import formatdate, make_msgid
+from urllib.parse import quote
+
+from bot import db
+from bot.config import (
+    SMTP_SERVER,
+    SMTP_PORT,
+    SMTP_USER,
+    SMTP_PASS,
+    SMTP_TIMEOUT,
+    SMTP_IDLE_TIMEOUT,
+    PRINTER_EMAIL,
+    PRINT_BATCH_SIZE,
+)
+
+logger = logging.getLogger(__name__)
+
+# 57 bytes de entrada producen una línea base64 de 76 caracteres (RFC 2045)
+_BASE64_LINE_BYTES = 57
+_READ_BLOCK = _BASE64_LINE_BYTES * 1024
+
+QUEUED = "queued"
+SENT = "sent"
+RECEIVED = "received"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Estados desde los que se puede llegar a cada uno; un estado final no cambia
+_PREVIOUS_STATUSES = {
+    SENT: (QUEUED,),
+    RECEIVED: (QUEUED, SENT),
+    COMPLETED: (QUEUED, SENT, RECEIVED),
+    FAILED: (QUEUED, SENT, RECEIVED),
+}
+
+INSERT_JOB_SQL = """
+    INSERT INTO print_jobs (job_id, user_id, chat_id, file_name, status, error, created_at, updated_at)
+    VALUES (?, ?, ?, ?, ?, NULL, ?, ?)
+"""
+SELECT_USER_JOBS_SQL = """
+    SELECT job_id, file_name, status, error, created_at, updated_at
+    FROM print_jobs WHERE user_id = ? ORDER BY created_at DESC LIMIT ?
+"""
+SELECT_JOB_SQL = "SELECT job_id, user_id, chat_id, file_name, status, error FROM print_jobs WHERE job_id = ?"
+
+
+class PrintJob:
+    """Un documento pendiente de enviar a la impresora."""
+
+    def __init__(self, job_id, user_id, chat_id, content, file_name):
+        self.job_id = job_id
+        self.user_id = user_id
+        self.chat_id = chat_id
+        # Archivo binario con el documento (p. ej. un SpooledTemporaryFile); la cola lo cierra al terminar
+        self.content = content
+        self.file_name = file_name
+        self.status = QUEUED
+        self.error = None
+        self.created_at = time.time()
+
+
+def new_job_id():
+    """Identificador corto para que el usuario pueda referirse al trabajo."""
+    return uuid.uuid4().hex[:8]
+
+
+async def record_status(job_id, status, error=None):
+    """
+    Guarda un cambio de estado del trabajo si es un avance válido (p. ej. una
+    respuesta "recibido" de la impresora no deshace un "completado").
+    Devuelve True si el estado cambió.
+    """
+    previous = _PREVIOUS_STATUSES[status]
+    placeholders = ", ".join("?" for _ in previous)
+    changed = await db.execute(
+        f"UPDATE print_jobs SET status = ?, error = ?, updated_at = ? "
+        f"WHERE job_id = ? AND status IN ({placeholders})",
+        (status, error, time.time(), job_id, *previous),
+    )
+    return changed > 0
+
+
+async def get_job(job_id):
+    """Devuelve la fila del trabajo o None."""
+    return await db.fetch_one(SELECT_JOB_SQL, (job_id,))
+
+
+async def get_user_jobs(user_id, limit=10):
+    """Últimos trabajos del usuario, del más reciente al más antiguo."""
+    return await db.fetch_all(SELECT_USER_JOBS_SQL, (user_id, limit))
+
+
+async def fail_interrupted_jobs():
+    """
+    Marca como fallidos los trabajos que quedaron en cola al apagarse el bot:
+    su documento solo estaba en memoria y nadie los va a enviar.
+    """
+    changed = await db.execute(
+        "UPDATE print_jobs SET status = ?, error = ?, updated_at = ? WHERE status = ?",
+        (FAILED, "Interrumpido por un reinicio del bot.", time.time(), QUEUED),
+    )
+    if changed:
+        logger.warning(f"{changed} trabajos de impresión interrumpidos por el reinicio marcados como fallidos.")
+    return changed
+
+
+# Caracteres de control (incluidos CR y LF) y separadores de línea Unicode
+_CONTROL_CHARACTERS = re.compile("[\x00-\x1f\x7f-\x9f\u2028\u2029]+")
+
+
+def _clean_name(name):
+    """
+    Nombre de archivo sin caracteres de control. El nombre lo elige el usuario
+    de Telegram: un salto de línea en él permitiría añadir cabeceras al correo
+    (p. ej. Bcc) o cortar el DATA de SMTP con una línea ".".
+    """
+    return _CONTROL_CHARACTERS.sub(" ", name).strip() or "documento"
+
+
+def _filename_param(name, width=60):
+    """
+    Parámetro `filename` de Content-Disposition, con el separador que lo
+    precede, codificado según RFC 2231 (comillas, espacios y cualquier carácter
+    especial van como %XX). Un nombre largo se parte en continuaciones
+    (filename*0*, filename*1*...) en líneas separadas, para no pasar del largo
+    de línea de SMTP.
+    """
+    pieces = ["utf-8''"]
+    for character in name:
+        encoded = quote(character, safe="")
+        if len(pieces[-1]) + len(encoded) > width:
+            pieces.append("")
+        pieces[-1] += encoded
+    if len(pieces) == 1:
+        return f" filename*={pieces[0]}"
+    return "".join(f"{';' if number else ''}\r\n filename*{number}*={piece}" for number, piece in enumerate(pieces))
+
+
+def _header(name, value):
+    """Valor de cabecera listo para enviar, siempre como encoded-words (RFC 2047) y plegado con CRLF."""
+    return Header(value, "utf-8", header_name=name).encode(linesep="\r\n")
+
+
+def write_message(write, job, sender, recipient):
+    """
+    Escribe el correo MIME del trabajo llamando a `write(bytes)` por partes.
+
+    El adjunto se lee de `job.content` por bloques, desde el principio, y se
+    codifica en base64 sobre la marcha, así que la versión codificada nunca
+    está entera en memoria. Las líneas van terminadas en
+    CRLF como exige el comando DATA de SMTP; ninguna empieza por ".", así que
+    no hace falta escaparlas.
+    """
+    boundary = f"=_{uuid.uuid4().hex}"
+    file_name = _clean_name(job.file_name)
+    content_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+    filename_param = _filename_param(file_name)
+    body = (
+        f"Nuevo trabajo de impresión #{job.job_id} enviado por el usuario {job.user_id}.\r\n"
+        f"Nombre del archivo: {file_name}\r\n"
+    )
+
+    write((
+        f"From: {sender}\r\n"
+        f"To: {recipient}\r\n"
+        f"Subject: {_header('Subject', f'Print Job #{job.job_id} from {job.user_id}: {file_name}')}\r\n"
+        f"Date: {formatdate(localtime=True)}\r\n"
+        f"Message-ID: {make_msgid()}\r\n"
+        "MIME-Version: 1.0\r\n"
+        f'Content-Type: multipart/mixed; boundary="{boundary}"\r\n'
+        "\r\n"
+        f"--{boundary}\r\n"
+        'Content-Type: text/plain; charset="utf-8"\r\n'
+        "Content-Transfer-Encoding: base64\r\n"
+        "\r\n"
+    ).encode("ascii"))
+    write(base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n"))
+    write((
+        f"--{boundary}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        "Content-Transfer-Encoding: base64\r\n"
+        f"Content-Disposition: attachment;{filename_param}\r\n"
+        "\r\n"
+    ).encode("ascii"))
+    # Un reintento tras una desconexión vuelve a leer el documento desde el inicio
+    job.content.seek(0)
+    while True:
+        block = job.content.read(_READ_BLOCK)
+        if not block:
+            break
+        write(base64.encodebytes(block).replace(b"\n", b"\r\n"))
+    write(f"--{boundary}--\r\n".encode("ascii"))
+
+
+class SMTPSession:
+    """
+    Conexión SMTP autenticada que se reutiliza entre trabajos.
+
+    Solo se usa desde el hilo del worker de impresión. Si el servidor cerró la
+    conexión, se abre otra y se reintenta el envío una vez.
+    """
+
+    def __init__(self, server, port, user, password, timeout=SMTP_TIMEOUT):
+        self.server = server
+        self.port = int(port) if port else 465
+        self.user = user
+        self.password = password
+        self.timeout = timeout
+        self._smtp = None
+        self.last_used = 0.0
+
+    def _connect(self):
+        self.close()
+        smtp = smtplib.SMTP_SSL(self.server, self.port, timeout=self.timeout)
+        smtp.login(self.user, self.password)
+        self._smtp = smtp
+        logger.info(f"Sesión SMTP abierta con {self.server}:{self.port}.")
+
+    def send(self, job, recipient):
+        """Envía un trabajo; reconecta una vez si la sesión se había cerrado."""
+        for attempt in range(2):
+            if self._smtp is None:
+                self._connect()
+            try:
+                self._send_streaming(job, recipient)
+                self.last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                if attempt:
+                    raise
+                logger.warning(f"Sesión SMTP perdida ({e}). Reconectando.")
+                self._smtp = None
+
+    def _send_streaming(self, job, recipient):
+        smtp = self._smtp
+        code, response = smtp.mail(self.user)
+        if code != 250:
+            raise smtplib.SMTPSenderRefused(code, response, self.user)
+        code, response = smtp.rcpt(recipient)
+        if code not in (250, 251):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused({recipient: (code, response)})
+        smtp.putcmd("data")
+        code, response = smtp.getreply()
+        if code != 354:
+            smtp.rset()
+            raise smtplib.SMTPDataError(code, response)
+        write_message(smtp.send, job, self.user, recipient)
+        smtp.send(b".\r\n")
+        code, response = smtp.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+
+    def close_if_idle(self, idle_timeout):
+        if self._smtp is not None and time.monotonic() - self.last_used >= idle_timeout:
+            logger.info("Cerrando sesión SMTP inactiva.")
+            self.close()
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                try:
+                    self._smtp.close()
+                except Exception:
+                    pass
+            self._smtp = None
+
+
+class PrintQueue:
+    """
+    Cola asíncrona de trabajos de impresión con un único worker.
+
+    `submit()` devuelve en cuanto el trabajo está en la cola. El worker toma
+    hasta `batch_size` trabajos a la vez y los envía seguidos, en un hilo
+    propio, por la misma sesión SMTP; la sesión se cierra tras `idle_timeout`
+    segundos sin trabajo. Al terminar cada trabajo se llama a `notify(job)`,
+    si está definido, y se cierra el documento.
+    """
+
+    def __init__(self, session_factory=None, batch_size=PRINT_BATCH_SIZE, idle_timeout=SMTP_IDLE_TIMEOUT):
+        self._session_factory = session_factory or (
+            lambda: SMTPSession(SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS)
+        )
+        self.batch_size = max(1, batch_size)
+        self.idle_timeout = idle_timeout
+        self.notify = None
+        # Trabajos encolados o en envío, por id
+        self.jobs = {}
+        self._queue = None
+        self._worker = None
+        self._session = None
+        # Un solo hilo: la sesión SMTP nunca se usa desde dos hilos a la vez
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="print-smtp")
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            if self._queue is None:
+                self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, user_id, chat_id, content, file_name, job_id=None):
+        """Encola un documento y devuelve su PrintJob sin esperar al envío."""
+        job = PrintJob(job_id or new_job_id(), user_id, chat_id, content, file_name)
+        await db.write(INSERT_JOB_SQL, (job.job_id, user_id, chat_id, file_name, QUEUED, job.created_at, job.created_at))
+        self.jobs[job.job_id] = job
+        self._ensure_worker()
+        await self._queue.put(job)
+        logger.info(f"Trabajo de impresión #{job.job_id} encolado ({file_name}).")
+        return job
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                job = await asyncio.wait_for(self._queue.get(), timeout=self.idle_timeout)
+            except asyncio.TimeoutError:
+                if self._session is not None:
+                    await loop.run_in_executor(self._executor, self._session.close_if_idle, self.idle_timeout)
+                continue
+
+            batch = [job]
+            while len(batch) < self.batch_size and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            await loop.run_in_executor(self._executor, self._send_batch, batch)
+            for job in batch:
+                await self._finish(job)
+                self._queue.task_done()
+
+    def _send_batch(self, batch):
+        """Envía un lote de trabajos por la sesión SMTP (en el hilo del worker)."""
+        if self._session is None:
+            self._session = self._session_factory()
+        for job in batch:
+            try:
+                self._session.send(job, PRINTER_EMAIL)
+                job.status = SENT
+                logger.info(f"Trabajo #{job.job_id} ({job.file_name}) enviado a la impresora ({PRINTER_EMAIL}).")
+            except Exception as e:
+                job.status = FAILED
+                job.error = str(e)
+                logger.error(f"Error al enviar el trabajo de impresión #{job.job_id}: {e}")
+                # Una sesión en mal estado no debe arrastrar al resto del lote
+                self._session.close()
+
+    async def _finish(self, job):
+        self.jobs.pop(job.job_id, None)
+        try:
+            await record_status(job.job_id, job.status, job.error)
+        except Exception as e:
+            logger.error(f"Error al guardar el estado del trabajo de impresión #{job.job_id}: {e}")
+        job.content.close()
+        if self.notify is not None:
+            try:
+                await self.notify(job)
+            except Exception as e:
+                logger.error(f"Error al notificar el trabajo de impresión #{job.job_id}: {e}")
+
+    async def join(self):
+        """Espera a que se hayan procesado todos los trabajos encolados."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self, timeout=30):
+        """Envía lo que quede en la cola (hasta `timeout` segundos) y cierra la sesión SMTP."""
+        if self._worker is not None:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"{self._queue.qsize()} trabajos de impresión sin enviar al apagar.")
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        if self._session is not None:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self._session.close)
+            self._session = None
+        self._queue = None
+
+
+print_queue = PrintQueue()
@@ -1,15 +1,8 @@
 # bot/modules/printer.py
 # This module will contain the SMTP/IMAP loop for the remote printing service.
 
-import smtplib
-import imaplib
-import email
 import logging
-import os
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
+import re
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -24,7 +17,20 @@ from bot.config import (
     PRINTER_EMAIL,
 )
 from bot.modules.identity import is_admin
-from bot.modules.file_validation import validate_document
+from bot.modules.file_validation import validate_document, ContentValidator, FileValidationError
+from bot.modules.document_download import download_document
+from bot.modules.print_monitor import status_monitor
+from bot.modules.print_queue import (
+    print_queue,
+    get_job,
+    get_user_jobs,
+    record_status,
+    QUEUED,
+    SENT,
+    RECEIVED,
+    COMPLETED,
+    FAILED,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -38,120 +44,147 @@ async def handle_document(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
         await update.message.reply_text(message)
         return
 
-    file = await context.bot.get_file(document.file_id)
-
-    temp_dir = 'temp_files'
-    os.makedirs(temp_dir, exist_ok=True)
-    file_path = os.path.join(temp_dir, document.file_name)
+    if not await is_admin(user_id):
+        await update.message.reply_text("No tienes permiso para usar este comando.")
+        return
 
     try:
-        await file.download_to_drive(file_path)
+        file = await context.bot.get_file(document.file_id)
+        content = await download_document(file, ContentValidator(document.mime_type))
+    except FileValidationError as e:
+        await update.message.reply_text(str(e))
+        return
+    except Exception as e:
+        logger.error(f"Error al descargar el documento para imprimir: {e}")
+        await update.message.reply_text("No se pudo descargar el archivo. Por favor, inténtalo de nuevo.")
+        return
 
-        response = await send_file_to_printer(file_path, user_id, document.file_name)
-        await update.message.reply_text(response)
-    finally:
-        if os.path.exists(file_path):
-            os.remove(file_path)
+    # The print queue owns the buffer from here on and closes it once sent
+    response = await send_file_to_printer(
+        content, user_id, document.file_name or "documento", update.effective_chat.id
+    )
+    await update.message.reply_text(response)
 
 
-async def send_file_to_printer(file_path: str, user_id: int, file_name: str):
+async def send_file_to_printer(content, user_id: int, file_name: str, chat_id: int = None, job_id: str = None):
     """
-    Sends a file to the printer via email.
+    Queues a document (a binary file object) to be emailed to the printer and
+    returns at once with the job id. The print queue sends it in the background,
+    notifies the chat when done and closes the file.
     """
-    if not is_admin(user_id):
-        return "No tienes permiso para usar este comando."
-
-    if not all([SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS, PRINTER_EMAIL]):
-        logger.error("Faltan una o más variables de entorno SMTP o PRINTER_EMAIL.")
-        return "El servicio de impresión no está configurado correctamente."
-
     try:
-        msg = MIMEMultipart()
-        msg["From"] = SMTP_USER
-        msg["To"] = PRINTER_EMAIL
-        msg["Subject"] = f"Print Job from {user_id}: {file_name}"
-
-        body = f"Nuevo trabajo de impresión enviado por el usuario {user_id}.\nNombre del archivo: {file_name}"
-        msg.attach(MIMEText(body, "plain"))
-
-        with open(file_path, "rb") as attachment:
-            part = MIMEBase("application", "octet-stream")
-            part.set_payload(attachment.read())
-
-        encoders.encode_base64(part)
-        part.add_header(
-            "Content-Disposition",
-            f"attachment; filename= {file_name}",
-        )
-        msg.attach(part)
-
-        server = smtplib.SMTP_SSL(SMTP_SERVER, SMTP_PORT)
-        server.login(SMTP_USER, SMTP_PASS)
-        text = msg.as_string()
-        server.sendmail(SMTP_USER, PRINTER_EMAIL, text)
-        server.quit()
-
-        logger.info(f"Archivo {file_name} enviado a la impresora ({PRINTER_EMAIL}) por el usuario {user_id}.")
-        return f"Tu archivo '{file_name}' ha sido enviado a la impresora. Recibirás una notificación cuando el estado del trabajo cambie."
+        if not await is_admin(user_id):
+            content.close()
+            return "No tienes permiso para usar este comando."
+
+        if not all([SMTP_SERVER, SMTP_PORT, SMTP_USER, SMTP_PASS, PRINTER_EMAIL]):
+            logger.error("Faltan una o más variables de entorno SMTP o PRINTER_EMAIL.")
+            content.close()
+            return "El servicio de impresión no está configurado correctamente."
 
+        job = await print_queue.submit(user_id, chat_id or user_id, content, file_name, job_id=job_id)
     except Exception as e:
-        logger.error(f"Error al enviar el correo de impresión: {e}")
-        return "Ocurrió un error al enviar el archivo a la impresora. Por favor, inténtalo de nuevo más tarde."
+        logger.error(f"Error al encolar el trabajo de impresión: {e}")
+        content.close()
+        return "No se pudo encolar el archivo. Por favor, inténtalo de nuevo."
+    return (f"Tu archivo '{file_name}' está en la cola de impresión (trabajo #{job.job_id}). "
+            "Te avisaré cuando se haya enviado a la impresora.")
+
+
+async def notify_print_job(bot, job):
+    """Tells the user how their print job ended."""
+    if job.status == SENT:
+        text = f"🖨️ Trabajo #{job.job_id} ('{job.file_name}') enviado a la impresora."
+    else:
+        text = (f"❌ No se pudo enviar el trabajo #{job.job_id} ('{job.file_name}') a la impresora. "
+                "Por favor, inténtalo de nuevo más tarde.")
+    await bot.send_message(chat_id=job.chat_id, text=text)
+
+
+# Texto que se muestra al usuario para cada estado del trabajo
+STATUS_LABELS = {
+    QUEUED: "⏳ En cola",
+    SENT: "📤 Enviado a la impresora",
+    RECEIVED: "📥 Recibido por la impresora",
+    COMPLETED: "✅ Impreso",
+    FAILED: "❌ Fallido",
+}
+
+# Las respuestas de la impresora citan el asunto original, que lleva "#<id>"
+_JOB_ID_IN_SUBJECT = re.compile(r"#([0-9a-f]{8})\b")
 
 
 async def check_print_status(user_id: int):
     """
-    Checks the status of print jobs by reading the inbox.
+    Lists the user's latest print jobs and their status.
+    Answers from the print_jobs table; the mailbox is read by poll_print_status.
     """
-    if not is_admin(user_id):
+    if not await is_admin(user_id):
         return "No tienes permiso para usar este comando."
 
-    if not all([IMAP_SERVER, IMAP_USER, IMAP_PASS]):
-        logger.error("Faltan una o más variables de entorno IMAP.")
-        return "El servicio de monitoreo de impresión no está configurado correctamente."
+    jobs = await get_user_jobs(user_id)
+    if not jobs:
+        return "No tienes trabajos de impresión registrados."
+
+    lines = ["Tus últimos trabajos de impresión:"]
+    for job in jobs:
+        line = f"#{job['job_id']} '{job['file_name']}': {STATUS_LABELS.get(job['status'], job['status'])}"
+        if job['status'] == FAILED and job['error']:
+            line += f" ({job['error']})"
+        lines.append(line)
+    return "\n".join(lines)
 
-    try:
-        mail = imaplib.IMAP4_SSL(IMAP_SERVER)
-        mail.login(IMAP_USER, IMAP_PASS)
-        mail.select("inbox")
-
-        status, messages = mail.search(None, "UNSEEN")
-        if status != "OK":
-            return "No se pudieron buscar los correos."
-
-        email_ids = messages[0].split()
-        if not email_ids:
-            return "No hay actualizaciones de estado de impresión."
-
-        # Fetch only the last 10 unseen emails
-        email_ids = email_ids[-10:]
-
-        statuses = []
-        for e_id in email_ids:
-            _, msg_data = mail.fetch(e_id, "(RFC822)")
-            for response_part in msg_data:
-                if isinstance(response_part, tuple):
-                    msg = email.message_from_bytes(response_part[1])
-                    subject = msg["subject"].lower()
-                    if "completed" in subject:
-                        statuses.append(f"Trabajo de impresión completado: {msg['subject']}")
-                    elif "failed" in subject:
-                        statuses.append(f"Trabajo de impresión fallido: {msg['subject']}")
-                    elif "received" in subject:
-                        statuses.append(f"Trabajo de impresión recibido: {msg['subject']}")
-                    else:
-                        statuses.append(f"Nuevo correo: {msg['subject']}")
-            # Mark the email as seen
-            mail.store(e_id, "+FLAGS", "\\Seen")
-
-        mail.close()
-        mail.logout()
-
-        if not statuses:
-            return "No se encontraron actualizaciones de estado relevantes."
-
-        return "\n".join(statuses)
 
+def parse_status_reply(subject):
+    """
+    Extracts (job_id, status) from the subject of a printer reply, or None if
+    the email does not refer to one of our jobs.
+    """
+    match = _JOB_ID_IN_SUBJECT.search(subject or "")
+    if not match:
+        return None
+    lowered = subject.lower()
+    if "completed" in lowered:
+        return match.group(1), COMPLETED
+    if "failed" in lowered:
+        return match.group(1), FAILED
+    if "received" in lowered:
+        return match.group(1), RECEIVED
+    return None
+
+
+async def apply_status_replies(subjects, bot=None):
+    """
+    Records the job status found in each printer reply and, when a job
+    finishes (printed or failed), tells its owner. Returns the number of
+    jobs whose status changed.
+    """
+    changed = 0
+    for subject in subjects:
+        parsed = parse_status_reply(subject)
+        if parsed is None:
+            logger.info(f"Correo sin trabajo de impresión asociado: {subject}")
+            continue
+        job_id, status = parsed
+        if not await record_status(job_id, status):
+            continue
+        changed += 1
+        logger.info(f"Trabajo de impresión #{job_id}: {status}.")
+        if bot is not None and status in (COMPLETED, FAILED):
+            job = await get_job(job_id)
+            if job:
+                await bot.send_message(
+                    chat_id=job['chat_id'],
+                    text=f"Trabajo #{job_id} ('{job['file_name']}'): {STATUS_LABELS[status]}",
+                )
+    return changed
+
+
+async def poll_print_status(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Job-queue task: reads new printer replies and updates the print_jobs table."""
+    if not all([IMAP_SERVER, IMAP_USER, IMAP_PASS]):
+        return
+    try:
+        await status_monitor.check()
     except Exception as e:
         logger.error(f"Error al revisar el estado de la impresión: {e}")
-        return "Ocurrió un error al revisar el estado de la impresión."
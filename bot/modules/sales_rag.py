@@ -1,44 +1,40 @@
 # bot/modules/sales_rag.py
 # This module will contain the sales RAG flow for new clients.
 
-import json
+import asyncio
 import logging
 from bot.modules.llm_engine import get_smart_response
+from bot.modules.service_catalog import catalog
 
 logger = logging.getLogger(__name__)
 
 def load_services_data():
-    """Loads the services data from the JSON file."""
-    try:
-        with open("bot/data/services.json", "r", encoding="utf-8") as f:
-            return json.load(f)
-    except FileNotFoundError:
-        logger.error("El archivo services.json no fue encontrado.")
-        return []
-    except json.JSONDecodeError:
-        logger.error("Error al decodificar el archivo services.json.")
-        return []
+    """Returns the services catalogue, re-reading services.json only if it changed."""
+    return catalog.refresh()
 
-def find_relevant_services(user_query, services):
+# Minimum number of services offered; BM25 fills the slots keyword matches leave empty
+MIN_RELEVANT_SERVICES = 3
+
+def find_relevant_services(user_query, limit=None):
     """
-    Finds relevant services based on the user's query.
-    A simple keyword matching approach is used here.
+    Finds the services relevant to the user's query, best first.
+    Every service with a literal keyword match is returned, strongest match
+    first. If there are fewer than MIN_RELEVANT_SERVICES, BM25 over each
+    service's name, description, keywords and work examples fills the
+    remaining slots. `limit` caps the number of results.
     """
-    query = user_query.lower()
-    relevant_services = []
-    for service in services:
-        for keyword in service.get("keywords", []):
-            if keyword in query:
-                relevant_services.append(service)
-                break  # Avoid adding the same service multiple times
-    return relevant_services
+    if limit is None:
+        limit = max(MIN_RELEVANT_SERVICES, len(catalog.match(user_query)))
+    return [service for service, _ in catalog.search(user_query, top_k=limit)]
 
-def generate_sales_pitch(user_query, collected_data):
+async def generate_sales_pitch(user_query, collected_data):
     """
     Generates a personalized sales pitch using the RAG approach.
+    The catalogue lookup (which may have to rebuild the indexes after an edit
+    to services.json) runs in a worker thread and the LLM call is awaited, so
+    other users are served meanwhile.
     """
-    services = load_services_data()
-    relevant_services = find_relevant_services(user_query, services)
+    relevant_services = await asyncio.to_thread(find_relevant_services, user_query)
 
     if not relevant_services:
         logger.warning(f"No se encontraron servicios relevantes para la consulta: '{user_query}'. No se generará respuesta.")
@@ -70,4 +66,5 @@ def generate_sales_pitch(user_query, collected_data):
         "No te limites a listar los servicios; explica *cómo* se aplican a su caso."
     )
 
-    return get_smart_response(prompt)
+    # El mismo cliente repitiendo el embudo (p. ej. tras /reset) recibe la respuesta guardada
+    return await get_smart_response(prompt, use_cache=True)
@@ -0,0 +1,211 @@
+# bot/modules/service_catalog.py
+# Catálogo de servicios (services.json) cargado una vez, recargado cuando cambia
+# el archivo y compilado en un autómata de Aho–Corasick para buscar palabras
+# clave en una sola pasada sobre el texto del cliente.
+
+import asyncio
+import json
+import logging
+import os
+import re
+import threading
+import unicodedata
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+SERVICES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "services.json")
+
+
+# Marcas diacríticas que quedan sueltas tras descomponer (NFKD) una letra acentuada
+_COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+
+
+def fold_text(text):
+    """Normaliza un texto para comparar: sin acentos y sin distinguir mayúsculas."""
+    return _COMBINING_MARKS.sub("", unicodedata.normalize("NFKD", text or "")).casefold()
+
+
+class KeywordMatcher:
+    """
+    Autómata de Aho–Corasick sobre un conjunto de palabras clave.
+
+    `search(text)` recorre el texto una sola vez, sin importar cuántas palabras
+    clave haya, y devuelve los índices de las que aparecen. Una coincidencia
+    debe empezar al inicio de una palabra ("app" encuentra "apps" pero "arte"
+    no encuentra "parte"). Textos y palabras clave se comparan tras `fold_text`.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = [fold_text(keyword).strip() for keyword in keywords]
+        # Cada nodo: transiciones, enlace de fallo y palabras que terminan aquí
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for index, keyword in enumerate(self.keywords):
+            if keyword:
+                self._add(keyword, index)
+        self._build_failure_links()
+
+    def _add(self, keyword, index):
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][char] = next_node
+            node = next_node
+        self._output[node].append(index)
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                # Las palabras del nodo de fallo también terminan en este
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def search(self, text):
+        """Devuelve el conjunto de índices de palabras clave presentes en `text`."""
+        text = fold_text(text)
+        found = set()
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for index in self._output[node]:
+                start = position - len(self.keywords[index]) + 1
+                if start == 0 or not text[start - 1].isalnum():
+                    found.add(index)
+        return found
+
+
+class ServiceCatalog:
+    """
+    Servicios de `services.json` con su índice de palabras clave y su índice BM25.
+
+    El archivo se vuelve a leer solo cuando cambia su fecha de modificación o
+    tamaño; si la nueva versión no es válida se conserva la anterior.
+    """
+
+    def __init__(self, path=SERVICES_FILE):
+        self.path = path
+        # (servicios, autómata, servicio de cada palabra clave, índice BM25); se
+        # reemplaza entero para que una búsqueda nunca mezcle dos versiones del catálogo
+        self._state = ([], KeywordMatcher([]), [], None)
+        # (mtime_ns, tamaño) del archivo cargado; None si no existe, False si aún no se ha leído
+        self._signature = False
+        self._lock = threading.Lock()
+
+    @property
+    def services(self):
+        return self._state[0]
+
+    def _current_signature(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def refresh(self):
+        """Recarga el catálogo si el archivo cambió. Devuelve la lista de servicios."""
+        signature = self._current_signature()
+        if signature == self._signature:
+            return self.services
+        with self._lock:
+            if signature == self._signature:
+                return self.services
+            if signature is None:
+                logger.error("El archivo services.json no fue encontrado.")
+                self._state = ([], KeywordMatcher([]), [], None)
+                self._signature = None
+                return self.services
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    services = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                logger.error(f"Error al leer services.json: {e}")
+                return self.services
+            self._index(services)
+            self._signature = signature
+            logger.info(f"Catálogo de servicios cargado: {len(services)} servicios.")
+        return self.services
+
+    def _index(self, services):
+        # Import local: service_search usa fold_text de este módulo
+        from bot.modules.service_search import BM25Index
+
+        keywords, owners = [], []
+        for position, service in enumerate(services):
+            for keyword in dict.fromkeys(service.get("keywords", [])):
+                keywords.append(keyword)
+                owners.append(position)
+        self._state = (services, KeywordMatcher(keywords), owners, BM25Index(services))
+
+    def match(self, query):
+        """
+        Servicios cuyas palabras clave aparecen en `query`, de mayor a menor
+        coincidencia. Devuelve una lista de tuplas (servicio, puntuación).
+
+        La puntuación suma la longitud de cada palabra clave encontrada, así que
+        varias coincidencias o una frase más específica pesan más. Los empates
+        mantienen el orden del catálogo.
+        """
+        self.refresh()
+        state = self._state
+        return [(state[0][position], score) for position, score in self._keyword_positions(state, query)]
+
+    def search(self, query, top_k=3):
+        """
+        Los `top_k` servicios más relevantes para `query`, como tuplas
+        (servicio, puntuación BM25).
+
+        Los servicios con alguna palabra clave literal van primero (por fuerza
+        de coincidencia); los huecos restantes se completan con la búsqueda
+        BM25 sobre nombre, descripción, palabras clave y ejemplos, que también
+        encuentra servicios descritos con otras palabras.
+        """
+        self.refresh()
+        state = self._state
+        services, index = state[0], state[3]
+        if index is None:
+            return []
+        scores = index.scores(query)
+        ranked = [position for position, _ in self._keyword_positions(state, query)]
+        seen = set(ranked)
+        ranked.extend(position for position, _ in index.best(scores, top_k + len(ranked)) if position not in seen)
+        return [(services[position], float(scores[position])) for position in ranked[:top_k]]
+
+    @staticmethod
+    def _keyword_positions(state, query):
+        _, matcher, owners, _ = state
+        scores = {}
+        for index in matcher.search(query):
+            position = owners[index]
+            scores[position] = scores.get(position, 0) + len(matcher.keywords[index])
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+
+catalog = ServiceCatalog()
+
+
+async def warm_up(context=None):
+    """
+    Tarea para la job queue: carga services.json y construye sus índices en un
+    hilo de trabajo al arrancar, para que la primera consulta no pague ese coste.
+    """
+    try:
+        await asyncio.to_thread(catalog.refresh)
+    except Exception as e:
+        logger.error(f"No se pudo cargar el catálogo de servicios: {e}")
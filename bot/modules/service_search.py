@@ -0,0 +1,140 @@
+# bot/modules/service_search.py
+# Búsqueda local BM25 sobre el catálogo de servicios, sin llamadas de red.
+# El índice es una matriz dispersa guardada por términos (listas de postings en
+# arrays de NumPy); una consulta se puntúa con un solo np.bincount.
+
+import functools
+import re
+
+from bot.modules.service_catalog import fold_text
+
+# Peso de cada campo del servicio: un término del nombre cuenta como tres
+# apariciones en la descripción.
+FIELD_WEIGHTS = {
+    "service_name": 3.0,
+    "keywords": 2.0,
+    "description": 1.0,
+    "work_examples": 1.0,
+}
+
+STEM_LENGTH = 6
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset(fold_text(word) for word in """
+    a al algo como con de del el ella en entre es esta este esto hay la las le lo los mas me mi mis muy
+    necesito no nos o para pero por que quiero se si sin sobre su sus te tengo tu un una unas uno unos y ya yo
+    and for of the to with
+""".split())
+
+
+@functools.lru_cache(maxsize=65536)
+def _term(token):
+    """Lematiza un token ya normalizado; None si es una palabra vacía."""
+    if token in STOPWORDS or len(token) < 2:
+        return None
+    if len(token) > 4 and token.endswith("es"):
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s"):
+        token = token[:-1]
+    return token[:STEM_LENGTH]
+
+
+def tokenize(text):
+    """
+    Convierte un texto en términos: sin acentos ni mayúsculas, sin palabras
+    vacías y con un lematizado ligero (plural fuera y prefijo de STEM_LENGTH
+    letras) para que "diseñar", "diseño" y "diseños" compartan término.
+    """
+    terms = map(_term, _TOKEN.findall(fold_text(text)))
+    return [term for term in terms if term is not None]
+
+
+def service_terms(service):
+    """Términos de un servicio con su frecuencia ponderada por campo."""
+    weighted = {}
+    for field, weight in FIELD_WEIGHTS.items():
+        value = service.get(field) or ""
+        if isinstance(value, list):
+            value = " ".join(value)
+        for term in tokenize(value):
+            weighted[term] = weighted.get(term, 0.0) + weight
+    return weighted
+
+
+class BM25Index:
+    """
+    Índice BM25 sobre una lista de servicios.
+
+    Para cada término se guarda su lista de postings (documentos y peso BM25
+    ya calculado, en formato CSR), así que puntuar una consulta es reunir los
+    postings de sus términos y sumarlos por documento con `np.bincount`.
+    """
+
+    def __init__(self, services, k1=1.2, b=0.75):
+        # NumPy tarda en importarse: solo se carga al construir el índice
+        import numpy as np
+
+        self._np = np
+        self.size = len(services)
+        self.vocabulary = {}
+        documents = [service_terms(service) for service in services]
+
+        term_ids, doc_ids, frequencies = [], [], []
+        for doc_id, terms in enumerate(documents):
+            for term, frequency in terms.items():
+                term_ids.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                doc_ids.append(doc_id)
+                frequencies.append(frequency)
+
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        frequencies = np.asarray(frequencies, dtype=np.float64)
+
+        lengths = np.bincount(doc_ids, weights=frequencies, minlength=self.size)
+        average_length = lengths.mean() if self.size else 0.0
+        document_frequency = np.bincount(term_ids, minlength=len(self.vocabulary))
+        idf = np.log1p((self.size - document_frequency + 0.5) / (document_frequency + 0.5))
+
+        norm = k1 * (1 - b + b * lengths[doc_ids] / average_length) if average_length else k1
+        weights = idf[term_ids] * frequencies * (k1 + 1) / (frequencies + norm)
+
+        # Postings agrupados por término (CSR): los del término t están en [indptr[t], indptr[t + 1])
+        order = np.argsort(term_ids, kind="stable")
+        self._doc_ids = doc_ids[order]
+        self._weights = weights[order]
+        self._indptr = np.concatenate(([0], np.cumsum(document_frequency)))
+
+    def scores(self, query):
+        """Puntuación BM25 de `query` para cada servicio (array de tamaño `size`)."""
+        np = self._np
+        counts = {}
+        for term in tokenize(query):
+            term_id = self.vocabulary.get(term)
+            if term_id is not None:
+                counts[term_id] = counts.get(term_id, 0) + 1
+        if not counts or not self.size:
+            return np.zeros(self.size)
+
+        term_ids = np.fromiter(counts, dtype=np.int64, count=len(counts))
+        repeats = np.fromiter(counts.values(), dtype=np.float64, count=len(counts))
+        starts, ends = self._indptr[term_ids], self._indptr[term_ids + 1]
+        sizes = ends - starts
+        # Posiciones de todos los postings de la consulta, sin bucles de Python
+        positions = np.repeat(ends - np.cumsum(sizes), sizes) + np.arange(sizes.sum())
+        weights = self._weights[positions] * np.repeat(repeats, sizes)
+        return np.bincount(self._doc_ids[positions], weights=weights, minlength=self.size)
+
+    def top_k(self, query, k=3):
+        """Los `k` mejores servicios para `query` como lista de (posición, puntuación) > 0."""
+        return self.best(self.scores(query), k)
+
+    def best(self, scores, k):
+        """Las `k` posiciones con mayor puntuación positiva, de mayor a menor."""
+        np = self._np
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        candidates = np.argpartition(-scores, k - 1)[:k]
+        candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+        return [(int(position), float(scores[position])) for position in candidates if scores[position] > 0]
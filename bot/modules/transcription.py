@@ -1,47 +1,69 @@
 # bot/modules/transcription.py
 # This module handles audio transcription using the Whisper API.
 
+import asyncio
 import logging
-import os
-from openai import OpenAI
-from bot.config import OPENAI_API_KEY
+from bot.config import OPENAI_API_KEY, TRANSCRIPTION_MAX_CONCURRENCY
+from bot.modules.audio_processing import prepare_for_transcription
+from bot.modules.llm_engine import get_client
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Initialize the OpenAI client
 if not OPENAI_API_KEY:
     logger.error("OPENAI_API_KEY is not configured in environment variables.")
-    client = None
-else:
-    client = OpenAI(api_key=OPENAI_API_KEY)
 
-def transcribe_audio(file_path: str) -> str:
+WHISPER_MODEL = "whisper-1"
+
+# Bounds how many voice notes are transcribed at once; other notes wait here
+# without blocking the event loop. The chunks of one note are not limited, so
+# a long note takes about as long as its longest chunk.
+_semaphore = asyncio.Semaphore(TRANSCRIPTION_MAX_CONCURRENCY)
+
+
+async def _upload(client, audio, filename):
+    transcript = await client.audio.transcriptions.create(
+        model=WHISPER_MODEL,
+        file=(filename, audio),
+    )
+    return transcript.text.strip()
+
+
+async def transcribe_audio(audio: bytes, filename: str = "voice.ogg") -> str:
     """
-    Transcribes an audio file using the Whisper API.
+    Transcribes an in-memory audio file using the Whisper API.
+
+    The audio is first shrunk with ffmpeg (mono, 16 kHz Opus, silence trimmed)
+    and long recordings are split on pauses; the chunks are uploaded in
+    parallel through the shared async OpenAI client and their texts joined
+    in order. Without ffmpeg the audio is uploaded as is.
 
     Args:
-        file_path: The path to the audio file to transcribe.
+        audio: The audio file contents.
+        filename: Name sent with an unprocessed upload; Whisper uses its
+            extension to detect the format.
 
     Returns:
         The transcribed text, or an error message if transcription fails.
     """
+    client = get_client()
     if not client:
         return "Error: OpenAI API key is not configured."
 
-    if not os.path.exists(file_path):
-        logger.error(f"Audio file not found at: {file_path}")
-        return "Error: Audio file not found."
+    if not audio:
+        logger.error("Received an empty audio file.")
+        return "Error: Audio file is empty."
 
     try:
-        logger.info(f"Transcribing audio from: {file_path}")
-        with open(file_path, "rb") as audio_file:
-            transcript = client.audio.transcriptions.create(
-                model="whisper-1",
-                file=audio_file
-            )
+        async with _semaphore:
+            chunks = await prepare_for_transcription(audio)
+            # Preprocessed chunks are always Ogg/Opus
+            unchanged = len(chunks) == 1 and chunks[0] is audio
+            names = [filename] if unchanged else [f"chunk{i}.ogg" for i in range(len(chunks))]
+            logger.info(f"Transcribing {sum(map(len, chunks))} bytes of audio in {len(chunks)} chunk(s).")
+            texts = await asyncio.gather(*[_upload(client, chunk, name) for chunk, name in zip(chunks, names)])
         logger.info("Transcription successful.")
-        return transcript.text
+        return " ".join(text for text in texts if text)
     except Exception as e:
         logger.error(f"Error during audio transcription: {e}")
         return "Error: Could not transcribe audio."
@@ -1,8 +1,10 @@
 # app/modules/vikunja.py
 # Este módulo maneja la integración con Vikunja para la gestión de tareas.
 
-import requests
+import asyncio
+import httpx
 import logging
+import time
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import (
     ConversationHandler,
@@ -13,7 +15,16 @@ from telegram.ext import (
     ContextTypes,
 )
 
-from bot.config import VIKUNJA_API_URL, VIKUNJA_API_TOKEN
+from bot.config import (
+    VIKUNJA_API_URL,
+    VIKUNJA_API_TOKEN,
+    VIKUNJA_TIMEOUT,
+    VIKUNJA_MAX_CONNECTIONS,
+    VIKUNJA_MAX_CONCURRENCY,
+    VIKUNJA_PAGE_SIZE,
+    VIKUNJA_CACHE_TTL,
+    VIKUNJA_CACHE_MAX_STALE,
+)
 from bot.modules.identity import is_admin
 
 # Configuración del logger
@@ -22,49 +33,238 @@ logger = logging.getLogger(__name__)
 # Definición de los estados de la conversación para añadir y editar tareas
 SELECTING_ACTION, ADDING_TASK, SELECTING_TASK_TO_EDIT, EDITING_TASK = range(4)
 
-def get_vikunja_headers():
-    """Devuelve los headers necesarios para la API de Vikunja."""
-    return {
-        "Authorization": f"Bearer {VIKUNJA_API_TOKEN}",
-        "Content-Type": "application/json",
-    }
+class VikunjaClient:
+    """
+    Cliente asíncrono de la API de Vikunja.
+
+    Mantiene un único `httpx.AsyncClient` con conexiones keep-alive, aplica un
+    timeout a cada petición, limita las peticiones simultáneas y recorre la
+    paginación de los listados.
+    """
+
+    def __init__(self, base_url, token, timeout=VIKUNJA_TIMEOUT, max_connections=VIKUNJA_MAX_CONNECTIONS,
+                 max_concurrency=VIKUNJA_MAX_CONCURRENCY, page_size=VIKUNJA_PAGE_SIZE):
+        self.base_url = (base_url or "").rstrip("/")
+        self.token = token
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.page_size = page_size
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers={
+                    "Authorization": f"Bearer {self.token}",
+                    "Content-Type": "application/json",
+                },
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+            )
+        return self._client
+
+    async def request(self, method, path, allow_not_modified=False, **kwargs):
+        """
+        Envía una petición y lanza `httpx.HTTPStatusError` si la respuesta es un error.
+        Con `allow_not_modified`, un 304 se devuelve en lugar de lanzarse.
+        """
+        async with self._semaphore:
+            response = await self._get_client().request(method, path, **kwargs)
+        if allow_not_modified and response.status_code == 304:
+            return response
+        response.raise_for_status()
+        return response
+
+    async def get_pages(self, path, params=None, previous=None):
+        """
+        Descarga un listado paginado y devuelve `{página: {"items", "etag", "last_modified"}}`.
+
+        La primera página indica el total; el resto se piden en paralelo. Si se
+        pasa `previous` (el resultado de una llamada anterior), cada página se
+        pide de forma condicional (If-None-Match / If-Modified-Since) y las que
+        responden 304 reutilizan los elementos ya conocidos.
+        """
+        params = dict(params or {})
+        params["per_page"] = self.page_size
+        previous = previous or {}
+
+        first, total_pages = await self._get_page(path, params, 1, previous.get(1))
+        pages = {1: first}
+        if total_pages is None:
+            # Un 304 puede no traer las cabeceras de paginación
+            total_pages = max(previous) if previous else 1
+
+        if total_pages > 1:
+            results = await asyncio.gather(*[
+                self._get_page(path, params, page, previous.get(page))
+                for page in range(2, total_pages + 1)
+            ])
+            for page, (entry, _) in enumerate(results, start=2):
+                pages[page] = entry
+        return pages
+
+    async def _get_page(self, path, params, page, known):
+        headers = {}
+        if known:
+            if known.get("etag"):
+                headers["If-None-Match"] = known["etag"]
+            if known.get("last_modified"):
+                headers["If-Modified-Since"] = known["last_modified"]
+
+        response = await self.request(
+            "GET", path, params={**params, "page": page}, headers=headers, allow_not_modified=bool(known)
+        )
+        try:
+            total_pages = int(response.headers["x-pagination-total-pages"])
+        except (KeyError, ValueError):
+            total_pages = None
+
+        if response.status_code == 304:
+            return known, total_pages
+        if total_pages is None and response.status_code == 200:
+            total_pages = 1
+        entry = {
+            "items": list(response.json() or []),
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+        }
+        return entry, total_pages
+
+    async def aclose(self):
+        """Cierra las conexiones abiertas."""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _flatten_pages(pages):
+    items = []
+    for page in sorted(pages):
+        items.extend(pages[page]["items"])
+    return items
+
+
+client = VikunjaClient(VIKUNJA_API_URL, VIKUNJA_API_TOKEN)
+
+# --- Caché de listados (stale-while-revalidate) ---
+# path -> {"pages", "items", "fetched_at", "refresh"}. Dentro de
+# VIKUNJA_CACHE_TTL se sirve directamente de memoria; hasta
+# VIKUNJA_CACHE_MAX_STALE se sirve la copia vieja mientras se revalida en
+# segundo plano con peticiones condicionales.
+_list_cache = {}
+# path -> tarea de la descarga en curso; las lecturas en frío simultáneas de
+# un mismo listado esperan a la misma tarea en lugar de repetir las peticiones.
+_inflight = {}
+# Se incrementa al invalidar; un refresco iniciado antes no guarda su resultado.
+_cache_generation = 0
 
-def get_projects_list():
+
+def invalidate_cache(prefix=None):
+    """Descarta los listados cacheados (todos, o los que empiezan por `prefix`)."""
+    global _cache_generation
+    _cache_generation += 1
+    for path in list(_list_cache):
+        if prefix is None or path.startswith(prefix):
+            entry = _list_cache.pop(path)
+            refresh = entry.get("refresh")
+            if refresh and not refresh.done():
+                refresh.cancel()
+    for path in list(_inflight):
+        if prefix is None or path.startswith(prefix):
+            # La descarga sigue para quien ya la espera, pero no se comparte con lecturas nuevas
+            del _inflight[path]
+
+
+async def _refresh_list(path):
+    generation = _cache_generation
+    entry = _list_cache.get(path)
+    pages = await client.get_pages(path, previous=entry["pages"] if entry else None)
+    items = _flatten_pages(pages)
+    if generation == _cache_generation:
+        _list_cache[path] = {"pages": pages, "items": items, "fetched_at": time.monotonic(), "refresh": None}
+    return items
+
+
+def _background_refresh(path, entry):
+    async def run():
+        try:
+            await _refresh_list(path)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"No se pudo revalidar {path} en Vikunja: {e}")
+            entry["refresh"] = None
+
+    entry["refresh"] = asyncio.get_running_loop().create_task(run())
+
+
+async def _cached_list(path):
+    """Devuelve un listado de Vikunja desde la caché, revalidándolo si hace falta."""
+    entry = _list_cache.get(path)
+    if entry:
+        age = time.monotonic() - entry["fetched_at"]
+        if age < VIKUNJA_CACHE_TTL:
+            return entry["items"]
+        if age < VIKUNJA_CACHE_MAX_STALE:
+            if not entry.get("refresh"):
+                _background_refresh(path, entry)
+            return entry["items"]
+    return await _shared_refresh(path)
+
+
+async def _shared_refresh(path):
+    task = _inflight.get(path)
+    if task is None:
+        task = asyncio.get_running_loop().create_task(_refresh_list(path))
+        _inflight[path] = task
+
+        def forget(done):
+            if _inflight.get(path) is done:
+                del _inflight[path]
+
+        task.add_done_callback(forget)
+    return await asyncio.shield(task)
+
+
+async def close_client():
+    """Cierra el cliente compartido de Vikunja (al apagar el bot)."""
+    await client.aclose()
+
+async def get_projects_list():
     """Returns a list of projects from Vikunja."""
     if not VIKUNJA_API_TOKEN:
         return []
     try:
-        response = requests.get(f"{VIKUNJA_API_URL}/projects", headers=get_vikunja_headers())
-        response.raise_for_status()
-        return response.json()
+        return await _cached_list("/projects")
     except Exception as e:
         logger.error(f"Error fetching projects: {e}")
         return []
 
-def get_tasks_list(project_id=1):
+async def get_tasks_list(project_id=1):
     """Returns a list of tasks for a project."""
     if not VIKUNJA_API_TOKEN:
         return []
     try:
-        response = requests.get(f"{VIKUNJA_API_URL}/projects/{project_id}/tasks", headers=get_vikunja_headers())
-        response.raise_for_status()
-        return response.json()
+        return await _cached_list(f"/projects/{project_id}/tasks")
     except Exception as e:
         logger.error(f"Error fetching tasks: {e}")
         return []
 
-def get_tasks():
+async def get_tasks():
     """
     Obtiene y formatea la lista de tareas de Vikunja.
-    Esta función es síncrona y devuelve un string.
+    Devuelve un string.
     """
     if not VIKUNJA_API_TOKEN:
         return "Error: VIKUNJA_API_TOKEN no configurado."
 
     try:
-        response = requests.get(f"{VIKUNJA_API_URL}/projects/1/tasks", headers=get_vikunja_headers())
-        response.raise_for_status()
-        tasks = response.json()
+        tasks = await _cached_list("/projects/1/tasks")
 
         if not tasks:
             return "No tienes tareas pendientes en Vikunja."
@@ -90,7 +290,7 @@ async def vikunja_menu(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
-    tasks_list = get_tasks()
+    tasks_list = await get_tasks()
     await query.edit_message_text(text=f"{tasks_list}\n\nSelecciona una acción:", reply_markup=reply_markup, parse_mode='Markdown')
     return SELECTING_ACTION
 
@@ -106,8 +306,8 @@ async def add_task(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     task_title = update.message.text
     try:
         data = {"title": task_title, "project_id": 1}
-        response = requests.post(f"{VIKUNJA_API_URL}/tasks", headers=get_vikunja_headers(), json=data)
-        response.raise_for_status()
+        await client.request("POST", "/tasks", json=data)
+        invalidate_cache("/projects/")
         await update.message.reply_text(f"✅ Tarea añadida: *{task_title}*", parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error al añadir tarea a Vikunja: {e}")
@@ -121,9 +321,7 @@ async def select_task_to_edit(update: Update, context: ContextTypes.DEFAULT_TYPE
     await query.answer()
 
     try:
-        response = requests.get(f"{VIKUNJA_API_URL}/projects/1/tasks", headers=get_vikunja_headers())
-        response.raise_for_status()
-        tasks = [task for task in response.json() if not task.get('done')]
+        tasks = [task for task in await _cached_list("/projects/1/tasks") if not task.get('done')]
 
         if not tasks:
             await query.edit_message_text("No hay tareas pendientes para editar.")
@@ -167,8 +365,8 @@ async def edit_task(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
     try:
         data = {"title": new_title}
-        response = requests.put(f"{VIKUNJA_API_URL}/tasks/{task_id}", headers=get_vikunja_headers(), json=data)
-        response.raise_for_status()
+        await client.request("PUT", f"/tasks/{task_id}", json=data)
+        invalidate_cache("/projects/")
         await update.message.reply_text(f"✅ Tarea `{task_id}` actualizada a *{new_title}*", parse_mode='Markdown')
     except Exception as e:
         logger.error(f"Error al editar la tarea {task_id}: {e}")
@@ -0,0 +1,197 @@
+# bot/profiling.py
+# Perfil de arranque del bot: cuánto tarda cada import y cada paso de main()
+# antes de llegar a `Application.run_polling`.
+#
+# Uso:
+#   python -m bot.profiling                           # imprime el informe JSON
+#   python -m bot.profiling --output startup.json     # lo guarda en un archivo
+#   python -m bot.profiling --baseline startup.json   # compara con una versión anterior
+#
+# Con --baseline el proceso termina con código 1 si alguna métrica empeora más
+# del umbral, para poder usarlo en CI entre releases.
+
+import argparse
+import json
+import logging
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 1
+
+# Dependencias pesadas que vigilamos aunque hoy no estén en el camino de arranque
+THIRD_PARTY_MODULES = ("telegram", "telegram.ext", "httpx", "pytz", "googleapiclient", "openai")
+
+# Formato de cada línea de `python -X importtime`: "import time: self | cumulative | módulo"
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+
+def parse_importtime(output):
+    """
+    Convierte la salida de `-X importtime` en {módulo: ms acumulados}.
+    Solo se guarda la primera vez que aparece cada módulo (el import real).
+    """
+    timings = {}
+    for line in output.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match and match.group(4) not in timings:
+            timings[match.group(4)] = int(match.group(2)) / 1000
+    return timings
+
+
+def measure_imports(target="bot.main", extra_modules=THIRD_PARTY_MODULES):
+    """
+    Importa `target` en un intérprete nuevo (arranque en frío) y devuelve el
+    tiempo acumulado de cada módulo `bot.*` y de las dependencias vigiladas.
+
+    Las dependencias que `target` no carga se importan después en el mismo
+    proceso, para saber cuánto costarían si volvieran al camino de arranque;
+    esas van en "deferred".
+    """
+    code = f"import {target}\n" + "".join(f"import {module}\n" for module in extra_modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {target}:\n{result.stderr[-2000:]}")
+
+    # Todo lo que aparece antes de que termine `target` está en el camino de arranque
+    lines = result.stderr.splitlines()
+    end = next(i for i, line in enumerate(lines) if line.rstrip().endswith(f"| {target}"))
+    startup = parse_importtime("\n".join(lines[:end + 1]))
+    later = parse_importtime("\n".join(lines[end + 1:]))
+
+    imports = {name: ms for name, ms in startup.items() if name == "bot" or name.startswith("bot.")}
+    imports.update({name: startup[name] for name in extra_modules if name in startup})
+    deferred = {name: later[name] for name in extra_modules if name not in startup and name in later}
+    return imports, deferred
+
+
+@contextmanager
+def _timed(steps, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        steps[name] = (time.perf_counter() - started) * 1000
+
+
+def measure_startup_steps():
+    """
+    Ejecuta los pasos de `main()` previos a `run_polling` y mide cada uno.
+    La base de datos y la caché de flujos se crean en un directorio temporal
+    para no tocar las reales (FlowEngine se mide, por tanto, sin caché previa).
+    """
+    from telegram.ext import Application
+    from bot import db
+    from bot.modules.flow_engine import FlowEngine
+    from bot.scheduler import schedule_daily_summary
+
+    steps = {}
+    database_file = db.DATABASE_FILE
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db.DATABASE_FILE = os.path.join(tmp_dir, "users.db")
+        try:
+            with _timed(steps, "setup_database"):
+                db.setup_database()
+            with _timed(steps, "build_application"):
+                # Token de relleno: construir la aplicación no hace peticiones a Telegram
+                application = Application.builder().token("0:profiling").build()
+            with _timed(steps, "FlowEngine"):
+                FlowEngine(flow_cache_file=os.path.join(tmp_dir, ".flows_cache.pickle"))
+            with _timed(steps, "schedule_daily_summary"):
+                schedule_daily_summary(application)
+        finally:
+            db.shutdown_pool()
+            db.DATABASE_FILE = database_file
+    return steps
+
+
+def build_report(repeat=3):
+    """Genera el informe; cada import se mide `repeat` veces y se toma la mediana."""
+    runs = [measure_imports() for _ in range(max(1, repeat))]
+    imports = {name: statistics.median(run[0].get(name, 0.0) for run in runs) for name in runs[0][0]}
+    deferred = {name: statistics.median(run[1].get(name, 0.0) for run in runs) for name in runs[0][1]}
+    steps = measure_startup_steps()
+    return {
+        "version": REPORT_VERSION,
+        "python": platform.python_version(),
+        "imports_ms": {name: round(ms, 2) for name, ms in sorted(imports.items(), key=lambda item: -item[1])},
+        "deferred_imports_ms": {name: round(ms, 2) for name, ms in deferred.items()},
+        "steps_ms": {name: round(ms, 2) for name, ms in steps.items()},
+        "total_ms": round(imports.get("bot.main", 0.0) + sum(steps.values()), 2),
+    }
+
+
+def find_regressions(report, baseline, threshold=0.2, min_delta_ms=5.0):
+    """
+    Compara un informe con otro anterior. Una métrica empeora si supera la del
+    baseline en más de `threshold` (relativo) y en más de `min_delta_ms`, para
+    que el ruido de los imports pequeños no dispare falsos positivos.
+
+    Devuelve una lista de (métrica, ms_baseline, ms_actual).
+    """
+    def flatten(data):
+        metrics = {"total": data.get("total_ms", 0.0)}
+        for section in ("imports_ms", "steps_ms"):
+            for name, value in data.get(section, {}).items():
+                metrics[f"{section[:-3]}.{name}"] = value
+        return metrics
+
+    current, previous = flatten(report), flatten(baseline)
+    regressions = []
+    for name, value in current.items():
+        # Un import nuevo en el arranque se compara contra 0
+        before = previous.get(name, 0.0)
+        if value - before > min_delta_ms and value > before * (1 + threshold):
+            regressions.append((name, before, value))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Perfil de arranque de bot.main")
+    parser.add_argument("--output", help="Archivo donde guardar el informe JSON (por defecto, stdout).")
+    parser.add_argument("--baseline", help="Informe anterior con el que comparar.")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Empeoramiento relativo permitido por métrica (0.2 = 20%%).")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0,
+                        help="Diferencia mínima en ms para considerar una regresión.")
+    parser.add_argument("--repeat", type=int, default=3, help="Veces que se mide cada import.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(format="%(levelname)s - %(message)s", level=logging.WARNING)
+    report = build_report(repeat=args.repeat)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = find_regressions(report, json.load(f), args.threshold, args.min_delta_ms)
+        report["regressions"] = [
+            {"metric": name, "baseline_ms": round(before, 2), "current_ms": round(value, 2)}
+            for name, before, value in regressions
+        ]
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    for name, before, value in regressions:
+        logger.warning(f"Regresión en {name}: {before:.1f} ms -> {value:.1f} ms")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
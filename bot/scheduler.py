@@ -1,76 +1,245 @@
 # app/scheduler.py
 # Este script se encarga de programar tareas automáticas, como el resumen diario.
+#
+# Quién recibe el resumen y a qué hora se guarda en la tabla
+# `summary_subscriptions`: cada suscripción es para un chat concreto o para
+# todos los usuarios de un rol. Un job revisa cada minuto qué suscripciones
+# tocan, calcula la agenda una sola vez y la envía a todos los destinatarios
+# con el limitador de ritmo de bot.modules.broadcast.
+#
+# La agenda es el calendario privado del dueño, así que solo la reciben
+# administradores y miembros del equipo; los administradores gestionan las
+# suscripciones con el comando /subscriptions.
 
-# app/scheduler.py
-# Este script se encarga de programar tareas automáticas, como el resumen diario.
-
+import datetime
 import logging
-from datetime import time
-from telegram.ext import ContextTypes
+import re
+import time
+
 import pytz
+from telegram.ext import ContextTypes
 
+from bot import db
 from bot.config import ADMIN_ID, TIMEZONE, DAILY_SUMMARY_TIME
 from bot.modules.agenda import get_agenda
+from bot.modules.broadcast import send_many
+from bot.modules.identity import get_user_role
 
 # Configuramos el registro de eventos (logging) para ver qué pasa en la consola
 logger = logging.getLogger(__name__)
 
-async def send_daily_summary(context: ContextTypes.DEFAULT_TYPE) -> None:
+# Roles que pueden recibir la agenda
+ROLES = ("admin", "crew")
+
+SELECT_DUE_SQL = """
+    SELECT id, chat_id, role FROM summary_subscriptions
+    WHERE send_time <= ? AND (last_sent_on IS NULL OR last_sent_on < ?)
+"""
+MARK_SENT_SQL = "UPDATE summary_subscriptions SET last_sent_on = ? WHERE id = ?"
+INSERT_SUBSCRIPTION_SQL = """
+    INSERT OR IGNORE INTO summary_subscriptions (chat_id, role, send_time, last_sent_on, source, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+# Borra la suscripción creada desde la configuración si ya no es la vigente
+DELETE_STALE_CONFIG_SQL = """
+    DELETE FROM summary_subscriptions
+    WHERE source = 'config' AND NOT (chat_id IS ? AND send_time IS ?)
+"""
+
+_TIME = re.compile(r"^(\d{1,2}):(\d{2})$")
+
+
+def parse_send_time(value):
+    """Normaliza una hora "H:MM" a "HH:MM". Lanza ValueError si no es válida."""
+    match = _TIME.match((value or "").strip())
+    if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+        raise ValueError(f"Hora inválida: {value!r}")
+    return f"{int(match.group(1)):02d}:{match.group(2)}"
+
+
+def _now():
+    return datetime.datetime.now(pytz.timezone(TIMEZONE))
+
+
+async def add_subscription(send_time, chat_id=None, role=None, source="manual"):
     """
-    Función que envía el resumen diario al dueño del bot.
-    Se ejecuta automáticamente según lo programado.
+    Suscribe un chat, o a todos los usuarios de un rol, al resumen diario a la
+    hora `send_time` ("HH:MM", en TIMEZONE). Si esa hora ya pasó hoy, el primer
+    resumen llega mañana. `source` es "config" solo para la suscripción que
+    mantiene `ensure_owner_subscription`.
     """
-    job = context.job
-    chat_id = job.chat_id
+    if (chat_id is None) == (role is None):
+        raise ValueError("Indica un chat_id o un rol, no ambos.")
+    if role is not None and role not in ROLES:
+        raise ValueError(f"El resumen solo se envía a los roles {', '.join(ROLES)}, no a {role!r}.")
+    send_time = parse_send_time(send_time)
+    now = _now()
+    last_sent_on = now.date().isoformat() if send_time <= now.strftime("%H:%M") else None
+    await db.write(INSERT_SUBSCRIPTION_SQL, (chat_id, role, send_time, last_sent_on, source, time.time()))
 
-    logger.info(f"Ejecutando tarea de resumen diario para el chat_id: {chat_id}")
 
-    try:
-        # Obtenemos la agenda del día
-        agenda_text = get_agenda()
-        # Preparamos el mensaje
-        summary_text = f"🔔 *Resumen Diario - Buen día, Marco!*\n\n{agenda_text}"
-
-        # Enviamos el mensaje por Telegram
-        await context.bot.send_message(
-            chat_id=chat_id,
-            text=summary_text,
-            parse_mode='Markdown'
-        )
-        logger.info(f"Resumen diario enviado con éxito a {chat_id}")
-    except Exception as e:
-        # Si hay un error, lo registramos
-        logger.error(f"Error al enviar el resumen diario a {chat_id}: {e}")
+async def remove_subscription(subscription_id):
+    """Borra una suscripción. Devuelve True si existía."""
+    return await db.execute("DELETE FROM summary_subscriptions WHERE id = ?", (subscription_id,)) > 0
 
-def schedule_daily_summary(application) -> None:
+
+async def list_subscriptions():
+    """Todas las suscripciones, ordenadas por hora."""
+    return await db.fetch_all(
+        "SELECT id, chat_id, role, send_time, last_sent_on, source FROM summary_subscriptions ORDER BY send_time, id"
+    )
+
+
+async def ensure_owner_subscription():
     """
-    Programa la tarea del resumen diario para que ocurra todos los días.
+    Mantiene el resumen del dueño del bot (ADMIN_ID) a la hora
+    DAILY_SUMMARY_TIME. Solo toca la suscripción creada desde la configuración:
+    las que el dueño añadió con /subscriptions se conservan.
     """
-    # Si no hay un ID de dueño configurado, no programamos nada
     if not ADMIN_ID:
-        logger.warning("ADMIN_ID no configurado. No se programará el resumen diario.")
+        await db.execute(DELETE_STALE_CONFIG_SQL, (None, None))
         return
+    try:
+        send_time = parse_send_time(DAILY_SUMMARY_TIME)
+    except ValueError:
+        logger.error(f"Formato de DAILY_SUMMARY_TIME inválido: {DAILY_SUMMARY_TIME}. Usando 07:00 por defecto.")
+        send_time = "07:00"
+    try:
+        owner_id = int(ADMIN_ID)
+    except ValueError:
+        logger.warning("ADMIN_ID no es un número válido. No se programará su resumen diario.")
+        await db.execute(DELETE_STALE_CONFIG_SQL, (None, None))
+        return
+    # Si cambió DAILY_SUMMARY_TIME (o ADMIN_ID), la suscripción anterior deja de aplicar
+    await db.execute(DELETE_STALE_CONFIG_SQL, (owner_id, send_time))
+    # Si el dueño ya tiene una suscripción manual a esa hora, no se duplica
+    await add_subscription(send_time, chat_id=owner_id, source="config")
 
-    job_queue = application.job_queue
 
-    # Configuramos la zona horaria (ej. America/Mexico_City)
-    tz = pytz.timezone(TIMEZONE)
+def _owner_id():
+    """ADMIN_ID como entero, o None si no está configurado o no es válido."""
+    return int(ADMIN_ID) if ADMIN_ID and str(ADMIN_ID).lstrip("-").isdigit() else None
 
-    # Obtenemos la hora y minutos desde la configuración (ej. "07:00")
+
+async def resolve_recipients(subscriptions):
+    """
+    Convierte suscripciones en destinatarios: un dict chat_id -> nombre (o
+    None). Un chat suscrito por varias vías recibe un solo mensaje. Los chats
+    que no son del dueño, de un administrador o del equipo se omiten, aunque
+    tengan una suscripción propia (p. ej. si su rol cambió después).
+    """
+    recipients = {}
+    owner_id = _owner_id()
+    roles = sorted({sub["role"] for sub in subscriptions if sub["role"] in ROLES})
+    chat_ids = sorted({sub["chat_id"] for sub in subscriptions if sub["chat_id"] is not None})
+    if roles:
+        placeholders = ", ".join("?" for _ in roles)
+        rows = await db.fetch_all(f"SELECT telegram_id, name FROM users WHERE role IN ({placeholders})", roles)
+        recipients.update((row["telegram_id"], row["name"]) for row in rows)
+        # El dueño es administrador aunque no esté en la tabla users
+        if "admin" in roles and owner_id is not None:
+            recipients.setdefault(owner_id, None)
+    if chat_ids:
+        placeholders = ", ".join("?" for _ in chat_ids)
+        rows = await db.fetch_all(
+            f"SELECT telegram_id, name, role FROM users WHERE telegram_id IN ({placeholders})", chat_ids
+        )
+        users = {row["telegram_id"]: row for row in rows}
+        for chat_id in chat_ids:
+            user = users.get(chat_id)
+            if chat_id == owner_id or (user is not None and user["role"] in ROLES):
+                recipients[chat_id] = user["name"] if user is not None else None
+            else:
+                logger.warning(f"El chat {chat_id} no es del equipo; no se le envía el resumen diario.")
+    return recipients
+
+
+def format_summary(agenda_text, name=None):
+    """Mensaje del resumen diario para un destinatario."""
+    greeting = f"Buen día, {name}!" if name else "Buen día!"
+    return f"🔔 *Resumen Diario - {greeting}*\n\n{agenda_text}"
+
+
+async def send_daily_summary(context: ContextTypes.DEFAULT_TYPE) -> None:
+    """
+    Envía el resumen diario a las suscripciones cuya hora ya llegó y que aún no
+    lo recibieron hoy. Se ejecuta automáticamente cada minuto.
+    """
+    now = _now()
+    today = now.date().isoformat()
     try:
-        hour, minute = map(int, DAILY_SUMMARY_TIME.split(':'))
-    except ValueError:
-        logger.error(f"Formato de DAILY_SUMMARY_TIME inválido: {DAILY_SUMMARY_TIME}. Usando 07:00 por defecto.")
-        hour, minute = 7, 0
+        subscriptions = await db.fetch_all(SELECT_DUE_SQL, (now.strftime("%H:%M"), today))
+        if not subscriptions:
+            return
 
-    # Programamos la tarea para que corra todos los días a la hora configurada
-    scheduled_time = time(hour=hour, minute=minute, tzinfo=tz)
+        recipients = await resolve_recipients(subscriptions)
+        logger.info(f"Ejecutando tarea de resumen diario para {len(recipients)} destinatarios.")
 
-    job_queue.run_daily(
-        send_daily_summary,
-        time=scheduled_time,
-        chat_id=int(ADMIN_ID),
-        name="daily_summary"
-    )
+        # La agenda es la misma para todos: se calcula una vez por ronda
+        agenda_text = await get_agenda() if recipients else ""
+        messages = [(chat_id, format_summary(agenda_text, name)) for chat_id, name in recipients.items()]
+        sent = await send_many(context.bot, messages, parse_mode='Markdown')
 
-    logger.info(f"Resumen diario programado para {ADMIN_ID} a las {scheduled_time} ({TIMEZONE})")
+        # Se marcan aunque algún envío fallara, para no repetir el resumen a los demás
+        await db.execute_many(MARK_SENT_SQL, [(today, sub["id"]) for sub in subscriptions])
+        logger.info(f"Resumen diario enviado con éxito a {sent} de {len(messages)} destinatarios.")
+    except Exception as e:
+        # Si hay un error, lo registramos
+        logger.error(f"Error al enviar el resumen diario: {e}")
+
+
+def _describe(subscription):
+    target = f"rol {subscription['role']}" if subscription["role"] else f"chat {subscription['chat_id']}"
+    note = "  (DAILY_SUMMARY_TIME)" if subscription["source"] == "config" else ""
+    return f"#{subscription['id']}  {subscription['send_time']}  →  {target}{note}"
+
+
+SUBSCRIPTIONS_USAGE = (
+    "Uso:\n"
+    "/subscriptions — lista las suscripciones\n"
+    "/subscriptions add HH:MM <chat_id | admin | crew>\n"
+    "/subscriptions remove <id>"
+)
+
+
+async def manage_subscriptions(args):
+    """
+    Atiende el comando /subscriptions (solo para administradores) con sus
+    argumentos ya separados. Devuelve el texto de la respuesta.
+    """
+    if not args:
+        subscriptions = await list_subscriptions()
+        if not subscriptions:
+            return "No hay suscripciones al resumen diario.\n\n" + SUBSCRIPTIONS_USAGE
+        return "🔔 Suscripciones al resumen diario:\n" + "\n".join(_describe(sub) for sub in subscriptions)
+
+    action = args[0].lower()
+    if action == "add" and len(args) == 3:
+        send_time, target = args[1], args[2].lower()
+        try:
+            if target.lstrip("-").isdigit():
+                chat_id = int(target)
+                if chat_id != _owner_id() and await get_user_role(chat_id) not in ROLES:
+                    return f"El chat {chat_id} no es del equipo: la agenda es privada."
+                await add_subscription(send_time, chat_id=chat_id)
+            else:
+                await add_subscription(send_time, role=target)
+        except ValueError as e:
+            return str(e)
+        return f"✅ Resumen diario programado a las {parse_send_time(send_time)} para {target}."
+    if action == "remove" and len(args) == 2 and args[1].lstrip("#").isdigit():
+        if await remove_subscription(int(args[1].lstrip("#"))):
+            return "🗑️ Suscripción eliminada."
+        return f"No existe la suscripción {args[1]}."
+    return SUBSCRIPTIONS_USAGE
+
+
+def schedule_daily_summary(application) -> None:
+    """
+    Programa la revisión de los resúmenes diarios, una vez por minuto al
+    inicio de cada minuto.
+    """
+    job_queue = application.job_queue
+    first = 60 - datetime.datetime.now().second
+    job_queue.run_repeating(send_daily_summary, interval=60, first=first, name="daily_summary")
+    logger.info(f"Resúmenes diarios programados según las suscripciones ({TIMEZONE}).")
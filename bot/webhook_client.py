@@ -1,33 +1,263 @@
 # app/webhook_client.py
 # Este script se encarga de enviar datos a servicios externos usando "webhooks".
 # En este caso, se comunica con n8n.
+#
+# Los eventos no se envían en el momento: `send_webhook()` solo los guarda en la
+# tabla `webhook_outbox` (un INSERT local, agrupado con otras escrituras por el
+# BatchWriter de bot.db) y un despachador en segundo plano los entrega. Así un
+# evento no se pierde si n8n está caído ni el bot espera a la red.
+#
+# Por defecto cada evento va en su propia petición. Si WEBHOOK_BATCH_SIZE > 1,
+# el despachador agrupa los eventos pendientes por endpoint y los envía como un
+# arreglo JSON en una sola petición. El nodo Webhook de n8n NO separa ese
+# arreglo en items: recibe un único item con el arreglo completo en `body`, así
+# que el flujo necesita un nodo "Split Out" sobre `body` antes de activar los
+# lotes. Los envíos fallidos se reintentan con espera exponencial y jitter
+# hasta WEBHOOK_MAX_ATTEMPTS veces.
 
-import requests
-from bot.config import N8N_WEBHOOK_URL, N8N_TEST_WEBHOOK_URL
+import asyncio
+import json
+import logging
+import random
+import time
 
-def send_webhook(event_data):
+import httpx
+
+from bot import db
+from bot.config import (
+    N8N_WEBHOOK_URL,
+    N8N_TEST_WEBHOOK_URL,
+    WEBHOOK_BATCH_SIZE,
+    WEBHOOK_MAX_CONCURRENCY,
+    WEBHOOK_MAX_ATTEMPTS,
+    WEBHOOK_RETRY_BASE_DELAY,
+    WEBHOOK_RETRY_MAX_DELAY,
+    WEBHOOK_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+DEAD = "dead"
+
+INSERT_EVENT_SQL = """
+    INSERT INTO webhook_outbox (endpoint, payload, status, attempts, next_attempt_at, created_at)
+    VALUES (?, ?, 'pending', 0, ?, ?)
+"""
+SELECT_DUE_SQL = """
+    SELECT id, endpoint, payload, attempts FROM webhook_outbox
+    WHERE status = 'pending' AND next_attempt_at <= ?
+    ORDER BY id LIMIT ?
+"""
+SELECT_NEXT_DUE_SQL = "SELECT MIN(next_attempt_at) AS next_at FROM webhook_outbox WHERE status = 'pending'"
+DELETE_EVENT_SQL = "DELETE FROM webhook_outbox WHERE id = ?"
+RETRY_EVENT_SQL = """
+    UPDATE webhook_outbox SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?
+    WHERE id = ?
+"""
+
+# Respuestas que indican un problema pasajero; cualquier otro 4xx no se reintenta
+_RETRYABLE_STATUS = {408, 425, 429}
+
+# Tiempo máximo que el despachador duerme sin revisar la tabla
+_IDLE_POLL_SECONDS = 30
+
+
+def default_endpoint():
+    """El webhook de producción, o el de test si es el único configurado."""
+    return N8N_WEBHOOK_URL or N8N_TEST_WEBHOOK_URL
+
+
+def retry_delay(attempts, base=WEBHOOK_RETRY_BASE_DELAY, cap=WEBHOOK_RETRY_MAX_DELAY):
     """
-    Envía datos de un evento al servicio n8n.
-    Usa el webhook normal y, si falla o no existe, usa el de test como fallback.
+    Segundos de espera antes del siguiente intento: espera exponencial con
+    jitter completo (un valor al azar entre 0 y base * 2^(intentos - 1), con tope `cap`),
+    para que los eventos que fallaron juntos no se reintenten todos a la vez.
     """
-    # Intentar con el webhook principal
-    if N8N_WEBHOOK_URL:
+    return random.uniform(0, min(cap, base * 2 ** max(0, attempts - 1)))
+
+
+class WebhookDispatcher:
+    """
+    Entrega en segundo plano los eventos de `webhook_outbox`.
+
+    En cada ronda toma los eventos vencidos, los agrupa por endpoint en lotes
+    de hasta `batch_size` y envía los lotes en paralelo, como mucho
+    `max_concurrency` a la vez, por un cliente HTTP con conexiones reutilizables.
+    Un lote entregado se borra de la tabla; uno fallido se reprograma, o se
+    marca como 'dead' tras `max_attempts` intentos o ante un error permanente.
+    """
+
+    def __init__(self, batch_size=WEBHOOK_BATCH_SIZE, max_concurrency=WEBHOOK_MAX_CONCURRENCY,
+                 max_attempts=WEBHOOK_MAX_ATTEMPTS, timeout=WEBHOOK_TIMEOUT, transport=None):
+        self.batch_size = max(1, batch_size)
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_attempts = max(1, max_attempts)
+        self.timeout = timeout
+        self._transport = transport
+        self._client = None
+        self._task = None
+        self._wakeup = None
+        self.delivered = 0
+
+    def _get_client(self):
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self._transport,
+            )
+        return self._client
+
+    def start(self):
+        """Arranca el worker del despachador en el bucle de eventos actual."""
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def wake(self):
+        """Avisa al worker de que hay eventos nuevos."""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.deliver_due()
+            except Exception as e:
+                logger.error(f"Error al despachar webhooks: {e}")
+                delivered = 0
+            if delivered:
+                # Puede haber más eventos vencidos que los de una ronda
+                continue
+            await self._sleep_until_next_due()
+
+    async def _sleep_until_next_due(self):
+        timeout = _IDLE_POLL_SECONDS
         try:
-            print(f"Intentando enviar a webhook principal: {N8N_WEBHOOK_URL}")
-            response = requests.post(N8N_WEBHOOK_URL, json=event_data)
-            response.raise_for_status()
-            return response.json()
+            row = await db.fetch_one(SELECT_NEXT_DUE_SQL)
+            if row is not None and row["next_at"] is not None:
+                timeout = min(timeout, max(0.0, row["next_at"] - time.time()))
         except Exception as e:
-            print(f"Fallo en webhook principal: {e}")
+            logger.error(f"Error al leer la cola de webhooks: {e}")
+        self._wakeup.clear()
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def deliver_due(self):
+        """
+        Hace una ronda de entregas con los eventos vencidos. Devuelve cuántos
+        eventos se procesaron (entregados o reprogramados).
+        """
+        rows = await db.fetch_all(SELECT_DUE_SQL, (time.time(), self.batch_size * self.max_concurrency))
+        if not rows:
+            return 0
+
+        batches = []
+        by_endpoint = {}
+        for row in rows:
+            by_endpoint.setdefault(row["endpoint"], []).append(row)
+        for endpoint, events in by_endpoint.items():
+            for start in range(0, len(events), self.batch_size):
+                batches.append((endpoint, events[start:start + self.batch_size]))
 
-    # Fallback al webhook de test
-    if N8N_TEST_WEBHOOK_URL:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def deliver(endpoint, events):
+            async with semaphore:
+                await self._deliver(endpoint, events)
+
+        await asyncio.gather(*[deliver(endpoint, events) for endpoint, events in batches])
+        return len(rows)
+
+    async def _deliver(self, endpoint, events):
+        payloads = [json.loads(event["payload"]) for event in events]
+        body = payloads if self.batch_size > 1 else payloads[0]
+        retry_after = None
         try:
-            print(f"Intentando enviar a webhook de fallback (test): {N8N_TEST_WEBHOOK_URL}")
-            response = requests.post(N8N_TEST_WEBHOOK_URL, json=event_data)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            print(f"Fallo en webhook de fallback: {e}")
+            response = await self._get_client().post(endpoint, json=body)
+            if response.is_success:
+                await db.execute_many(DELETE_EVENT_SQL, [(event["id"],) for event in events])
+                self.delivered += len(events)
+                logger.info(f"{len(events)} eventos entregados al webhook {endpoint}.")
+                return
+            if response.is_redirect:
+                # No se siguen redirecciones: un 301/302 convertiría el POST en un GET sin
+                # el evento. La URL configurada está mal y reintentar no lo arregla.
+                error = f"HTTP {response.status_code}: la URL redirige a {response.headers.get('Location')}"
+                permanent = True
+            else:
+                error = f"HTTP {response.status_code}"
+                permanent = response.status_code < 500 and response.status_code not in _RETRYABLE_STATUS
+                retry_after = _parse_retry_after(response.headers.get("Retry-After"))
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+            permanent = False
+        await self._reschedule(endpoint, events, error, permanent, retry_after)
 
-    return None
+    async def _reschedule(self, endpoint, events, error, permanent, retry_after):
+        now = time.time()
+        updates = []
+        dead = 0
+        for event in events:
+            attempts = event["attempts"] + 1
+            if permanent or attempts >= self.max_attempts:
+                updates.append((DEAD, attempts, now, error, event["id"]))
+                dead += 1
+            else:
+                delay = max(retry_delay(attempts), retry_after or 0)
+                updates.append((PENDING, attempts, now + delay, error, event["id"]))
+        await db.execute_many(RETRY_EVENT_SQL, updates)
+        if dead:
+            logger.error(f"{dead} eventos descartados para el webhook {endpoint}: {error}")
+        if len(events) > dead:
+            logger.warning(f"Fallo al enviar {len(events) - dead} eventos al webhook {endpoint} ({error}); se reintentará.")
+
+    async def close(self, timeout=10):
+        """Intenta una última ronda de entregas (hasta `timeout` segundos) y detiene el worker."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            try:
+                await asyncio.wait_for(self.deliver_due(), timeout)
+            except Exception as e:
+                logger.warning(f"Webhooks pendientes al apagar; se enviarán en el próximo arranque: {e}")
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+def _parse_retry_after(value):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+dispatcher = WebhookDispatcher()
+
+
+async def send_webhook(event_data, endpoint=None):
+    """
+    Guarda un evento para enviarlo a n8n en segundo plano. Devuelve en cuanto
+    el evento está en la base de datos; la entrega la hace el despachador.
+    Devuelve False si no hay ningún webhook configurado.
+    """
+    endpoint = endpoint or default_endpoint()
+    if not endpoint:
+        logger.warning("No hay ningún webhook de n8n configurado; evento descartado.")
+        return False
+    now = time.time()
+    await db.write(INSERT_EVENT_SQL, (endpoint, json.dumps(event_data, ensure_ascii=False), now, now))
+    dispatcher.wake()
+    return True
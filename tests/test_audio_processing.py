@@ -0,0 +1,127 @@
+import asyncio
+import io
+import math
+import shutil
+import struct
+import unittest
+import wave
+from unittest.mock import patch
+import os
+import sys
+
+import ffmpeg
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import audio_processing
+
+SILENCEDETECT_STDERR = """Input #0, ogg, from 'pipe:0':
+[silencedetect @ 0x1] silence_start: -0.01
+[silencedetect @ 0x1] silence_end: 0.52 | silence_duration: 0.53
+[silencedetect @ 0x1] silence_start: 30.2
+[silencedetect @ 0x1] silence_end: 31.0 | silence_duration: 0.8
+[silencedetect @ 0x1] silence_start: 58.4
+[silencedetect @ 0x1] silence_end: 59.2 | silence_duration: 0.8
+[silencedetect @ 0x1] silence_start: 98.0
+size=N/A time=00:01:40.00 bitrate=N/A speed= 300x
+"""
+
+class TestAudioProcessing(unittest.IsolatedAsyncioTestCase):
+
+    def test_parse_silences(self):
+        """Test that silences and the total duration are read from silencedetect output."""
+        silences, duration = audio_processing.parse_silences(SILENCEDETECT_STDERR)
+        self.assertEqual(duration, 100.0)
+        self.assertEqual(silences, [(0.0, 0.52), (30.2, 31.0), (58.4, 59.2), (98.0, 100.0)])
+
+    def test_chunks_are_cut_in_the_last_pause_before_the_limit(self):
+        """Test that no chunk exceeds the limit and cuts fall in the middle of pauses."""
+        silences, duration = audio_processing.parse_silences(SILENCEDETECT_STDERR)
+        chunks = audio_processing.plan_chunks(silences, duration, max_chunk=45)
+        self.assertEqual(chunks, [(0.0, 30.6), (30.6, 58.8), (58.8, 100.0)])
+
+    def test_long_stretch_without_pauses_is_cut_at_the_limit(self):
+        """Test that speech without pauses is still split into chunks of at most the limit."""
+        self.assertEqual(audio_processing.plan_chunks([], 100.0, max_chunk=45),
+                         [(0.0, 45.0), (45.0, 90.0), (90.0, 100.0)])
+        self.assertEqual(audio_processing.plan_chunks([], 20.0, max_chunk=45), [(0.0, 20.0)])
+
+    async def test_audio_is_sent_unchanged_without_ffmpeg(self):
+        """Test the fallback when the ffmpeg binary is not installed."""
+        with patch('bot.modules.audio_processing.ffmpeg_available', return_value=False):
+            self.assertEqual(await audio_processing.prepare_for_transcription(b"raw"), [b"raw"])
+            with self.assertLogs('bot.modules.audio_processing', 'WARNING'):
+                self.assertFalse(audio_processing.check_ffmpeg())
+
+    async def test_ffmpeg_processes_are_limited(self):
+        """Test that chunk encodes wait for a free slot instead of all starting at once."""
+        running = []
+        peak = []
+
+        class FakeProcess:
+            returncode = 0
+
+            async def communicate(self, audio):
+                running.append(self)
+                peak.append(len(running))
+                await asyncio.sleep(0.01)
+                running.remove(self)
+                return b"OggS", b""
+
+        async def create_subprocess_exec(*args, **kwargs):
+            return FakeProcess()
+
+        with patch('bot.modules.audio_processing._process_slots', asyncio.Semaphore(2)), \
+                patch('bot.modules.audio_processing.asyncio.create_subprocess_exec', create_subprocess_exec):
+            stream = ffmpeg.input("pipe:0").output("pipe:1", f="ogg")
+            results = await asyncio.gather(*[audio_processing._run(stream, b"raw") for _ in range(6)])
+
+        self.assertEqual(len(results), 6)
+        self.assertEqual(max(peak), 2)
+
+    async def test_ffmpeg_failures_fall_back_to_the_original_audio(self):
+        """Test that an ffmpeg error does not lose the voice note."""
+        with patch('bot.modules.audio_processing.ffmpeg_available', return_value=True), \
+                patch('bot.modules.audio_processing.normalize',
+                      side_effect=audio_processing.AudioProcessingError("bad input")):
+            self.assertEqual(await audio_processing.prepare_for_transcription(b"raw"), [b"raw"])
+
+
+def make_wav(segments, rate=8000):
+    """A mono 16-bit WAV made of (seconds, is_tone) segments: a 440 Hz tone or digital silence."""
+    frames = bytearray()
+    for seconds, is_tone in segments:
+        for n in range(int(seconds * rate)):
+            sample = int(16000 * math.sin(2 * math.pi * 440 * n / rate)) if is_tone else 0
+            frames += struct.pack("<h", sample)
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(bytes(frames))
+    return buffer.getvalue()
+
+
+@unittest.skipIf(shutil.which("ffmpeg") is None, "ffmpeg is not installed")
+class TestAudioProcessingWithFfmpeg(unittest.IsolatedAsyncioTestCase):
+
+    async def test_voice_note_is_normalised_split_and_encoded(self):
+        """Test a generated WAV through the real ffmpeg: trimmed, cut on the pause and encoded as Opus."""
+        audio = make_wav([(1.0, False), (2.0, True), (1.0, False), (2.0, True), (1.0, False)])
+        plan_chunks = audio_processing.plan_chunks
+
+        normalized = await audio_processing.normalize(audio)
+        self.assertTrue(normalized.startswith(b"OggS"))
+        self.assertLess(len(normalized), len(audio))
+
+        with patch('bot.modules.audio_processing.plan_chunks',
+                   lambda silences, duration: plan_chunks(silences, duration, max_chunk=3.5)):
+            chunks = await audio_processing.prepare_for_transcription(audio)
+
+        self.assertEqual(len(chunks), 2)
+        self.assertTrue(all(chunk.startswith(b"OggS") for chunk in chunks))
+
+if __name__ == '__main__':
+    unittest.main()
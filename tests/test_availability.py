@@ -0,0 +1,89 @@
+import datetime
+import os
+import random
+import sys
+import unittest
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules.availability import find_available_slots, merge_intervals, parse_busy_intervals
+
+UTC = datetime.timezone.utc
+
+
+def naive_available_slots(start_time, end_time, busy_intervals, duration_minutes):
+    """Reference implementation: check every candidate slot against every busy interval."""
+    duration = datetime.timedelta(minutes=duration_minutes)
+    slots = []
+    current = start_time
+    while current + duration <= end_time:
+        slot_end = current + duration
+        if not any(max(current, busy_start) < min(slot_end, busy_end) for busy_start, busy_end in busy_intervals):
+            slots.append((current, slot_end))
+        current = slot_end
+    return slots
+
+
+class TestAvailability(unittest.TestCase):
+
+    def setUp(self):
+        self.start = datetime.datetime(2024, 3, 4, 0, 0, tzinfo=UTC)  # Monday
+        self.end = self.start + datetime.timedelta(days=1)
+
+    def test_parse_and_merge_busy_intervals(self):
+        """Test that freebusy entries are parsed once and overlapping ones merged."""
+        busy = parse_busy_intervals([
+            {"start": "2024-03-04T10:00:00Z", "end": "2024-03-04T11:00:00Z"},
+            {"start": "2024-03-04T09:00:00Z", "end": "2024-03-04T10:30:00Z"},
+            {"start": "2024-03-04T13:00:00Z", "end": "2024-03-04T14:00:00Z"},
+        ])
+        self.assertEqual(merge_intervals(busy), [
+            (datetime.datetime(2024, 3, 4, 9, 0, tzinfo=UTC), datetime.datetime(2024, 3, 4, 11, 0, tzinfo=UTC)),
+            (datetime.datetime(2024, 3, 4, 13, 0, tzinfo=UTC), datetime.datetime(2024, 3, 4, 14, 0, tzinfo=UTC)),
+        ])
+
+    def test_matches_naive_algorithm_on_random_calendars(self):
+        """Test that the sweep returns exactly the slots of the brute-force check."""
+        rng = random.Random(7)
+        end = self.start + datetime.timedelta(days=7)
+        for _ in range(25):
+            busy = []
+            for _ in range(rng.randint(0, 60)):
+                busy_start = self.start + datetime.timedelta(minutes=rng.randrange(0, 7 * 24 * 60))
+                busy.append((busy_start, busy_start + datetime.timedelta(minutes=rng.randint(5, 180))))
+            duration = rng.choice([15, 30, 45, 60])
+            self.assertEqual(
+                find_available_slots(self.start, end, busy, duration_minutes=duration),
+                naive_available_slots(self.start, end, busy, duration),
+            )
+
+    def test_step_is_independent_of_duration(self):
+        """Test overlapping candidate slots when the step is shorter than the duration."""
+        busy = [(self.start.replace(hour=10), self.start.replace(hour=11))]
+        slots = find_available_slots(self.start.replace(hour=9), self.start.replace(hour=12), busy,
+                                     duration_minutes=60, step_minutes=15)
+        self.assertEqual([slot_start.strftime("%H:%M") for slot_start, _ in slots], ["09:00", "11:00"])
+
+        slots = find_available_slots(self.start.replace(hour=9), self.start.replace(hour=10, minute=30), [],
+                                     duration_minutes=60, step_minutes=15)
+        self.assertEqual([slot_start.strftime("%H:%M") for slot_start, _ in slots], ["09:00", "09:15", "09:30"])
+
+    def test_working_hours_mask(self):
+        """Test that slots are restricted to working hours per weekday."""
+        working_hours = {0: [(datetime.time(9), datetime.time(11)), (datetime.time(15), datetime.time(16))]}
+        end = self.start + datetime.timedelta(days=2)  # Monday and Tuesday
+        slots = find_available_slots(self.start, end, [], duration_minutes=60, working_hours=working_hours)
+        self.assertEqual([slot_start.strftime("%a %H:%M") for slot_start, _ in slots],
+                         ["Mon 09:00", "Mon 10:00", "Mon 15:00"])
+
+    def test_several_calendars_are_combined(self):
+        """Test that a slot busy in any calendar is not offered."""
+        work = [(self.start.replace(hour=9), self.start.replace(hour=10))]
+        personal = [(self.start.replace(hour=10), self.start.replace(hour=11))]
+        slots = find_available_slots(self.start.replace(hour=9), self.start.replace(hour=12), work + personal,
+                                     duration_minutes=60)
+        self.assertEqual(slots, [(self.start.replace(hour=11), self.start.replace(hour=12))])
+
+if __name__ == '__main__':
+    unittest.main()
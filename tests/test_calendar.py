@@ -0,0 +1,129 @@
+import datetime
+import unittest
+from unittest.mock import patch, MagicMock
+import os
+import sys
+import threading
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import calendar
+
+class TestLazyService(unittest.TestCase):
+
+    def setUp(self):
+        """Start every test without a Calendar client."""
+        calendar._service = None
+
+    def tearDown(self):
+        calendar._service = None
+
+    def test_import_does_not_build_the_client(self):
+        """Test that importing the module neither reads credentials nor builds the service."""
+        self.assertIsNone(calendar._service)
+
+    @patch('googleapiclient.discovery.build')
+    @patch('google.oauth2.service_account.Credentials.from_service_account_file')
+    def test_service_is_built_once_across_threads(self, mock_creds, mock_build):
+        """Test that concurrent first calls share one client built from the bundled discovery document."""
+        mock_build.return_value = MagicMock()
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(calendar.get_service())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_build.assert_called_once()
+        self.assertTrue(mock_build.call_args.kwargs['static_discovery'])
+        self.assertEqual(len(set(map(id, results))), 1)
+
+
+UTC = datetime.timezone.utc
+
+
+def event(event_id, day, hour=10):
+    start = datetime.datetime(2024, 5, day, hour, tzinfo=UTC)
+    return {
+        "id": event_id,
+        "start": {"dateTime": start.isoformat()},
+        "end": {"dateTime": (start + datetime.timedelta(hours=1)).isoformat()},
+    }
+
+
+class FakeBatch:
+    """Runs every queued events().list call against the owner's responses."""
+
+    def __init__(self, owner, callback):
+        self.owner = owner
+        self.callback = callback
+        self.requests = []
+
+    def add(self, params, request_id):
+        self.requests.append((request_id, params))
+
+    def execute(self):
+        for request_id, params in self.requests:
+            self.owner.params.append(params)
+            self.callback(request_id, self.owner.responses.pop(0), None)
+
+
+class TestCalendarEventStore(unittest.TestCase):
+
+    def setUp(self):
+        self.params = []
+        self.responses = []
+        service = MagicMock()
+        service.new_batch_http_request.side_effect = lambda callback: FakeBatch(self, callback)
+        service.events.return_value.list.side_effect = lambda **params: params
+        self.today = datetime.datetime(2024, 5, 10, tzinfo=UTC)
+        self.patchers = [
+            patch('bot.modules.calendar.get_service', return_value=service),
+            patch.object(calendar.CalendarEventStore, '_window', lambda _: (
+                self.today - calendar.SYNC_LOOKBACK, self.today + calendar.SYNC_LOOKAHEAD
+            )),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.store = calendar.CalendarEventStore()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_full_sync_is_bounded_to_the_window(self):
+        """Test that the first download asks for timeMin/timeMax and covers only that window."""
+        self.responses = [{"items": [event("a", 10)], "nextSyncToken": "t1"}]
+        self.assertEqual(self.store.sync(["cal"]), set())
+
+        self.assertEqual(self.params[0]["timeMin"], "2024-05-09T00:00:00+00:00")
+        self.assertEqual(self.params[0]["timeMax"], (self.today + calendar.SYNC_LOOKAHEAD).isoformat())
+        self.assertTrue(self.store.covers("cal", self.today, self.today + datetime.timedelta(days=1)))
+        self.assertFalse(self.store.covers("cal", self.today, self.today + calendar.SYNC_LOOKAHEAD * 2))
+
+    def test_past_events_are_evicted(self):
+        """Test that events ending before the window drop out as the days go by."""
+        self.responses = [
+            {"items": [event("old", 10), event("new", 20)], "nextSyncToken": "t1"},
+            {"items": [event("far", 1), event("later", 12)], "nextSyncToken": "t2"},
+        ]
+        self.store.sync(["cal"])
+        self.today += datetime.timedelta(days=2)
+        self.store.sync(["cal"])
+
+        self.assertEqual(self.params[1]["syncToken"], "t1")
+        self.assertEqual(sorted(self.store.calendars["cal"]["events"]), ["later", "new"])
+
+    def test_exhausted_window_triggers_a_full_sync(self):
+        """Test that the store downloads everything again once its window no longer reaches far enough."""
+        self.responses = [{"items": [], "nextSyncToken": "t1"}, {"items": [], "nextSyncToken": "t2"}]
+        self.store.sync(["cal"])
+        self.today += calendar.SYNC_LOOKAHEAD
+        self.store.sync(["cal"])
+
+        self.assertNotIn("syncToken", self.params[1])
+        self.assertEqual(self.params[1]["timeMin"], (self.today - calendar.SYNC_LOOKBACK).isoformat())
+
+if __name__ == '__main__':
+    unittest.main()
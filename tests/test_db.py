@@ -0,0 +1,61 @@
+import asyncio
+import os
+import sqlite3
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+
+class TestBatchWriter(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Point the DAL at a fresh temporary database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+
+    async def asyncTearDown(self):
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        """Close pooled connections and remove the temporary database."""
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    async def test_concurrent_writes_are_group_committed(self):
+        """Test that a burst of concurrent writes lands in a single transaction."""
+        await asyncio.gather(*[
+            db.write("INSERT INTO users (telegram_id, role) VALUES (?, ?)", (user_id, 'client'))
+            for user_id in range(100)
+        ])
+
+        writer = db.get_batch_writer()
+        self.assertEqual(writer.commits, 1)
+        self.assertEqual(writer.rows, 100)
+        row = await db.fetch_one("SELECT COUNT(*) AS total FROM users")
+        self.assertEqual(row['total'], 100)
+
+    async def test_failing_statement_does_not_sink_the_batch(self):
+        """Test that only the offending write fails when a batch is rejected."""
+        results = await asyncio.gather(
+            db.write("INSERT INTO users (telegram_id, role) VALUES (?, ?)", (1, 'client')),
+            db.write("INSERT INTO users (telegram_id, role) VALUES (?, ?)", (2, 'not-a-role')),
+            db.write("INSERT INTO users (telegram_id, role) VALUES (?, ?)", (3, 'crew')),
+            return_exceptions=True,
+        )
+
+        self.assertIsNone(results[0])
+        self.assertIsInstance(results[1], sqlite3.IntegrityError)
+        self.assertIsNone(results[2])
+        rows = await db.fetch_all("SELECT telegram_id FROM users ORDER BY telegram_id")
+        self.assertEqual([row['telegram_id'] for row in rows], [1, 3])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import asyncio
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import httpx
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import document_download as dd
+from bot.modules.file_validation import ContentValidator, FileValidationError
+
+class TestDownloadDocument(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.active = 0
+        self.peak = 0
+        self.body = os.urandom(300_000)
+
+    async def asyncTearDown(self):
+        await dd.close_client()
+
+    def use_transport(self, handler):
+        dd._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def slow_handler(self, request):
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.05)
+        self.active -= 1
+        if request.url.path.endswith("missing.pdf"):
+            return httpx.Response(404)
+        return httpx.Response(200, content=self.body)
+
+    async def test_large_document_spills_to_a_private_file(self):
+        """Test that the download streams into a buffer that leaves memory above the threshold."""
+        self.use_transport(self.slow_handler)
+        with patch('bot.modules.document_download.PRINT_SPOOL_MAX_MEMORY', 64 * 1024):
+            spool = await dd.download_document(SimpleNamespace(file_path="https://files.test/doc.pdf"))
+        try:
+            self.assertTrue(spool._rolled)
+            self.assertEqual(spool.read(), self.body)
+        finally:
+            spool.close()
+
+        small = await dd.download_document(SimpleNamespace(file_path="https://files.test/doc.pdf"))
+        self.assertFalse(small._rolled)
+        small.close()
+
+    async def test_downloads_are_capped_and_failures_propagate(self):
+        """Test that concurrent downloads respect the limit and a failed one raises."""
+        self.use_transport(self.slow_handler)
+        with patch('bot.modules.document_download._semaphore', asyncio.Semaphore(2)):
+            results = await asyncio.gather(*[
+                dd.download_document(SimpleNamespace(file_path=f"https://files.test/{name}"))
+                for name in ["a.pdf", "b.pdf", "c.pdf", "d.pdf", "missing.pdf"]
+            ], return_exceptions=True)
+
+        self.assertEqual(self.peak, 2)
+        self.assertIsInstance(results[-1], httpx.HTTPStatusError)
+        for spool in results[:-1]:
+            self.assertEqual(spool.read(), self.body)
+            spool.close()
+
+    async def test_rejected_content_stops_the_download(self):
+        """Test that a validator rejection aborts the stream after the first chunks."""
+        sent = []
+
+        async def stream():
+            for _ in range(100):
+                sent.append(1)
+                yield b"MZ" + os.urandom(64 * 1024)
+
+        self.use_transport(lambda request: httpx.Response(200, content=stream()))
+        with self.assertRaises(FileValidationError):
+            await dd.download_document(
+                SimpleNamespace(file_path="https://files.test/virus.pdf"), ContentValidator("application/pdf")
+            )
+        self.assertLess(len(sent), 5)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import sys
+import unittest
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules.file_validation import (
+    ContentValidator,
+    FileValidationError,
+    SNIFF_BYTES,
+    content_matches_mime_type,
+)
+
+PDF = b'%PDF-1.7\n' + os.urandom(10_000)
+PNG = b'\x89PNG\r\n\x1a\n' + os.urandom(10_000)
+
+class TestContentSniffing(unittest.TestCase):
+
+    def test_magic_bytes_must_match_the_declared_type(self):
+        """Test that each allowed type is recognised by its leading bytes."""
+        self.assertTrue(content_matches_mime_type(PDF, 'application/pdf'))
+        self.assertTrue(content_matches_mime_type(PNG, 'image/png'))
+        self.assertTrue(content_matches_mime_type(b'\xff\xd8\xff\xe0\x00\x10JFIF', 'image/jpeg'))
+        self.assertFalse(content_matches_mime_type(PNG, 'application/pdf'))
+        self.assertFalse(content_matches_mime_type(PDF, 'application/x-msdownload'))
+
+    def test_plain_text_is_recognised_by_content(self):
+        """Test that text in common encodings passes, even cut mid-character, and binary data does not."""
+        text = 'Cotización año 2024\r\n\tTotal: 100\n'
+        self.assertTrue(content_matches_mime_type(text.encode('utf-8'), 'text/plain'))
+        self.assertTrue(content_matches_mime_type(text.encode('utf-8')[:12], 'text/plain'))
+        self.assertTrue(content_matches_mime_type(text.encode('cp1252'), 'text/plain'))
+        self.assertTrue(content_matches_mime_type(text.encode('utf-16'), 'text/plain'))
+        self.assertTrue(content_matches_mime_type(b'\xfe\xff' + text.encode('utf-16-be')[:13], 'text/plain'))
+        self.assertFalse(content_matches_mime_type(b'MZ\x90\x00\x03\x00', 'text/plain'))
+        self.assertFalse(content_matches_mime_type(b'\xff\xfe\x00\xd8\x00\x00', 'text/plain'))
+        self.assertFalse(content_matches_mime_type(PNG[8:], 'text/plain'))
+
+
+class TestContentValidator(unittest.TestCase):
+
+    def test_mismatch_is_rejected_after_the_first_chunk(self):
+        """Test that a mislabelled file is rejected as soon as SNIFF_BYTES have arrived."""
+        validator = ContentValidator('application/pdf')
+        with self.assertRaises(FileValidationError):
+            validator.feed(PNG[:SNIFF_BYTES])
+
+    def test_running_size_is_enforced(self):
+        """Test that the download is rejected once it passes the size limit."""
+        validator = ContentValidator('application/pdf', max_size=9_000)
+        validator.feed(PDF[:8_000])
+        with self.assertRaises(FileValidationError):
+            validator.feed(PDF[8_000:])
+
+    def test_small_files_are_checked_on_finish(self):
+        """Test that a file shorter than SNIFF_BYTES is sniffed when the download ends."""
+        validator = ContentValidator('image/png')
+        validator.feed(PNG[:100])
+        validator.finish()
+
+        validator = ContentValidator('image/png')
+        validator.feed(b'not an image')
+        with self.assertRaises(FileValidationError):
+            validator.finish()
+
+if __name__ == '__main__':
+    unittest.main()
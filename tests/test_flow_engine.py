@@ -3,23 +3,27 @@ from unittest.mock import patch, MagicMock
 import os
 import sys
 import json
+import tempfile
 
 # Ensure the 'bot' module can be imported
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
+from bot import db
 from bot.modules.flow_engine import FlowEngine
 
-class TestFlowEngine(unittest.TestCase):
+class TestFlowEngine(unittest.IsolatedAsyncioTestCase):
 
     def setUp(self):
         """Set up a mock database connection and a mock flow definition."""
         self.mock_conn = MagicMock()
         self.mock_cursor = MagicMock()
         self.mock_conn.cursor.return_value = self.mock_cursor
+        self.mock_conn.execute.return_value = self.mock_cursor
 
         self.mock_flow = {
             "id": "test_flow",
             "role": "client",
+            "trigger_button": "start_test_flow",
             "steps": [
                 {"step_id": 1, "question": "What is your name?", "variable": "name"},
                 {"step_id": 2, "question": "What is your quest?", "variable": "quest"},
@@ -28,8 +32,17 @@ class TestFlowEngine(unittest.TestCase):
         }
 
         # Patch the database connection and the file loading
-        self.patcher_db = patch('bot.modules.flow_engine.get_db_connection', return_value=self.mock_conn)
-        self.patcher_load = patch('bot.modules.flow_engine.FlowEngine._load_flows', return_value=[self.mock_flow])
+        self.patcher_db = patch('bot.db.connect', return_value=self.mock_conn)
+        self.mock_branching_flow = {
+            "id": "branching_flow",
+            "user_roles": ["crew"],
+            "steps": [
+                {"step_id": "first", "question": "First?", "next_step": "third"},
+                {"step_id": "second", "question": "Second?"},
+                {"step_id": "third", "question": "Third?"}
+            ]
+        }
+        self.patcher_load = patch('bot.modules.flow_engine.FlowEngine._load_flows', return_value=[self.mock_flow, self.mock_branching_flow])
 
         self.patcher_db.start()
         self.patcher_load.start()
@@ -37,63 +50,185 @@ class TestFlowEngine(unittest.TestCase):
         self.flow_engine = FlowEngine()
 
     def tearDown(self):
-        """Stop the patchers."""
+        """Stop the patchers and the pooled connections that hold the mock."""
+        db.shutdown_pool()
         self.patcher_db.stop()
         self.patcher_load.stop()
 
-    def test_start_flow(self):
+    async def test_start_flow(self):
         """Test that a flow can be started correctly."""
         user_id = 123
         flow_id = "test_flow"
 
-        initial_step = self.flow_engine.start_flow(user_id, flow_id)
+        initial_step = await self.flow_engine.start_flow(user_id, flow_id)
 
         self.assertEqual(initial_step, self.mock_flow['steps'][0])
-        self.mock_cursor.execute.assert_called_once()
+        state = await self.flow_engine.get_conversation_state(user_id)
+        self.assertEqual(state['current_step_id'], 1)
+        # Write-behind: nothing reaches the database until the cache is flushed
+        self.mock_conn.commit.assert_not_called()
+
+        await self.flow_engine.flush()
+        self.mock_conn.execute.assert_called_once()
         self.mock_conn.commit.assert_called_once()
 
-    def test_get_conversation_state_found(self):
+    async def test_get_conversation_state_found(self):
         """Test retrieving an existing conversation state."""
         user_id = 123
         db_row = {'flow_id': 'test_flow', 'current_step_id': 1, 'collected_data': '{"name": "Sir Lancelot"}'}
         self.mock_cursor.fetchone.return_value = db_row
 
-        state = self.flow_engine.get_conversation_state(user_id)
+        state = await self.flow_engine.get_conversation_state(user_id)
 
         self.assertEqual(state['flow_id'], 'test_flow')
         self.assertEqual(state['current_step_id'], 1)
         self.assertEqual(state['collected_data']['name'], 'Sir Lancelot')
-        self.mock_cursor.execute.assert_called_with("SELECT flow_id, current_step_id, collected_data FROM conversations WHERE user_id = ?", (user_id,))
+        self.mock_conn.execute.assert_called_with("SELECT flow_id, current_step_id, collected_data FROM conversations WHERE user_id = ?", (user_id,))
 
-    def test_handle_response_in_progress(self):
+    async def test_handle_response_in_progress(self):
         """Test handling a response that leads to the next step."""
         user_id = 123
-        self.flow_engine.start_flow(user_id, "test_flow")
+        await self.flow_engine.start_flow(user_id, "test_flow")
 
         # Mock the current state
         state = {"flow_id": "test_flow", "current_step_id": 1, "collected_data": {}}
         with patch.object(self.flow_engine, 'get_conversation_state', return_value=state):
-            result = self.flow_engine.handle_response(user_id, "Sir Galahad")
+            result = await self.flow_engine.handle_response(user_id, "Sir Galahad")
 
             self.assertEqual(result['status'], 'in_progress')
             self.assertEqual(result['step'], self.mock_flow['steps'][1])
             self.assertEqual(state['collected_data']['name'], 'Sir Galahad')
 
-    def test_handle_response_flow_completion(self):
+    async def test_handle_response_flow_completion(self):
         """Test handling the final response that completes a flow."""
         user_id = 123
 
         # Mock the state to be at the last step
         state = {"flow_id": "test_flow", "current_step_id": 3, "collected_data": {"name": "Sir Robin", "quest": "To seek the Holy Grail"}}
         with patch.object(self.flow_engine, 'get_conversation_state', return_value=state):
-            result = self.flow_engine.handle_response(user_id, "Blue")
+            result = await self.flow_engine.handle_response(user_id, "Blue")
 
             self.assertEqual(result['status'], 'complete')
             self.assertEqual(result['data']['color'], 'Blue')
 
-            # Check that the conversation is ended
-            self.mock_cursor.execute.assert_any_call("DELETE FROM conversations WHERE user_id = ?", (user_id,))
-            self.mock_conn.commit.assert_called()
+        # Check that the conversation is ended
+        self.assertIsNone(await self.flow_engine.get_conversation_state(user_id))
+        await self.flow_engine.flush()
+        self.mock_conn.execute.assert_any_call("DELETE FROM conversations WHERE user_id = ?", (user_id,))
+        self.mock_conn.commit.assert_called()
+
+    async def test_state_cache_coalesces_writes(self):
+        """Test that many updates for a user are flushed as one row in one commit."""
+        user_id = 123
+        await self.flow_engine.start_flow(user_id, "test_flow")
+        for step_id in (2, 3):
+            await self.flow_engine.update_conversation_state(user_id, "test_flow", step_id, {"step": step_id})
+
+        self.assertEqual(await self.flow_engine.flush(), 1)
+        self.mock_conn.execute.assert_called_once()
+        self.assertEqual(self.mock_conn.execute.call_args[0][1], (user_id, "test_flow", 3, '{"step": 3}'))
+        self.mock_conn.commit.assert_called_once()
+        self.assertEqual(await self.flow_engine.flush(), 0)
+
+    async def test_concurrent_users_share_one_commit(self):
+        """Test that flushing many users' states issues a single batched commit."""
+        for user_id in range(10):
+            await self.flow_engine.start_flow(user_id, "test_flow")
+
+        self.assertEqual(await self.flow_engine.flush(), 10)
+        self.assertEqual(len(self.mock_conn.executemany.call_args[0][1]), 10)
+        self.mock_conn.commit.assert_called_once()
+
+    async def test_state_cache_serves_repeated_reads_from_memory(self):
+        """Test that only the first lookup for a user queries the database."""
+        self.mock_cursor.fetchone.return_value = None
+
+        self.assertIsNone(await self.flow_engine.get_conversation_state(456))
+        self.assertIsNone(await self.flow_engine.get_conversation_state(456))
+        self.mock_conn.execute.assert_called_once()
+
+    async def test_write_through_persists_immediately(self):
+        """Test that write_through mode commits on every change."""
+        engine = FlowEngine(durability="write_through")
+        await engine.start_flow(123, "test_flow")
+        self.mock_conn.commit.assert_called_once()
+
+    async def test_registry_lookups(self):
+        """Test the compiled lookups by id, trigger button and role."""
+        self.assertIs(self.flow_engine.get_flow("test_flow"), self.mock_flow)
+        self.assertIsNone(self.flow_engine.get_flow("missing_flow"))
+        self.assertIs(self.flow_engine.get_flow_by_trigger("start_test_flow"), self.mock_flow)
+        self.assertIsNone(self.flow_engine.get_flow_by_trigger("unknown_button"))
+        self.assertEqual(self.flow_engine.get_flows_for_role("client"), [self.mock_flow])
+        self.assertEqual(self.flow_engine.get_flows_for_role("crew"), [self.mock_branching_flow])
+        self.assertEqual(self.flow_engine.get_flows_for_role("admin"), [])
+
+    async def test_next_step_is_precomputed(self):
+        """Test that successors follow list order unless 'next_step' says otherwise."""
+        self.assertEqual(self.flow_engine.get_next_step("test_flow", 1)['step_id'], 2)
+        self.assertIsNone(self.flow_engine.get_next_step("test_flow", 3))
+        self.assertEqual(self.flow_engine.get_next_step("branching_flow", "first")['step_id'], "third")
+        self.assertIsNone(self.flow_engine.get_next_step("branching_flow", "third"))
+
+class TestFlowReload(unittest.TestCase):
+
+    def setUp(self):
+        """Create a temporary flows directory with one flow and a cache file path."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.flows_dir = os.path.join(self.tmp_dir.name, 'flows')
+        os.makedirs(self.flows_dir)
+        self.cache_file = os.path.join(self.tmp_dir.name, 'flows_cache.pickle')
+        self.write_flow('a.json', {"id": "flow_a", "role": "client", "trigger_button": "a", "steps": [{"step_id": 0, "question": "A?"}]})
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_flow(self, filename, flow):
+        path = os.path.join(self.flows_dir, filename)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(flow, f)
+        # Make sure the change is visible even on coarse mtime filesystems
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def make_engine(self):
+        return FlowEngine(flows_dir=self.flows_dir, flow_cache_file=self.cache_file)
+
+    def test_reload_recompiles_only_changed_files(self):
+        """Test that edits, additions and removals are swapped into a running engine."""
+        engine = self.make_engine()
+        self.assertFalse(engine.reload_flows())
+
+        self.write_flow('b.json', {"id": "flow_b", "role": "crew", "trigger_button": "b", "steps": [{"step_id": 0, "question": "B?"}]})
+        with patch.object(FlowEngine, '_parse_flow_file', wraps=FlowEngine._parse_flow_file) as parse:
+            self.assertTrue(engine.reload_flows())
+            parse.assert_called_once()
+        self.assertEqual(engine.get_flow_by_trigger("b")['id'], "flow_b")
+
+        os.remove(os.path.join(self.flows_dir, 'a.json'))
+        self.assertTrue(engine.reload_flows())
+        self.assertIsNone(engine.get_flow("flow_a"))
+
+    def test_broken_edit_keeps_last_good_definition(self):
+        """Test that a half-written file does not drop the flow."""
+        engine = self.make_engine()
+        path = os.path.join(self.flows_dir, 'a.json')
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write('{"id": "flow_a", ')
+        os.utime(path, ns=(0, os.stat(path).st_mtime_ns + 2_000_000_000))
+
+        engine.reload_flows()
+        self.assertEqual(engine.get_flow("flow_a")['steps'][0]['question'], "A?")
+
+    def test_cold_start_uses_precompiled_cache(self):
+        """Test that a second engine skips parsing unchanged files."""
+        self.make_engine()
+        self.assertTrue(os.path.exists(self.cache_file))
+
+        with patch.object(FlowEngine, '_parse_flow_file') as parse:
+            engine = self.make_engine()
+            parse.assert_not_called()
+        self.assertEqual(engine.get_flow("flow_a")['trigger_button'], "a")
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,56 @@
+import unittest
+from unittest.mock import patch, AsyncMock
+import os
+import sys
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import identity
+
+class TestRoleCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Start every test with an empty role cache and a mocked data-access layer."""
+        identity.invalidate_role_cache()
+        identity._role_cache_stats.update(hits=0, misses=0)
+
+        self.patcher_fetch = patch('bot.modules.identity.db.fetch_one', new_callable=AsyncMock)
+        self.patcher_write = patch('bot.modules.identity.db.write', new_callable=AsyncMock)
+        self.mock_fetch = self.patcher_fetch.start()
+        self.patcher_write.start()
+        self.mock_fetch.return_value = {'role': 'crew'}
+
+    def tearDown(self):
+        """Stop the patchers."""
+        self.patcher_fetch.stop()
+        self.patcher_write.stop()
+
+    async def test_repeated_checks_hit_the_cache(self):
+        """Test that only the first role lookup queries the database."""
+        self.assertTrue(await identity.is_crew(42))
+        self.assertFalse(await identity.is_admin(42))
+        self.assertEqual(await identity.get_user_role("42"), 'crew')
+
+        self.mock_fetch.assert_awaited_once()
+        self.assertEqual(identity.get_role_cache_stats(), {"hits": 2, "misses": 1, "size": 1})
+
+    async def test_add_user_invalidates_cached_role(self):
+        """Test that an upsert is visible on the very next role check."""
+        self.assertEqual(await identity.get_user_role(42), 'crew')
+
+        self.mock_fetch.return_value = {'role': 'admin'}
+        self.assertTrue(await identity.add_user(42, 'admin'))
+
+        self.assertEqual(await identity.get_user_role(42), 'admin')
+        self.assertEqual(self.mock_fetch.await_count, 2)
+
+    async def test_expired_entries_are_reloaded(self):
+        """Test that roles are looked up again once the TTL has passed."""
+        with patch('bot.modules.identity.ROLE_CACHE_TTL', 0):
+            await identity.get_user_role(42)
+            await identity.get_user_role(42)
+        self.assertEqual(self.mock_fetch.await_count, 2)
+
+if __name__ == '__main__':
+    unittest.main()
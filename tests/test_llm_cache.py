@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+from bot.modules.llm_cache import LLMResponseCache, cache_key
+
+class TestLLMResponseCache(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        """Point the DAL at a fresh temporary database."""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+        self.calls = 0
+
+    async def asyncTearDown(self):
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        """Close pooled connections and remove the temporary database."""
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    async def producer(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        return f"pitch {self.calls}", 100, 40
+
+    def test_near_identical_prompts_share_a_key(self):
+        """Test that case and whitespace differences do not change the key, but the model does."""
+        self.assertEqual(cache_key("gpt-4o-mini", "Hola  Ana,\nidea: Tienda"),
+                         cache_key("gpt-4o-mini", "hola ana, idea: tienda "))
+        self.assertNotEqual(cache_key("gpt-4o-mini", "hola"), cache_key("gpt-4o", "hola"))
+
+    async def test_hits_are_served_from_memory_and_counted(self):
+        """Test that concurrent and repeated lookups make a single LLM call."""
+        cache = LLMResponseCache(max_size=10, ttl=60)
+        results = await asyncio.gather(*[cache.get_or_create("k", "m", self.producer) for _ in range(3)])
+        await cache.get_or_create("k", "m", self.producer)
+
+        self.assertEqual(results, ["pitch 1"] * 3)
+        self.assertEqual(self.calls, 1)
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (3, 1))
+        self.assertEqual(stats["saved_prompt_tokens"], 300)
+        self.assertEqual(stats["saved_completion_tokens"], 120)
+
+    async def test_entries_survive_a_restart(self):
+        """Test that a new cache instance reads responses persisted by a previous one."""
+        await LLMResponseCache(ttl=60).get_or_create("k", "m", self.producer)
+
+        self.assertEqual(await LLMResponseCache(ttl=60).get_or_create("k", "m", self.producer), "pitch 1")
+        self.assertEqual(self.calls, 1)
+
+    async def test_expired_entries_and_failures_are_not_reused(self):
+        """Test that expired rows are regenerated and producer errors are not cached."""
+        await LLMResponseCache(ttl=60).get_or_create("k", "m", self.producer)
+        with patch('bot.modules.llm_cache.time.time', return_value=10**12):
+            self.assertEqual(await LLMResponseCache(ttl=60).get_or_create("k", "m", self.producer), "pitch 2")
+
+        async def failing():
+            raise RuntimeError("boom")
+
+        cache = LLMResponseCache(ttl=60)
+        with self.assertRaises(RuntimeError):
+            await cache.get_or_create("other", "m", failing)
+        self.assertEqual(await cache.get_or_create("other", "m", self.producer), "pitch 3")
+
+    async def test_cancelled_caller_does_not_cancel_the_waiters(self):
+        """Test that callers sharing an in-flight request get a response when the first one is cancelled."""
+        cache = LLMResponseCache(ttl=60)
+        started = asyncio.Event()
+
+        async def slow_producer():
+            started.set()
+            await asyncio.sleep(10)
+
+        first = asyncio.create_task(cache.get_or_create("k", "m", slow_producer))
+        await started.wait()
+        waiters = [asyncio.create_task(cache.get_or_create("k", "m", self.producer)) for _ in range(2)]
+        await asyncio.sleep(0)
+        first.cancel()
+
+        self.assertEqual(await asyncio.gather(*waiters), ["pitch 1", "pitch 1"])
+        self.assertTrue(first.cancelled())
+        self.assertEqual(self.calls, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import asyncio
+import json
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+import httpx
+import openai
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import llm_engine
+
+class TestSharedAsyncClient(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        """Serve chat completions from a mock transport that rate-limits the first request."""
+        self.requests = 0
+        self.patcher_key = patch('bot.modules.llm_engine.OPENAI_API_KEY', 'sk-test')
+        self.patcher_key.start()
+        llm_engine._client = openai.AsyncOpenAI(
+            api_key='sk-test', max_retries=2,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handler)),
+        )
+
+    async def asyncTearDown(self):
+        await llm_engine.close_client()
+        self.patcher_key.stop()
+
+    def handler(self, request):
+        self.requests += 1
+        if self.requests == 1:
+            return httpx.Response(429, headers={"retry-after-ms": "10"}, json={"error": {"message": "slow down"}})
+        prompt = json.loads(request.content)["messages"][-1]["content"]
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": f" echo: {prompt} "}}],
+        })
+
+    async def test_rate_limited_request_is_retried(self):
+        """Test that a 429 with Retry-After is retried transparently."""
+        self.assertEqual(await llm_engine.get_smart_response("hola"), "echo: hola")
+        self.assertEqual(self.requests, 2)
+
+    async def test_concurrent_calls_share_the_client(self):
+        """Test that concurrent completions run on the same pooled client."""
+        client = llm_engine.get_client()
+        answers = await asyncio.gather(*[llm_engine.get_smart_response(str(i)) for i in range(5)])
+        self.assertEqual(answers, [f"echo: {i}" for i in range(5)])
+        self.assertIs(llm_engine.get_client(), client)
+
+if __name__ == '__main__':
+    unittest.main()
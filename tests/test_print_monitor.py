@@ -0,0 +1,191 @@
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+from bot.modules import print_monitor as pm
+
+class FakeIMAP:
+    """Minimal IMAP connection over an in-memory mailbox of {uid: (subject, seen)}."""
+
+    def __init__(self, mailbox, uid_validity=1):
+        self.mailbox = mailbox
+        self.uid_validity = uid_validity
+        self.commands = []
+
+    def select(self, mailbox, readonly=False):
+        return "OK", [str(len(self.mailbox)).encode()]
+
+    def response(self, code):
+        return code, [str(self.uid_validity).encode()]
+
+    def noop(self):
+        return "OK", [b""]
+
+    def uid(self, command, *args):
+        self.commands.append((command, *args))
+        if command == "SEARCH":
+            if args[0] == "UNSEEN":
+                uids = [uid for uid, (_, seen) in self.mailbox.items() if not seen]
+            else:
+                first = int(args[0].split()[1].split(":")[0])
+                # Like a real server, "n:*" always matches the highest UID
+                uids = [uid for uid in self.mailbox if uid >= first] or [max(self.mailbox)]
+            return "OK", [" ".join(map(str, sorted(uids))).encode()]
+        if command == "FETCH":
+            data = []
+            for uid in self.expand(args[0]):
+                header = f"Subject: {self.mailbox[uid][0]}\r\n\r\n".encode()
+                data.append((f"{uid} (UID {uid} BODY[HEADER.FIELDS (SUBJECT)] {{{len(header)}}}".encode(), header))
+                data.append(b")")
+            return "OK", data
+        if command == "STORE":
+            for uid in self.expand(args[0]):
+                self.mailbox[uid] = (self.mailbox[uid][0], True)
+            return "OK", []
+        raise AssertionError(command)
+
+    def expand(self, uid_set):
+        uids = []
+        for part in uid_set.split(","):
+            start, _, end = part.partition(":")
+            uids.extend(range(int(start), int(end or start) + 1))
+        return [uid for uid in uids if uid in self.mailbox]
+
+    def logout(self):
+        pass
+
+
+class TestPrintStatusMonitor(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+        self.server = FakeIMAP({
+            1: ("Old newsletter", True),
+            2: ("Re: #aaaa1111 received", False),
+            3: ("Re: #aaaa1111 completed", False),
+        })
+
+    async def asyncTearDown(self):
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    def make_monitor(self):
+        monitor = pm.PrintStatusMonitor(connect=lambda: self.server, mailbox="INBOX")
+        monitor.on_replies = AsyncMock()
+        return monitor
+
+    def test_uid_set_compacts_ranges(self):
+        """Test that UID lists are sent as compact IMAP sets."""
+        self.assertEqual(pm.uid_set([7, 1, 2, 3, 9, 10]), "1:3,7,9:10")
+        self.assertEqual(pm.uid_set([4]), "4")
+
+    async def test_only_new_uids_are_fetched_in_one_command(self):
+        """Test that each check fetches subject headers of new UIDs in one FETCH and one STORE."""
+        monitor = self.make_monitor()
+        self.assertEqual(await monitor.check(), 2)
+        monitor.on_replies.assert_awaited_once_with(["Re: #aaaa1111 received", "Re: #aaaa1111 completed"])
+        self.assertEqual([command[0] for command in self.server.commands], ["SEARCH", "FETCH", "STORE"])
+        self.assertEqual(self.server.commands[1][1:], ("2:3", "(BODY.PEEK[HEADER.FIELDS (SUBJECT)])"))
+        self.assertTrue(self.server.mailbox[3][1])
+
+        # Nothing new: the "4:*" search matches UID 3, which is filtered out
+        self.server.commands = []
+        self.assertEqual(await monitor.check(), 0)
+        self.assertEqual(self.server.commands, [("SEARCH", "UID 4:*")])
+
+        # A new monitor (after a restart) resumes from the saved UID, even if the reply was read by hand
+        self.server.mailbox[4] = ("Re: #bbbb2222 failed", True)
+        restarted = self.make_monitor()
+        self.assertEqual(await restarted.check(), 1)
+        restarted.on_replies.assert_awaited_once_with(["Re: #bbbb2222 failed"])
+
+    async def test_failed_handler_leaves_messages_for_next_check(self):
+        """Test that replies are not marked as processed if handling them fails."""
+        monitor = self.make_monitor()
+        monitor.on_replies.side_effect = RuntimeError("db down")
+        with self.assertRaises(RuntimeError):
+            await monitor.check()
+        self.assertFalse(self.server.mailbox[2][1])
+
+        monitor.on_replies = AsyncMock()
+        self.assertEqual(await monitor.check(), 2)
+
+    async def test_uid_validity_change_resets_the_saved_uid(self):
+        """Test that a new UIDVALIDITY discards the saved UID and falls back to unseen messages."""
+        monitor = self.make_monitor()
+        await monitor.check()
+
+        self.server = FakeIMAP({1: ("Re: #cccc3333 completed", False)}, uid_validity=2)
+        restarted = self.make_monitor()
+        self.assertEqual(await restarted.check(), 1)
+        self.assertEqual((restarted.uid_validity, restarted.last_uid), (2, 1))
+
+
+class TestIdle(unittest.TestCase):
+
+    def run_idle(self, *replies):
+        """Runs idle() against a fake server that sends `replies` (pausing on None) after the IDLE command."""
+        client, server = socket.socketpair()
+        mail = type("Mail", (), {})()
+        mail.sock = client
+        mail.file = client.makefile("rb")
+        mail._new_tag = lambda: b"A001"
+        mail.send = client.sendall
+        mail.readline = mail.file.readline
+        received = []
+
+        def serve():
+            reader = server.makefile("rb")
+            received.append(reader.readline())
+            for reply in replies:
+                if reply is None:
+                    time.sleep(0.2)
+                else:
+                    server.sendall(reply)
+            received.append(reader.readline())
+            server.sendall(b"A001 OK IDLE terminated\r\n")
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+        try:
+            started = time.monotonic()
+            changed = pm.idle(mail, timeout=5)
+            elapsed = time.monotonic() - started
+        finally:
+            thread.join()
+            mail.file.close()
+            client.close()
+            server.close()
+        self.assertEqual(received, [b"A001 IDLE\r\n", b"DONE\r\n"])
+        return changed, elapsed
+
+    def test_idle_returns_when_a_message_arrives(self):
+        """Test that IDLE reports a new message and ends the command with DONE."""
+        changed, elapsed = self.run_idle(b"+ idling\r\n", None, b"* 4 EXISTS\r\n")
+        self.assertTrue(changed)
+        self.assertLess(elapsed, 2)
+
+    def test_idle_sees_data_already_buffered(self):
+        """Test that an EXISTS sent in the same packet as the continuation is not left waiting in the buffer."""
+        changed, elapsed = self.run_idle(b"+ idling\r\n* 4 EXISTS\r\n")
+        self.assertTrue(changed)
+        self.assertLess(elapsed, 2)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,190 @@
+import asyncio
+import email
+import os
+import sys
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+from bot.modules import print_queue as pq
+from bot.modules import printer
+
+class FakeSession:
+    """Stands in for SMTPSession, recording what each connection sends."""
+
+    instances = []
+
+    def __init__(self):
+        self.sent = []
+        self.closed = 0
+        FakeSession.instances.append(self)
+
+    def send(self, job, recipient):
+        chunks = []
+        pq.write_message(chunks.append, job, "bot@example.com", recipient)
+        self.sent.append(b"".join(chunks))
+        if job.file_name == "broken.pdf":
+            raise OSError("552 message rejected")
+
+    def close(self):
+        self.closed += 1
+
+    def close_if_idle(self, idle_timeout):
+        pass
+
+
+class TestPrintQueue(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        FakeSession.instances = []
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+        self.queue = pq.PrintQueue(session_factory=FakeSession, batch_size=10, idle_timeout=60)
+        self.queue.notify = AsyncMock()
+
+    async def asyncTearDown(self):
+        await self.queue.close()
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    def make_content(self, content):
+        """A job buffer small enough to spill to a temporary file for larger documents."""
+        spool = tempfile.SpooledTemporaryFile(max_size=1024)
+        spool.write(content)
+        return spool
+
+    def test_message_streams_a_valid_attachment(self):
+        """Test that the streamed MIME message round-trips the attachment and job id."""
+        content = os.urandom(200_000)
+        job = pq.PrintJob("abc12345", 7, 7, self.make_content(content), "Informe año.pdf")
+        chunks = []
+        pq.write_message(chunks.append, job, "bot@example.com", "printer@example.com")
+
+        raw = b"".join(chunks)
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(line) <= 78 for line in raw.split(b"\r\n")))
+        message = email.message_from_bytes(raw)
+        self.assertIn("#abc12345", str(email.header.make_header(email.header.decode_header(message["Subject"]))))
+        attachment = [part for part in message.walk() if part.get_filename()][0]
+        self.assertEqual(attachment.get_filename(), "Informe año.pdf")
+        self.assertEqual(attachment.get_content_type(), "application/pdf")
+        self.assertEqual(attachment.get_payload(decode=True), content)
+
+        # A resend after a dropped connection reads the buffer from the start again
+        resent = []
+        pq.write_message(resent.append, job, "bot@example.com", "printer@example.com")
+        attachment = [part for part in email.message_from_bytes(b"".join(resent)).walk() if part.get_filename()][0]
+        self.assertEqual(attachment.get_payload(decode=True), content)
+
+    def test_file_name_cannot_inject_headers(self):
+        """Test that CR/LF and quotes in a user's file name stay inside encoded header values."""
+        name = 'x"; y=.pdf\r\nBcc: victim@example.com\r\n.\r\nreal.pdf'
+        job = pq.PrintJob("abc12345", 7, 7, self.make_content(b"%PDF-1.4 test"), name)
+        chunks = []
+        pq.write_message(chunks.append, job, "bot@example.com", "printer@example.com")
+
+        raw = b"".join(chunks)
+        self.assertNotIn(b".", raw.split(b"\r\n"))
+        message = email.message_from_bytes(raw)
+        self.assertIsNone(message["Bcc"])
+        self.assertEqual(len(message.get_payload()), 2)
+        attachment = message.get_payload()[1]
+        self.assertEqual(attachment.get_filename(), 'x"; y=.pdf Bcc: victim@example.com . real.pdf')
+        self.assertEqual(attachment.get_payload(decode=True), b"%PDF-1.4 test")
+        subject = str(email.header.make_header(email.header.decode_header(message["Subject"])))
+        self.assertTrue(subject.endswith("real.pdf"))
+
+        # Long names are split into RFC 2231 continuations instead of one huge line
+        job = pq.PrintJob("abc12345", 7, 7, self.make_content(b"%PDF-1.4 test"), "año " * 60 + ".pdf")
+        chunks = []
+        pq.write_message(chunks.append, job, "bot@example.com", "printer@example.com")
+        raw = b"".join(chunks)
+        self.assertTrue(all(len(line) <= 78 for line in raw.split(b"\r\n")))
+        attachment = email.message_from_bytes(raw).get_payload()[1]
+        self.assertEqual(attachment.get_filename(), "año " * 60 + ".pdf")
+
+    async def test_burst_is_sent_over_one_session(self):
+        """Test that submit returns at once and queued jobs share one SMTP session."""
+        jobs = await asyncio.gather(*[
+            self.queue.submit(1, 1, self.make_content(b"%PDF-1.4 test"), f"doc{number}.pdf")
+            for number in range(5)
+        ])
+        self.assertTrue(all(job.status == pq.QUEUED for job in jobs))
+
+        await self.queue.join()
+
+        self.assertEqual(len(FakeSession.instances), 1)
+        self.assertEqual(len(FakeSession.instances[0].sent), 5)
+        self.assertTrue(all(job.status == pq.SENT for job in jobs))
+        self.assertEqual(self.queue.notify.await_count, 5)
+        self.assertTrue(all(job.content.closed for job in jobs))
+        self.assertEqual(self.queue.jobs, {})
+
+    async def test_failed_job_does_not_stop_the_queue(self):
+        """Test that a rejected job is reported as failed and the next ones still go out."""
+        broken = await self.queue.submit(1, 1, self.make_content(b"x"), "broken.pdf")
+        fine = await self.queue.submit(1, 1, self.make_content(b"y"), "fine.pdf")
+        await self.queue.join()
+
+        self.assertEqual(broken.status, pq.FAILED)
+        self.assertIn("552", broken.error)
+        self.assertEqual(fine.status, pq.SENT)
+        self.assertEqual(FakeSession.instances[0].closed, 1)
+        row = await pq.get_job(broken.job_id)
+        self.assertEqual(row['status'], pq.FAILED)
+        self.assertIn("552", row['error'])
+
+    async def test_job_status_only_moves_forward(self):
+        """Test that the table tracks the job and a late 'received' does not undo 'completed'."""
+        job = await self.queue.submit(1, 1, self.make_content(b"x"), "doc.pdf")
+        self.assertEqual((await pq.get_job(job.job_id))['status'], pq.QUEUED)
+        await self.queue.join()
+        self.assertEqual((await pq.get_job(job.job_id))['status'], pq.SENT)
+
+        self.assertTrue(await pq.record_status(job.job_id, pq.COMPLETED))
+        self.assertFalse(await pq.record_status(job.job_id, pq.RECEIVED))
+        self.assertFalse(await pq.record_status("00000000", pq.COMPLETED))
+        self.assertEqual((await pq.get_job(job.job_id))['status'], pq.COMPLETED)
+
+    async def test_queued_jobs_fail_after_a_restart(self):
+        """Test that jobs left in the queue by a previous run are marked as failed."""
+        await db.write(pq.INSERT_JOB_SQL, ("deadbeef", 1, 1, "old.pdf", pq.QUEUED, 1.0, 1.0))
+        await db.write(pq.INSERT_JOB_SQL, ("cafebabe", 1, 1, "done.pdf", pq.SENT, 2.0, 2.0))
+
+        self.assertEqual(await pq.fail_interrupted_jobs(), 1)
+        self.assertEqual((await pq.get_job("deadbeef"))['status'], pq.FAILED)
+        self.assertEqual((await pq.get_job("cafebabe"))['status'], pq.SENT)
+
+    async def test_printer_replies_update_jobs_by_id(self):
+        """Test that replies are matched to jobs by the #id in the subject and the owner is told."""
+        job = await self.queue.submit(5, 50, self.make_content(b"x"), "plano.pdf")
+        await self.queue.join()
+        bot = AsyncMock()
+
+        changed = await printer.apply_status_replies([
+            f"Re: Impresión #{job.job_id} - plano.pdf - received",
+            f"Re: Impresión #{job.job_id} - plano.pdf - Completed",
+            "Newsletter",
+            "Re: Impresión #0badf00d - failed",
+        ], bot)
+
+        self.assertEqual(changed, 2)
+        bot.send_message.assert_awaited_once()
+        self.assertEqual(bot.send_message.await_args.kwargs['chat_id'], 50)
+        with patch('bot.modules.printer.is_admin', AsyncMock(return_value=True)):
+            status = await printer.check_print_status(5)
+        self.assertIn(f"#{job.job_id} 'plano.pdf'", status)
+        self.assertIn(printer.STATUS_LABELS[pq.COMPLETED], status)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db, profiling
+from bot.modules import flow_engine
+
+IMPORTTIME_OUTPUT = """import time: self [us] | cumulative | imported package
+import time:       120 |        120 |   bot.config
+import time:      2000 |       5000 |     openai
+import time:       300 |       5300 |   bot.modules.llm_engine
+import time:       500 |       5920 | bot.main
+import time:        10 |         10 | bot.config
+"""
+
+class TestStartupProfiler(unittest.TestCase):
+
+    def test_parse_importtime_keeps_cumulative_milliseconds(self):
+        """Test that the first (real) import of each module is reported in ms."""
+        timings = profiling.parse_importtime(IMPORTTIME_OUTPUT)
+        self.assertEqual(timings["bot.main"], 5.92)
+        self.assertEqual(timings["openai"], 5.0)
+        self.assertEqual(timings["bot.config"], 0.12)
+
+    def test_regressions_respect_threshold_and_noise_floor(self):
+        """Test that only metrics slower by both the ratio and the minimum delta are flagged."""
+        baseline = {"total_ms": 400, "imports_ms": {"bot.main": 300, "bot.db": 2}, "steps_ms": {"FlowEngine": 50}}
+        report = {"total_ms": 410, "imports_ms": {"bot.main": 310, "bot.db": 4, "openai": 500},
+                  "steps_ms": {"FlowEngine": 80}}
+
+        regressions = profiling.find_regressions(report, baseline, threshold=0.2, min_delta_ms=5)
+
+        self.assertEqual(regressions, [("imports.openai", 0.0, 500), ("steps.FlowEngine", 50, 80)])
+
+    def test_bot_main_import_stays_off_openai(self):
+        """Test that the heavy OpenAI SDK is not imported on the startup path."""
+        imports, deferred = profiling.measure_imports(extra_modules=("openai",))
+        self.assertIn("bot.main", imports)
+        self.assertNotIn("openai", imports)
+        self.assertIn("openai", deferred)
+
+    def test_startup_steps_leave_real_files_alone(self):
+        """Test that measuring startup points the flow cache at a temporary file."""
+        original_init = flow_engine.FlowEngine.__init__
+        database_file = db.DATABASE_FILE
+        with patch.object(flow_engine.FlowEngine, '__init__', autospec=True, side_effect=original_init) as init:
+            steps = profiling.measure_startup_steps()
+
+        self.assertIn("FlowEngine", steps)
+        self.assertEqual(db.DATABASE_FILE, database_file)
+        cache_file = init.call_args.kwargs.get('flow_cache_file', flow_engine.FLOW_CACHE_FILE)
+        self.assertNotEqual(os.path.abspath(cache_file), os.path.abspath(flow_engine.FLOW_CACHE_FILE))
+
+if __name__ == '__main__':
+    unittest.main()
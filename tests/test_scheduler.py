@@ -0,0 +1,196 @@
+import asyncio
+import datetime
+import os
+import sys
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytz
+from telegram.error import RetryAfter
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+from bot import scheduler
+from bot.modules.broadcast import RateLimiter, send_many
+from bot.modules.identity import invalidate_role_cache
+
+TZ = pytz.timezone("America/Monterrey")
+
+class TestDailySummary(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+        self.now = TZ.localize(datetime.datetime(2024, 5, 6, 7, 0))
+        self.patchers = [
+            patch('bot.scheduler._now', lambda: self.now),
+            patch('bot.scheduler.ADMIN_ID', '1'),
+            patch('bot.modules.identity.ADMIN_ID', '1'),
+            patch('bot.scheduler.DAILY_SUMMARY_TIME', '8:00'),
+            patch('bot.scheduler.get_agenda', AsyncMock(return_value="📅 *Agenda para Hoy*")),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.bot = AsyncMock()
+        self.context = SimpleNamespace(bot=self.bot)
+
+    async def asyncTearDown(self):
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        invalidate_role_cache()
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    async def add_user(self, telegram_id, role, name=None):
+        await db.write("INSERT INTO users (telegram_id, role, name) VALUES (?, ?, ?)", (telegram_id, role, name))
+
+    def recipients(self):
+        return sorted(call.kwargs['chat_id'] for call in self.bot.send_message.await_args_list)
+
+    async def test_agenda_is_computed_once_for_all_recipients(self):
+        """Test that due subscriptions share one agenda and each chat gets a single message."""
+        await self.add_user(10, 'crew', 'Ana')
+        await self.add_user(11, 'crew')
+        await self.add_user(20, 'client')
+        await scheduler.ensure_owner_subscription()
+        await scheduler.add_subscription("08:00", role='crew')
+        await scheduler.add_subscription("08:00", chat_id=10)
+        await scheduler.add_subscription("09:30", chat_id=11)
+
+        self.now = self.now.replace(hour=8, minute=0)
+        await scheduler.send_daily_summary(self.context)
+
+        self.assertEqual(self.recipients(), [1, 10, 11])
+        scheduler.get_agenda.assert_awaited_once()
+        texts = {call.kwargs['chat_id']: call.kwargs['text'] for call in self.bot.send_message.await_args_list}
+        self.assertIn("Buen día, Ana!", texts[10])
+        self.assertIn("📅 *Agenda para Hoy*", texts[11])
+
+        # Already sent today: later ticks only pick up the 09:30 subscription
+        self.bot.send_message.reset_mock()
+        self.now = self.now.replace(hour=9, minute=31)
+        await scheduler.send_daily_summary(self.context)
+        self.assertEqual(self.recipients(), [11])
+        await scheduler.send_daily_summary(self.context)
+        self.assertEqual(self.recipients(), [11])
+
+    async def test_agenda_never_reaches_clients(self):
+        """Test that the owner's private agenda is only sent to admins and crew."""
+        await self.add_user(10, 'crew')
+        await self.add_user(20, 'client')
+        with self.assertRaises(ValueError):
+            await scheduler.add_subscription("08:00", role='client')
+        # A chat subscription whose user is (or became) a client is skipped at delivery
+        await scheduler.add_subscription("08:00", chat_id=10)
+        await scheduler.add_subscription("08:00", chat_id=20)
+        await scheduler.add_subscription("08:00", chat_id=30)
+
+        self.now = self.now.replace(hour=8, minute=0)
+        await scheduler.send_daily_summary(self.context)
+        self.assertEqual(self.recipients(), [10])
+
+    async def test_admin_command_manages_subscriptions(self):
+        """Test that /subscriptions lists, adds and removes subscriptions and refuses clients."""
+        await self.add_user(10, 'crew')
+        await self.add_user(20, 'client')
+        self.assertIn("Uso:", await scheduler.manage_subscriptions([]))
+        self.assertIn("08:30", await scheduler.manage_subscriptions(["add", "8:30", "crew"]))
+        self.assertIn("✅", await scheduler.manage_subscriptions(["add", "09:00", "10"]))
+        self.assertIn("no es del equipo", await scheduler.manage_subscriptions(["add", "09:00", "20"]))
+        self.assertIn("roles", await scheduler.manage_subscriptions(["add", "09:00", "client"]))
+        self.assertIn("Hora inválida", await scheduler.manage_subscriptions(["add", "9h", "crew"]))
+
+        listing = await scheduler.manage_subscriptions([])
+        self.assertIn("08:30  →  rol crew", listing)
+        self.assertIn("09:00  →  chat 10", listing)
+
+        first = (await scheduler.list_subscriptions())[0]["id"]
+        self.assertIn("eliminada", await scheduler.manage_subscriptions(["remove", str(first)]))
+        self.assertIn("No existe", await scheduler.manage_subscriptions(["remove", str(first)]))
+        self.assertEqual(len(await scheduler.list_subscriptions()), 1)
+
+    async def test_owner_subscription_follows_the_configured_time(self):
+        """Test that the config-managed subscription moves with DAILY_SUMMARY_TIME and the owner's own ones stay."""
+        await scheduler.add_subscription("21:00", chat_id=1)
+        await scheduler.ensure_owner_subscription()
+        with patch('bot.scheduler.DAILY_SUMMARY_TIME', '06:45'):
+            await scheduler.ensure_owner_subscription()
+            await scheduler.ensure_owner_subscription()
+        rows = await scheduler.list_subscriptions()
+        self.assertEqual([(row['chat_id'], row['send_time'], row['source']) for row in rows],
+                         [(1, "06:45", "config"), (1, "21:00", "manual")])
+
+        with patch('bot.scheduler.ADMIN_ID', ''):
+            await scheduler.ensure_owner_subscription()
+        self.assertEqual([row['send_time'] for row in await scheduler.list_subscriptions()], ["21:00"])
+        with self.assertRaises(ValueError):
+            await scheduler.add_subscription("25:00", chat_id=2)
+
+
+class TestRateLimitedFanOut(unittest.IsolatedAsyncioTestCase):
+
+    async def test_global_and_per_chat_limits(self):
+        """Test that messages are spaced by the global rate and by the per-chat interval."""
+        loop = asyncio.get_running_loop()
+        sent = []
+
+        async def send_message(chat_id, text, **kwargs):
+            sent.append((chat_id, loop.time()))
+
+        bot = SimpleNamespace(send_message=send_message)
+        limiter = RateLimiter(rate=50, per_chat_interval=0.2, group_interval=0.5)
+        started = loop.time()
+        count = await send_many(bot, [(chat_id, "hola") for chat_id in range(10)] + [(3, "otra vez")], limiter)
+
+        self.assertEqual(count, 11)
+        # 10 first messages at 50/s need at least 9 intervals of 20 ms
+        first_round = sorted(at for _, at in sent[:10])
+        self.assertGreaterEqual(first_round[-1] - started, 0.17)
+        self.assertLess(max(at for _, at in sent) - started, 0.5)
+        again = [at for chat_id, at in sent if chat_id == 3]
+        self.assertGreaterEqual(again[1] - again[0], 0.19)
+
+    async def test_retry_after_pauses_and_retries(self):
+        """Test that a 429 from Telegram pauses the fan-out and the message is sent again."""
+        bot = SimpleNamespace(send_message=AsyncMock(side_effect=[RetryAfter(0), None, None]))
+        count = await send_many(bot, [(1, "a"), (2, "b")], RateLimiter(rate=1000, per_chat_interval=0))
+        self.assertEqual(count, 2)
+        self.assertEqual(bot.send_message.await_count, 3)
+
+    async def test_retry_after_also_delays_sends_already_waiting(self):
+        """Test that a 429 pushes back turns reserved before it, so they do not hit the limit again."""
+        loop = asyncio.get_running_loop()
+        blocked_until = []
+        attempts = []
+
+        async def send_message(chat_id, text, **kwargs):
+            now = loop.time()
+            attempts.append((chat_id, now))
+            # The other sends reserve their turns while this request is in flight
+            await asyncio.sleep(0.01)
+            if not blocked_until:
+                blocked_until.append(now + 1)
+            if now < blocked_until[0]:
+                raise RetryAfter(1)
+
+        bot = SimpleNamespace(send_message=send_message)
+        limiter = RateLimiter(rate=20, per_chat_interval=0)
+        count = await send_many(bot, [(chat_id, "hola") for chat_id in range(4)], limiter)
+
+        self.assertEqual(count, 4)
+        # Only the first attempt was refused; the others waited for the pause
+        self.assertEqual(len(attempts), 5)
+        self.assertTrue(all(at >= blocked_until[0] for _, at in attempts[1:]))
+
+if __name__ == '__main__':
+    unittest.main()
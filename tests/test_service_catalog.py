@@ -0,0 +1,125 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest.mock import patch
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import sales_rag
+from bot.modules.service_catalog import KeywordMatcher, ServiceCatalog, fold_text
+
+class TestKeywordMatcher(unittest.TestCase):
+
+    def test_accents_and_case_are_ignored(self):
+        """Test that keywords match regardless of accents and capitalisation."""
+        matcher = KeywordMatcher(["diseño web", "Páginas", "SEO"])
+        self.assertEqual(matcher.search("Necesito DISENO WEB y paginas con seo"), {0, 1, 2})
+
+    def test_matches_start_at_word_boundaries(self):
+        """Test that a keyword may be followed by a suffix but not preceded by letters."""
+        matcher = KeywordMatcher(["app", "arte"])
+        self.assertEqual(matcher.search("quiero dos apps"), {0})
+        self.assertEqual(matcher.search("una parte del proyecto"), set())
+
+    def test_agrees_with_naive_search_on_overlapping_keywords(self):
+        """Test the automaton against a brute-force scan on random texts with shared prefixes and suffixes."""
+        rng = random.Random(3)
+        keywords = ["".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(40)]
+        matcher = KeywordMatcher(keywords)
+        for _ in range(200):
+            text = "".join(rng.choice("abc ") for _ in range(rng.randint(0, 30)))
+            expected = {
+                index for index, keyword in enumerate(keywords)
+                if any(text.startswith(keyword, start) and (start == 0 or not text[start - 1].isalnum())
+                       for start in range(len(text)))
+            }
+            self.assertEqual(matcher.search(text), expected, (text, keywords))
+
+
+class TestServiceCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "services.json")
+        self.write_services([
+            {"service_name": "Diseño gráfico", "keywords": ["branding", "logotipos"]},
+            {"service_name": "Desarrollo web", "keywords": ["página web", "tienda en línea", "branding"]},
+        ])
+        self.catalog = ServiceCatalog(self.path)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_services(self, services):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(services, f, ensure_ascii=False)
+        # Make sure the change is visible even on filesystems with coarse mtimes
+        stat = os.stat(self.path)
+        os.utime(self.path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    def test_results_are_ranked_by_match_strength(self):
+        """Test that the service with more (and longer) matching keywords comes first."""
+        ranked = self.catalog.match("Busco branding y una Tienda en Linea")
+        self.assertEqual([service["service_name"] for service, _ in ranked], ["Desarrollo web", "Diseño gráfico"])
+        self.assertGreater(ranked[0][1], ranked[1][1])
+
+    def test_file_is_reloaded_only_when_it_changes(self):
+        """Test that the catalogue is cached and picks up edits to services.json."""
+        services = self.catalog.refresh()
+        self.assertIs(self.catalog.refresh(), services)
+
+        self.write_services([{"service_name": "Fotografía", "keywords": ["fotos de producto"]}])
+        self.assertEqual([service["service_name"] for service, _ in self.catalog.match("fotos de producto")],
+                         ["Fotografía"])
+
+    def test_invalid_file_keeps_the_previous_catalogue(self):
+        """Test that a broken edit does not wipe the loaded services."""
+        self.catalog.refresh()
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write("{not json")
+        self.assertEqual(len(self.catalog.refresh()), 2)
+
+    def test_fold_text(self):
+        """Test that folding strips accents and case."""
+        self.assertEqual(fold_text("Diseño ÁGIL"), "diseno agil")
+
+
+class TestFindRelevantServices(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        path = os.path.join(self.tmp_dir.name, "services.json")
+        services = [
+            {"service_name": f"Servicio {number}", "description": f"Trabajos de tipo {word}.",
+             "keywords": ["branding", word]}
+            for number, word in enumerate(["logotipos", "papelería", "empaques", "rotulación", "fotografía"])
+        ]
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(services, f, ensure_ascii=False)
+        self.patcher = patch('bot.modules.sales_rag.catalog', ServiceCatalog(path))
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.tmp_dir.cleanup()
+
+    def names(self, services):
+        return [service["service_name"] for service in services]
+
+    def test_all_keyword_matches_are_returned_by_default(self):
+        """Test that every service with a literal keyword match is kept, not just the first three."""
+        self.assertEqual(len(sales_rag.find_relevant_services("necesito branding")), 5)
+        self.assertEqual(len(sales_rag.find_relevant_services("necesito branding", limit=2)), 2)
+
+    def test_bm25_fills_the_remaining_slots(self):
+        """Test that services described with other words complete a short list of keyword matches."""
+        found = self.names(sales_rag.find_relevant_services("logotipos y trabajos de fotografía"))
+        self.assertCountEqual(found[:2], ["Servicio 0", "Servicio 4"])
+        self.assertEqual(len(found), 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import math
+import os
+import random
+import sys
+import unittest
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules.service_search import BM25Index, service_terms, tokenize
+
+SERVICES = [
+    {"service_name": "Diseño gráfico", "description": "Identidad visual y material impreso.",
+     "keywords": ["branding", "logotipos"], "work_examples": ["Diseño de flyers y tarjetas"]},
+    {"service_name": "Desarrollo de páginas web", "description": "Sitios rápidos y tiendas para vender en línea.",
+     "keywords": ["página web", "ecommerce"], "work_examples": ["Tienda en línea con pagos"]},
+    {"service_name": "Bots para venta y agenda", "description": "Asistentes que atienden clientes por chat.",
+     "keywords": ["chatbot", "whatsapp"], "work_examples": ["Bot que agenda citas"]},
+]
+
+
+def naive_bm25(services, query, k1=1.2, b=0.75):
+    """Textbook BM25 over the same weighted term frequencies, one document at a time."""
+    documents = [service_terms(service) for service in services]
+    average_length = sum(sum(doc.values()) for doc in documents) / len(documents)
+    scores = []
+    for doc in documents:
+        length = sum(doc.values())
+        score = 0.0
+        for term in tokenize(query):
+            if term not in doc:
+                continue
+            df = sum(1 for other in documents if term in other)
+            idf = math.log(1 + (len(documents) - df + 0.5) / (df + 0.5))
+            tf = doc[term]
+            score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / average_length))
+        scores.append(score)
+    return scores
+
+
+class TestBM25Index(unittest.TestCase):
+
+    def test_tokenize_folds_accents_and_light_stems(self):
+        """Test that inflected forms and accents map to the same term and stopwords are dropped."""
+        self.assertEqual(tokenize("Diseño"), tokenize("diseños"))
+        self.assertEqual(tokenize("Páginas WEB"), tokenize("pagina web"))
+        self.assertEqual(tokenize("quiero una de las"), [])
+
+    def test_paraphrases_find_services_without_exact_keywords(self):
+        """Test that a query without any catalogue keyword still retrieves the right service."""
+        index = BM25Index(SERVICES)
+        self.assertEqual(index.top_k("quiero vender mis productos en línea", k=1)[0][0], 1)
+        self.assertEqual(index.top_k("un asistente que conteste a mis clientes", k=1)[0][0], 2)
+        self.assertEqual(index.top_k("nada que ver", k=3), [])
+
+    def test_vectorised_scores_match_naive_bm25(self):
+        """Test the bincount scoring against a per-document BM25 on a random catalogue."""
+        rng = random.Random(11)
+        words = ["alfa", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliet"]
+        services = [
+            {"service_name": " ".join(rng.sample(words, 2)),
+             "description": " ".join(rng.choices(words, k=rng.randint(0, 12))),
+             "keywords": rng.sample(words, rng.randint(0, 3))}
+            for _ in range(30)
+        ]
+        index = BM25Index(services)
+        for _ in range(20):
+            query = " ".join(rng.choices(words, k=rng.randint(1, 4)))
+            for fast, slow in zip(index.scores(query), naive_bm25(services, query)):
+                self.assertAlmostEqual(fast, slow)
+
+if __name__ == '__main__':
+    unittest.main()
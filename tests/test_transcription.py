@@ -0,0 +1,72 @@
+import asyncio
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+import httpx
+import openai
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import llm_engine, transcription
+
+class TestTranscription(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        """Serve Whisper responses from a mock transport that records concurrency."""
+        self.active = 0
+        self.max_active = 0
+        self.uploads = []
+        self.patchers = [
+            patch('bot.modules.llm_engine.OPENAI_API_KEY', 'sk-test'),
+            patch('bot.modules.transcription._semaphore', asyncio.Semaphore(2)),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        llm_engine._client = openai.AsyncOpenAI(
+            api_key='sk-test', max_retries=0,
+            http_client=httpx.AsyncClient(transport=httpx.MockTransport(self.handler)),
+        )
+
+    async def asyncTearDown(self):
+        await llm_engine.close_client()
+        for patcher in self.patchers:
+            patcher.stop()
+
+    async def handler(self, request):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        body = await request.aread()
+        self.uploads.append(body)
+        # Later chunks finish first, to check that texts are stitched in order
+        chunk = next((part for part in (b"part-0", b"part-1", b"part-2") if part in body), None)
+        await asyncio.sleep(0.03 - 0.01 * int(chunk[-1:]) if chunk else 0.01)
+        self.active -= 1
+        return httpx.Response(200, json={"text": chunk.decode() if chunk else "hola"})
+
+    async def test_audio_is_uploaded_from_memory(self):
+        """Test that the in-memory bytes are sent as a multipart upload."""
+        self.assertEqual(await transcription.transcribe_audio(b"OggS-audio", "note.ogg"), "hola")
+        self.assertIn(b"OggS-audio", self.uploads[0])
+        self.assertIn(b'filename="note.ogg"', self.uploads[0])
+
+    async def test_concurrent_transcriptions_are_bounded(self):
+        """Test that no more than the configured number of uploads run at once."""
+        results = await asyncio.gather(*[transcription.transcribe_audio(b"audio") for _ in range(6)])
+        self.assertEqual(results, ["hola"] * 6)
+        self.assertEqual(self.max_active, 2)
+
+    async def test_chunks_are_transcribed_in_parallel_and_stitched_in_order(self):
+        """Test that a split note uploads every chunk at once and joins the texts in playback order."""
+        chunks = [b"part-0", b"part-1", b"part-2"]
+        with patch('bot.modules.transcription.prepare_for_transcription', return_value=chunks) as mock_prepare:
+            result = await transcription.transcribe_audio(b"long note")
+
+        mock_prepare.assert_awaited_once_with(b"long note")
+        self.assertEqual(result, "part-0 part-1 part-2")
+        self.assertEqual(self.max_active, 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import asyncio
+import unittest
+from unittest.mock import patch, AsyncMock, MagicMock
+import os
+import sys
+
+import httpx
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot.modules import vikunja
+
+class TestVikunjaListCache(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        """Serve a two-page task list with ETags from a mock transport."""
+        self.requests = []
+        self.version = 1
+        vikunja.invalidate_cache()
+        vikunja.client._client = httpx.AsyncClient(base_url="http://vikunja", transport=httpx.MockTransport(self.handler))
+        self.patchers = [
+            patch('bot.modules.vikunja.VIKUNJA_API_TOKEN', 'token'),
+            patch('bot.modules.vikunja.VIKUNJA_CACHE_TTL', 60),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    async def asyncTearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        vikunja.invalidate_cache()
+        await vikunja.close_client()
+
+    def handler(self, request):
+        page = int(request.url.params.get('page', 0))
+        self.requests.append((request.method, page, request.headers.get('if-none-match')))
+        if request.method != 'GET':
+            self.version += 1
+            return httpx.Response(200, json={})
+        etag = f'"v{self.version}-p{page}"'
+        if request.headers.get('if-none-match') == etag:
+            return httpx.Response(304)
+        return httpx.Response(200, json=[{"id": page, "title": f"v{self.version}"}],
+                              headers={"x-pagination-total-pages": "2", "etag": etag})
+
+    async def test_pages_are_fetched_once_and_served_from_memory(self):
+        """Test that all pages are merged and a second read makes no request."""
+        tasks = await vikunja.get_tasks_list(1)
+        self.assertEqual([task['id'] for task in tasks], [1, 2])
+
+        await vikunja.get_tasks_list(1)
+        self.assertEqual(len(self.requests), 2)
+
+    async def test_concurrent_cold_reads_share_one_fetch(self):
+        """Test that simultaneous reads of an uncached list wait for a single download."""
+        results = await asyncio.gather(*[vikunja.get_tasks_list(1) for _ in range(5)])
+        self.assertTrue(all(len(tasks) == 2 for tasks in results))
+        self.assertEqual(len(self.requests), 2)
+        self.assertEqual(vikunja._inflight, {})
+
+    async def test_stale_entries_are_revalidated_conditionally(self):
+        """Test that a stale list is returned at once and refreshed with If-None-Match."""
+        await vikunja.get_tasks_list(1)
+        with patch('bot.modules.vikunja.VIKUNJA_CACHE_TTL', 0):
+            await vikunja.get_tasks_list(1)
+            await vikunja._list_cache["/projects/1/tasks"]["refresh"]
+
+        self.assertEqual(self.requests[2:], [('GET', 1, '"v1-p1"'), ('GET', 2, '"v1-p2"')])
+        self.assertEqual(len(await vikunja.get_tasks_list(1)), 2)
+
+    async def test_writes_invalidate_task_lists(self):
+        """Test that editing a task drops the cached task list."""
+        await vikunja.get_tasks_list(1)
+
+        update = MagicMock()
+        update.message.text = "new"
+        update.message.reply_text = AsyncMock()
+        context = MagicMock()
+        context.user_data = {'task_id_to_edit': '1'}
+        await vikunja.edit_task(update, context)
+
+        tasks = await vikunja.get_tasks_list(1)
+        self.assertEqual(tasks[0]['title'], "v2")
+
+if __name__ == '__main__':
+    unittest.main()
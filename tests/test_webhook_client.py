@@ -0,0 +1,113 @@
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from unittest.mock import patch
+
+import httpx
+
+# Ensure the 'bot' module can be imported
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from bot import db
+from bot import webhook_client as wc
+
+class TestWebhookDispatcher(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.patcher_file = patch('bot.db.DATABASE_FILE', os.path.join(self.tmp_dir.name, 'users.db'))
+        self.patcher_file.start()
+        db.setup_database()
+        self.received = []
+        self.status = {}
+        self.dispatcher = wc.WebhookDispatcher(
+            batch_size=3, max_concurrency=2, max_attempts=3, transport=httpx.MockTransport(self.handler)
+        )
+        self.patcher_dispatcher = patch('bot.webhook_client.dispatcher', self.dispatcher)
+        self.patcher_dispatcher.start()
+
+    async def asyncTearDown(self):
+        await self.dispatcher.close()
+        await db.close_batch_writer()
+
+    def tearDown(self):
+        self.patcher_dispatcher.stop()
+        db.shutdown_pool()
+        self.patcher_file.stop()
+        self.tmp_dir.cleanup()
+
+    def handler(self, request):
+        self.received.append((str(request.url), json.loads(request.content)))
+        return httpx.Response(self.status.get(str(request.url), 200),
+                              headers={"Retry-After": "120", "Location": "https://n8n.test/moved"})
+
+    async def outbox(self):
+        return await db.fetch_all("SELECT endpoint, status, attempts, next_attempt_at FROM webhook_outbox ORDER BY id")
+
+    async def test_events_are_batched_per_endpoint(self):
+        """Test that emitting only queues, and delivery sends arrays grouped by endpoint."""
+        for number in range(5):
+            await wc.send_webhook({"event": "lead", "n": number}, endpoint="https://n8n.test/a")
+        await wc.send_webhook({"event": "task"}, endpoint="https://n8n.test/b")
+        self.assertEqual(self.received, [])
+        self.assertEqual(len(await self.outbox()), 6)
+
+        self.assertEqual(await self.dispatcher.deliver_due(), 6)
+
+        batches = sorted((url, [event.get("n") for event in body]) for url, body in self.received)
+        self.assertEqual(batches, [
+            ("https://n8n.test/a", [0, 1, 2]),
+            ("https://n8n.test/a", [3, 4]),
+            ("https://n8n.test/b", [None]),
+        ])
+        self.assertEqual(await self.outbox(), [])
+        self.assertEqual(self.dispatcher.delivered, 6)
+
+    async def test_events_are_sent_one_per_request_by_default(self):
+        """Test that without batching each event is posted as a plain object."""
+        dispatcher = wc.WebhookDispatcher(transport=httpx.MockTransport(self.handler))
+        with patch('bot.webhook_client.dispatcher', dispatcher):
+            await wc.send_webhook({"event": "a"}, endpoint="https://n8n.test/a")
+            await wc.send_webhook({"event": "b"}, endpoint="https://n8n.test/a")
+            await dispatcher.deliver_due()
+        await dispatcher.close()
+        self.assertEqual(sorted(body["event"] for _, body in self.received), ["a", "b"])
+
+    async def test_failures_are_retried_later_or_dropped(self):
+        """Test that server errors back off (honouring Retry-After) and client errors are not retried."""
+        self.status = {"https://n8n.test/down": 503, "https://n8n.test/bad": 400}
+        await wc.send_webhook({"event": "a"}, endpoint="https://n8n.test/down")
+        await wc.send_webhook({"event": "b"}, endpoint="https://n8n.test/bad")
+
+        await self.dispatcher.deliver_due()
+        down, bad = await self.outbox()
+        self.assertEqual((down["status"], down["attempts"]), (wc.PENDING, 1))
+        self.assertGreaterEqual(down["next_attempt_at"], time.time() + 100)
+        self.assertEqual((bad["status"], bad["attempts"]), (wc.DEAD, 1))
+
+        # Nothing is due until the backoff expires
+        self.assertEqual(await self.dispatcher.deliver_due(), 0)
+
+    async def test_redirects_are_not_counted_as_delivered(self):
+        """Test that a 302 from the webhook URL keeps the event, marked dead, instead of deleting it."""
+        self.status = {"https://n8n.test/old": 302}
+        await wc.send_webhook({"event": "a"}, endpoint="https://n8n.test/old")
+
+        await self.dispatcher.deliver_due()
+        [row] = await self.outbox()
+        self.assertEqual((row["status"], row["attempts"]), (wc.DEAD, 1))
+        self.assertEqual(self.dispatcher.delivered, 0)
+        self.assertEqual([url for url, _ in self.received], ["https://n8n.test/old"])
+
+    def test_retry_delay_grows_with_jitter(self):
+        """Test that the backoff window doubles per attempt, stays under the cap and is randomised."""
+        delays = [wc.retry_delay(4, base=2, cap=600) for _ in range(200)]
+        self.assertTrue(all(0 <= delay <= 16 for delay in delays))
+        self.assertGreater(len(set(delays)), 100)
+        self.assertLessEqual(wc.retry_delay(30, base=2, cap=600), 600)
+
+if __name__ == '__main__':
+    unittest.main()